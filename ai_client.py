@@ -0,0 +1,181 @@
+# ai_client.py
+import hashlib
+import json
+import queue
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ai_insights import AI_PAYLOAD_GZIP, build_ai_payload, datasets_fingerprint
+from result_cache import result_cache
+
+# Default number of requests allowed in flight at once, across all dashboard sessions
+MAX_CONCURRENT_REQUESTS = 4
+
+# Seconds to wait for a free request slot before giving up
+SLOT_TIMEOUT = 30
+
+
+class AIResponseError(Exception):
+    """
+    Raised when the AI endpoint answers with a non-200 status code.
+    """
+
+    def __init__(self, status_code, message=""):
+        super().__init__(f"AI endpoint returned status {status_code}: {message}")
+        self.status_code = status_code
+
+
+class AIInsightsClient:
+    """
+    Client for the Deepseek-style chat endpoint used by the AI Insights page.
+
+    Requests share one pooled requests.Session, at most max_concurrency of them are in
+    flight at once, and answers are cached by (question, data fingerprint) so repeated
+    questions over unchanged data never reach the API. stream() yields the answer as it
+    arrives from the streaming (server-sent events) endpoint.
+
+    A request waits at most slot_timeout seconds for a slot and then fails with
+    requests.exceptions.Timeout.
+    """
+
+    def __init__(self, api_url, api_key=None, stream_url=None, max_concurrency=MAX_CONCURRENT_REQUESTS, timeout=10,
+                 compress=AI_PAYLOAD_GZIP, cache_responses=True, slot_timeout=SLOT_TIMEOUT):
+        self.api_url = api_url
+        self.stream_url = stream_url or f"{api_url.rstrip('/')}/stream"
+        self.timeout = timeout
+        self.compress = compress
+        self.cache_responses = cache_responses
+        self.slot_timeout = slot_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Content-Type"] = "application/json"
+        if api_key:
+            self.session.headers["Authorization"] = f"Bearer {api_key}"
+
+    @staticmethod
+    def _cache_key(query, datasets):
+        question = " ".join(query.lower().split())
+        return (hashlib.sha1(question.encode("utf-8")).hexdigest(), datasets_fingerprint(datasets), "ai_response")
+
+    def _acquire_slot(self):
+        if not self._slots.acquire(timeout=self.slot_timeout):
+            raise requests.exceptions.Timeout(f"No AI request slot became free within {self.slot_timeout}s")
+
+    def cached_answer(self, query, datasets):
+        if not self.cache_responses:
+            return None
+        return result_cache.get(result_cache.make_key(*self._cache_key(query, datasets)))
+
+    def _remember_answer(self, query, datasets, answer):
+        if self.cache_responses:
+            result_cache.set(result_cache.make_key(*self._cache_key(query, datasets)), answer)
+
+    def ask(self, query, datasets):
+        """
+        Return the answer to a question about the datasets, from cache when possible.
+
+        :raises AIResponseError: If the endpoint answers with a non-200 status code
+        :raises requests.exceptions.RequestException: If the endpoint cannot be reached
+        """
+        answer = self.cached_answer(query, datasets)
+        if answer is not None:
+            return answer
+
+        body, extra_headers = build_ai_payload(datasets, query, compress=self.compress)
+        self._acquire_slot()
+        try:
+            response = self.session.post(self.api_url, data=body, headers=extra_headers, timeout=self.timeout)
+        finally:
+            self._slots.release()
+        if response.status_code != 200:
+            raise AIResponseError(response.status_code, response.text[:200])
+
+        answer = response.json().get("response", "")
+        self._remember_answer(query, datasets, answer)
+        return answer
+
+    def _read_stream(self, body, extra_headers, chunks, stop):
+        """
+        Read a streaming answer into the chunks queue, then release the request slot taken
+        by stream(). The slot is held while the answer is read, not while the caller
+        consumes it, and setting stop ends the read early.
+
+        Puts ("delta", text) per chunk and ends with ("done", answer), ("fallback", None)
+        when the endpoint has no streaming route, or ("error", exception).
+        """
+        response = None
+        try:
+            response = self.session.post(self.stream_url, data=body, headers={**extra_headers, "Accept": "text/event-stream"},
+                                         timeout=self.timeout, stream=True)
+            if response.status_code in (404, 405):
+                chunks.put(("fallback", None))
+                return
+            if response.status_code != 200:
+                raise AIResponseError(response.status_code, response.text[:200])
+
+            deltas = []
+            for line in response.iter_lines(decode_unicode=True):
+                if stop.is_set():
+                    return
+                # Server-sent events: 'data: {"delta": "..."}' lines, ended by 'data: [DONE]'
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                delta = json.loads(data).get("delta", "")
+                deltas.append(delta)
+                chunks.put(("delta", delta))
+            chunks.put(("done", "".join(deltas)))
+        except Exception as e:
+            chunks.put(("error", e))
+        finally:
+            if response is not None:
+                response.close()
+            self._slots.release()
+
+    def stream(self, query, datasets):
+        """
+        Yield the answer to a question in chunks as the streaming endpoint sends them.
+
+        Cached answers are yielded in one piece. Endpoints without a streaming route
+        (404/405) fall back to ask(). The answer is read by a background thread, so a
+        caller that stops iterating never holds up other requests.
+        """
+        answer = self.cached_answer(query, datasets)
+        if answer is not None:
+            yield answer
+            return
+
+        body, extra_headers = build_ai_payload(datasets, query, compress=self.compress)
+        chunks = queue.Queue()
+        stop = threading.Event()
+        self._acquire_slot()
+        try:
+            threading.Thread(target=self._read_stream, args=(body, extra_headers, chunks, stop), daemon=True).start()
+        except Exception:
+            self._slots.release()
+            raise
+
+        try:
+            while True:
+                kind, value = chunks.get()
+                if kind == "delta":
+                    yield value
+                elif kind == "error":
+                    raise value
+                elif kind == "fallback":
+                    yield self.ask(query, datasets)
+                    return
+                else:
+                    answer = value
+                    break
+        finally:
+            stop.set()
+        self._remember_answer(query, datasets, answer)
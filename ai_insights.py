@@ -0,0 +1,203 @@
+# ai_insights.py
+import gzip
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+from dimensions import BREAKDOWN_COLUMN, TOTAL_BREAKDOWN
+from metric_index import resample_metrics
+from result_cache import result_cache, dataset_version
+
+# Compress AI request bodies with gzip
+AI_PAYLOAD_GZIP = False
+
+# What to send for each dataset: "digest" for bounded summaries, "raw" for every row
+AI_PAYLOAD_MODE = "digest"
+
+# Size budget in bytes for all dataset digests of one request, shared equally between datasets
+AI_DIGEST_BUDGET_BYTES = 24 * 1024
+
+# Days whose z-score against the dataset's daily mean exceeds this are reported as anomalies
+ANOMALY_ZSCORE = 3.0
+
+
+# Function to convert a column into JSON-ready values without touching the source DataFrame
+def _column_values(series):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        # Dates without a time part are sent as plain dates, like the GA4 'date' column
+        date_format = "%Y-%m-%d" if (series.dropna().dt.normalize() == series.dropna()).all() else "%Y-%m-%dT%H:%M:%S"
+        series = series.dt.strftime(date_format)
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+# Function to serialize a dataset into compact columnar JSON
+def serialize_dataset(data):
+    """
+    Serialize a DataFrame as {"columns": [...], "data": [[column values], ...]}.
+
+    Column names are written once instead of once per row, which keeps the payload a
+    fraction of the size of to_dict(orient="records").
+    """
+    payload = {
+        "columns": [str(col) for col in data.columns],
+        "data": [_column_values(data[col]) for col in data.columns],
+    }
+    return json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8")
+
+
+# Function to round floats for the digest; the AI does not need full precision
+def _rounded(values):
+    return [round(value, 3) if isinstance(value, float) else value for value in values]
+
+
+# Function to compute the full-size sections of a dataset digest
+def _digest_sections(data, date_col='date'):
+    metrics = [col for col in data.select_dtypes(include="number").columns]
+    dimensions = [col for col in data.columns
+                  if col not in metrics and col not in (date_col, BREAKDOWN_COLUMN)
+                  and not pd.api.types.is_datetime64_any_dtype(data[col])]
+    primary = metrics[0] if metrics else None
+    sections = {"rows": int(len(data))}
+
+    # Stacked breakdown reports mark their rows in BREAKDOWN_COLUMN; totals and trends come
+    # from the total rows, each dimension's top values from that dimension's breakdown
+    stacked = BREAKDOWN_COLUMN in data.columns
+    overall = data[data[BREAKDOWN_COLUMN] == TOTAL_BREAKDOWN] if stacked else data
+
+    if metrics:
+        sums = overall[metrics].sum()
+        means = overall[metrics].mean()
+        sections["totals"] = {metric: {"sum": round(float(sums[metric]), 3), "mean": round(float(means[metric]), 3)}
+                              for metric in metrics}
+
+    # Top dimension values by the primary metric, each list already sorted best first
+    if primary is not None and dimensions:
+        sections["top"] = {}
+        for dimension in dimensions:
+            rows = data[data[BREAKDOWN_COLUMN] == dimension] if stacked else data
+            top_values = rows.groupby(dimension, observed=True)[primary].sum().sort_values(ascending=False)
+            sections["top"][dimension] = {"metric": primary, "values": [str(v) for v in top_values.index],
+                                          "totals": _rounded(top_values.astype(float).tolist())}
+
+    if date_col in data.columns and metrics and overall[date_col].notna().any():
+        dates = overall[date_col].dropna()
+        sections["date_range"] = [dates.min().strftime("%Y-%m-%d"), dates.max().strftime("%Y-%m-%d")]
+
+        # Trend: weekly totals, most recent last
+        weekly = resample_metrics(overall, metrics, "Weekly", date_col=date_col)
+        sections["trend"] = {"granularity": "Weekly", "period": weekly["period"].dt.strftime("%Y-%m-%d").tolist(),
+                             **{metric: _rounded(weekly[metric].astype(float).tolist()) for metric in metrics}}
+
+        # Recent window: daily totals, most recent last
+        daily = resample_metrics(overall, metrics, "Daily", date_col=date_col)
+        sections["recent"] = {"date": daily["period"].dt.strftime("%Y-%m-%d").tolist(),
+                              **{metric: _rounded(daily[metric].astype(float).tolist()) for metric in metrics}}
+
+        # Anomalies: days far from the daily mean, largest deviation first
+        values = daily[metrics].to_numpy(dtype=float)
+        std = values.std(axis=0)
+        zscores = np.divide(values - values.mean(axis=0), std, out=np.zeros_like(values), where=std > 0)
+        day_idx, metric_idx = np.nonzero(np.abs(zscores) > ANOMALY_ZSCORE)
+        order = np.argsort(-np.abs(zscores[day_idx, metric_idx]))
+        sections["anomalies"] = [
+            {"date": sections["recent"]["date"][day_idx[i]], "metric": metrics[metric_idx[i]],
+             "value": round(float(values[day_idx[i], metric_idx[i]]), 3),
+             "zscore": round(float(zscores[day_idx[i], metric_idx[i]]), 2)}
+            for i in order
+        ]
+    return sections
+
+
+# Function to cut digest sections down to a level of detail
+def _digest_at_level(sections, top_k, trend_points, recent_days, max_anomalies):
+    digest = {key: sections[key] for key in ("rows", "date_range", "totals") if key in sections}
+    if "top" in sections and top_k:
+        digest["top"] = {dimension: {"metric": top["metric"], "values": top["values"][:top_k],
+                                     "totals": top["totals"][:top_k], "distinct": len(top["values"])}
+                         for dimension, top in sections["top"].items()}
+    if "trend" in sections and trend_points:
+        digest["trend"] = {key: value if key == "granularity" else value[-trend_points:]
+                           for key, value in sections["trend"].items()}
+    if "anomalies" in sections and max_anomalies:
+        digest["anomalies"] = sections["anomalies"][:max_anomalies]
+    if "recent" in sections and recent_days:
+        digest["recent"] = {key: value[-recent_days:] for key, value in sections["recent"].items()}
+    return digest
+
+
+# Function to summarize a dataset into a digest of at most budget_bytes of JSON
+def digest_dataset(data, budget_bytes, date_col='date'):
+    """
+    Summarize a dataset as totals, weekly trend, top-K dimension values, anomalies and a
+    recent daily window, serialized as JSON within budget_bytes.
+
+    Detail is halved step by step until the digest fits; if even the smallest level is
+    too large the optional sections are dropped, leaving row count, date range and totals.
+    """
+    sections = _digest_sections(data, date_col=date_col)
+    levels = [(10, 12, 14, 10), (5, 8, 7, 5), (3, 4, 3, 3), (1, 2, 1, 1), (1, 0, 0, 0), (0, 0, 0, 0)]
+    for level in levels:
+        digest = json.dumps(_digest_at_level(sections, *level), separators=(",", ":"), default=str).encode("utf-8")
+        if len(digest) <= budget_bytes:
+            break
+    return digest
+
+
+# Function to get a dataset's serialized JSON, computed once per dataset version
+def dataset_json(data, mode=AI_PAYLOAD_MODE, budget_bytes=AI_DIGEST_BUDGET_BYTES):
+    if mode == "raw":
+        return result_cache.get_or_compute((dataset_version(data), "ai_dataset_json"), lambda: serialize_dataset(data))
+    return result_cache.get_or_compute((dataset_version(data), "ai_dataset_digest", budget_bytes),
+                                       lambda: digest_dataset(data, budget_bytes))
+
+
+# Function to identify the data behind a request without serializing it
+def datasets_fingerprint(datasets, mode=AI_PAYLOAD_MODE):
+    key = tuple((name, dataset_version(data)) for name, data in datasets.items() if data is not None and not data.empty)
+    return hashlib.sha1(repr((key, mode)).encode("utf-8")).hexdigest()
+
+
+# Function to get the serialized "data" object for a set of datasets
+def datasets_json(datasets, mode=AI_PAYLOAD_MODE, budget_bytes=AI_DIGEST_BUDGET_BYTES):
+    """
+    :param datasets: Dictionary of {name: DataFrame}; None or empty DataFrames are skipped
+    :param budget_bytes: Digest budget for all datasets together
+    """
+    available = {name: data for name, data in datasets.items() if data is not None and not data.empty}
+    key = tuple((name, dataset_version(data)) for name, data in available.items())
+    dataset_budget = budget_bytes // max(len(available), 1)
+
+    def compute():
+        parts = [json.dumps(name).encode("utf-8") + b":" + dataset_json(data, mode, dataset_budget)
+                 for name, data in available.items()]
+        return b"{" + b",".join(parts) + b"}"
+
+    return result_cache.get_or_compute((key, "ai_datasets_json", mode, budget_bytes), compute)
+
+
+# Function to build the request body and headers for an AI question
+def build_ai_payload(datasets, query, compress=AI_PAYLOAD_GZIP, mode=AI_PAYLOAD_MODE):
+    """
+    Build the JSON request body {"data": {...}, "query": "..."} for the AI endpoint.
+
+    Each dataset is sent as a bounded digest (mode="digest") or as every row (mode="raw").
+    The data section is serialized once per dataset version and reused for every question.
+    With compress=True the cached data section is also gzip-compressed once, and only the
+    small member holding the query is compressed per question; concatenated gzip members
+    form a single valid gzip stream.
+
+    :return: Tuple of (body bytes, extra request headers)
+    """
+    tail = json.dumps(query).encode("utf-8") + b"}"
+    if not compress:
+        return b'{"data":' + datasets_json(datasets, mode) + b',"query":' + tail, {}
+
+    versions = tuple((name, dataset_version(data)) for name, data in datasets.items()
+                     if data is not None and not data.empty)
+    compressed_head = result_cache.get_or_compute(
+        (versions, "ai_payload_gzip_head", mode),
+        lambda: gzip.compress(b'{"data":' + datasets_json(datasets, mode) + b',"query":'),
+    )
+    return compressed_head + gzip.compress(tail), {"Content-Encoding": "gzip"}
@@ -1,15 +1,45 @@
-from fastapi import FastAPI
+import asyncio
+import gzip
+import json
+import os
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
 import uvicorn
 
+# Mock DeepSeek API settings, configurable through environment variables
+MOCK_LATENCY_MS = float(os.getenv("MOCK_AI_LATENCY_MS", "200"))  # Time before the answer starts
+MOCK_TOKEN_DELAY_MS = float(os.getenv("MOCK_AI_TOKEN_DELAY_MS", "20"))  # Time between streamed words
+MOCK_WORKERS = int(os.getenv("MOCK_AI_WORKERS", "4"))
+
 # Mock DeepSeek API
 app = FastAPI()
 
-@app.post("/v1/chat")
-def deepseek_insights(data: dict):
-    query = data.get("query", "")
-    user_data = data.get("data", {})
+# Request accounting for this worker process
+stats = {
+    "requests": 0,
+    "request_bytes": 0,
+    "decoded_bytes": 0,
+    "max_request_bytes": 0,
+    "started": time.time(),
+}
+
+# Function to read and account for a JSON request body, gzip-encoded or not
+async def read_payload(request: Request):
+    body = await request.body()
+    raw_size = len(body)
+    if request.headers.get("content-encoding", "").lower() == "gzip":
+        body = gzip.decompress(body)
+
+    stats["requests"] += 1
+    stats["request_bytes"] += raw_size
+    stats["decoded_bytes"] += len(body)
+    stats["max_request_bytes"] = max(stats["max_request_bytes"], raw_size)
+    return json.loads(body) if body else {}
 
-    # Simulate AI insights based on the query and data
+# Function to simulate AI insights based on the query and data
+def mock_insights(query, user_data):
     if "traffic" in query.lower():
         response = "Your user traffic has increased by 15% over the last 30 days. Focus on organic search and paid campaigns."
     elif "conversion" in query.lower():
@@ -18,12 +48,39 @@ def deepseek_insights(data: dict):
         response = "Most of your users are aged 25-34. Tailor your campaigns to this demographic."
     else:
         response = "Here are some general insights: Focus on improving user engagement and retention."
+    return response
+
+@app.post("/v1/chat")
+async def deepseek_insights(request: Request):
+    data = await read_payload(request)
+    await asyncio.sleep(MOCK_LATENCY_MS / 1000)
+    return {"response": mock_insights(data.get("query", ""), data.get("data", {}))}
+
+@app.post("/v1/chat/stream")
+async def deepseek_insights_stream(request: Request):
+    data = await read_payload(request)
+    response = mock_insights(data.get("query", ""), data.get("data", {}))
+
+    # Stream the answer word by word as server-sent events
+    async def events():
+        await asyncio.sleep(MOCK_LATENCY_MS / 1000)
+        words = response.split(" ")
+        for i, word in enumerate(words):
+            delta = word if i == len(words) - 1 else f"{word} "
+            yield f"data: {json.dumps({'delta': delta})}\n\n"
+            await asyncio.sleep(MOCK_TOKEN_DELAY_MS / 1000)
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
 
-    return {"response": response}
+@app.get("/v1/stats")
+async def mock_stats():
+    # Counters are per worker process; repeat the call to sample other workers
+    return {**stats, "pid": os.getpid(), "uptime": time.time() - stats["started"]}
 
 # Run the mock API locally
-def run_mock_api():
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+def run_mock_api(host="0.0.0.0", port=8000, workers=MOCK_WORKERS):
+    uvicorn.run("app:app", host=host, port=port, workers=workers)
 
-# Uncomment the line below to run the mock API
-run_mock_api()
\ No newline at end of file
+if __name__ == "__main__":
+    run_mock_api()
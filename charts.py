@@ -0,0 +1,186 @@
+# charts.py
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+
+from result_cache import result_cache, dataset_version
+
+# Most points sent per time series; roughly one per horizontal pixel of a wide chart
+MAX_CHART_POINTS = 1000
+
+# Chart types whose time series are downsampled
+DOWNSAMPLED_KINDS = ("line", "bar")
+
+# Point count above which scatter and line charts are drawn with WebGL instead of SVG
+WEBGL_POINT_THRESHOLD = 5000
+
+# Histogram options that server-side binning supports; charts using any others are binned by Plotly
+PREBINNED_HISTOGRAM_KWARGS = {"x", "nbins", "title", "labels"}
+
+
+# Function to pick the points that best preserve a series' shape (Largest-Triangle-Three-Buckets)
+def lttb_indices(x, y, threshold):
+    """
+    Return the indices of `threshold` points chosen by Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept. Every bucket in between contributes the
+    point forming the largest triangle with the previously kept point and the average of
+    the next bucket. x must be sorted ascending.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.nan_to_num(np.asarray(y, dtype=float))
+    every = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x = x[end:next_end].mean() if next_end > end else x[-1]
+        avg_y = y[end:next_end].mean() if next_end > end else y[-1]
+
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+
+# Function to downsample a time series frame for charting
+def downsample_time_series(data, x, y, threshold=MAX_CHART_POINTS):
+    """
+    Reduce a frame to at most about `threshold` rows per y column using LTTB on each column.
+
+    Rows are kept if any y column selects them, so peaks of every series survive.
+    """
+    if len(data) <= threshold:
+        return data
+    data = data.sort_values(by=x, kind="mergesort")
+    x_values = data[x]
+    if pd.api.types.is_datetime64_any_dtype(x_values):
+        x_values = x_values.astype("int64")
+    keep = np.unique(np.concatenate([lttb_indices(x_values.to_numpy(), data[column].to_numpy(), threshold)
+                                     for column in ([y] if isinstance(y, str) else y)]))
+    return data.iloc[keep]
+
+
+# Function to tell whether a chart plots a series over a date or numeric x axis
+def is_time_series(kind, data, x):
+    return (kind in DOWNSAMPLED_KINDS and x in data.columns
+            and (pd.api.types.is_datetime64_any_dtype(data[x]) or pd.api.types.is_numeric_dtype(data[x])))
+
+
+# Function to bin a histogram with NumPy so the browser receives bin counts instead of raw values
+def prebinned_histogram(data, x, nbins=None, title=None, labels=None):
+    """
+    Equivalent of px.histogram(data, x=x, nbins=nbins) drawn as a bar chart of bin counts.
+
+    Missing values are ignored, as Plotly does. Without nbins the bin count comes from
+    NumPy's "auto" rule instead of Plotly's.
+    """
+    values = pd.to_numeric(data[x], errors="coerce").dropna().to_numpy()
+    counts, edges = np.histogram(values, bins=nbins or "auto")
+    bins = pd.DataFrame({x: (edges[:-1] + edges[1:]) / 2, "count": counts})
+
+    fig = px.bar(bins, x=x, y="count", title=title, labels=labels)
+    fig.update_traces(width=np.diff(edges), customdata=np.column_stack([edges[:-1], edges[1:]]),
+                      hovertemplate="%{customdata[0]:.4g} – %{customdata[1]:.4g}<br>count=%{y}<extra></extra>")
+    fig.update_layout(bargap=0)
+    return fig
+
+
+# Function to build a figure once per (dataset version, filter, chart spec) and cache it
+def cached_figure(data, spec, build, filter_key=None):
+    """
+    Return a plotly Figure, building it only on a cache miss.
+
+    Unchanged charts skip Plotly Express construction on every rerun. The Figure object
+    itself is cached, not a dict: st.plotly_chart re-validates dicts by rebuilding a
+    Figure from them, but takes a Figure as already valid and only serializes it
+    (to_dict and to_json), about a tenth of the cost of a rebuild for a 1000-point line
+    chart. The cached Figure is shared between sessions, so callers must not modify it.
+
+    :param spec: Hashable description of the chart; together with the dataset version and
+                 filter_key it must identify the figure
+    :param build: Callable returning a plotly Figure, called on a cache miss
+    :param filter_key: Describes any filtering or cleaning applied to data since it was loaded
+    """
+    return result_cache.get_or_compute((dataset_version(data), filter_key, spec, "plotly_figure"), build)
+
+
+# Function to build a Plotly Express chart through the figure cache
+def cached_chart(kind, data, filter_key=None, traces=None, x_range=None, **px_kwargs):
+    """
+    Cached equivalent of px.<kind>(data, **px_kwargs).
+
+    Line and bar time series longer than MAX_CHART_POINTS are downsampled with LTTB; the
+    figure's layout.meta then records how many points the full series has. Scatter and
+    line charts with more than WEBGL_POINT_THRESHOLD points are drawn with WebGL, and
+    histograms are binned server-side so only bin counts reach the browser.
+
+    :param traces: Optional keyword arguments for fig.update_traces()
+    :param x_range: Optional (start, end) to restrict a time series to before downsampling
+    """
+    def build():
+        chart_data = data
+        meta = None
+        x, y = px_kwargs.get("x"), px_kwargs.get("y")
+        if y is not None and is_time_series(kind, chart_data, x):
+            if x_range is not None:
+                x_values = chart_data[x]
+                start, end = (pd.Timestamp(v) for v in x_range) if pd.api.types.is_datetime64_any_dtype(x_values) else x_range
+                chart_data = chart_data[(x_values >= start) & (x_values <= end)]
+            if len(chart_data) > MAX_CHART_POINTS:
+                meta = {"downsampled_from": len(chart_data)}
+                chart_data = downsample_time_series(chart_data, x, y)
+
+        if kind == "histogram" and set(px_kwargs) <= PREBINNED_HISTOGRAM_KWARGS:
+            fig = prebinned_histogram(chart_data, **px_kwargs)
+        elif kind in ("scatter", "line") and "render_mode" not in px_kwargs:
+            render_mode = "webgl" if len(chart_data) > WEBGL_POINT_THRESHOLD else "svg"
+            fig = getattr(px, kind)(chart_data, render_mode=render_mode, **px_kwargs)
+        else:
+            fig = getattr(px, kind)(chart_data, **px_kwargs)
+        if traces:
+            fig.update_traces(**traces)
+        if meta:
+            fig.update_layout(meta=meta)
+        return fig
+
+    spec = (kind, px_kwargs, traces, x_range, MAX_CHART_POINTS, WEBGL_POINT_THRESHOLD)
+    return cached_figure(data, spec, build, filter_key=filter_key)
+
+
+# Function to display a time series chart that is redrawn at full resolution for a box-selected range
+@st.fragment
+def time_series_chart(kind, data, key, filter_key=None, **px_kwargs):
+    """
+    Display a cached, downsampled time series chart with box-select zoom.
+
+    Streamlit reports box selections but not Plotly zoom events, so box-selecting a range
+    reruns the page and redraws the chart for just that range (downsampled only if it is
+    still longer than MAX_CHART_POINTS). Double-clicking the chart clears the selection.
+    The chart is a fragment, so a selection reruns only the chart, not the page around it.
+    """
+    x_range = None
+    selection = st.session_state.get(key)
+    if selection and selection.get("selection", {}).get("box"):
+        box_x = selection["selection"]["box"][0].get("x")
+        if box_x:
+            x_range = (min(box_x), max(box_x))
+
+    fig = cached_chart(kind, data, filter_key=filter_key, x_range=x_range, **px_kwargs)
+    st.plotly_chart(fig, use_container_width=True, key=key, on_select="rerun", selection_mode="box")
+
+    downsampled_from = (fig.layout.meta or {}).get("downsampled_from")
+    if downsampled_from:
+        st.caption(f"Showing a {MAX_CHART_POINTS}-point outline of {downsampled_from:,} points. "
+                   "Box-select a range to see it at full resolution.")
+    elif x_range is not None:
+        st.caption("Showing the selected range at full resolution. Double-click the chart to reset.")
@@ -9,8 +9,21 @@ from data_extractor import main as refresh_data
 import requests
 import json
 import plotly.express as px
-from data_extractor import load_linkedin_excel_data
+from data_extractor import load_linkedin_excel_data, is_error_event
 from streamlit_calendar import calendar
+import os
+from result_cache import result_cache, dataset_version, derive_version
+from dimensions import encode_dimensions, vocabulary_for, BREAKDOWN_COLUMN
+from charts import cached_chart, cached_figure, time_series_chart
+from ai_client import AIInsightsClient, AIResponseError
+from keyword_index import KeywordIndex
+from keyword_clusters import KeywordClusters
+from url_paths import PathTrie, path_segments
+from seo_funnel import seo_funnel, LANDING_PAGE
+from rank_history import RANK_HISTORY_DIR, RankHistoryStore, RankIndex
+from properties import load_manifest
+from partitioned_store import PartitionedStore, report_name
+from metric_index import PrefixSumIndex, TopKIndex, COMPARISON_MODES, GRANULARITIES, resample_metrics, growth_rate
 
 
 # Load data from CSV files and convert date format
@@ -30,28 +43,31 @@ def load_data(filename):
         print(f"Error loading data from {filename}: {e}")
         return None
 
-# Function to calculate week-over-week (WoW) and month-over-month (MoM) growth
-def calculate_growth(data, metric):
-    if data is None or data.empty:
-        return None
-    
-    # Calculate WoW growth
-    data['WoW Growth'] = data[metric].pct_change(periods=7) * 100
-    
-    # Calculate MoM growth
-    data['MoM Growth'] = data[metric].pct_change(periods=30) * 100
-    
-    return data
+# Function to bucket a dataset's metrics by day, week or month, cached per dataset version
+def bucket_metrics(data, metrics, granularity, date_col='date', agg="sum"):
+    key = (dataset_version(data), "time_buckets", tuple(metrics), granularity, date_col, agg)
+
+    def compute():
+        buckets = resample_metrics(data, metrics, granularity, date_col=date_col, agg=agg)
+        buckets.attrs['version'] = repr(key)  # Lets charts of the buckets be cached without hashing them
+        return buckets
+
+    return result_cache.get_or_compute(key, compute)
 
 # Function to calculate delta values for metrics
 def calculate_delta(current_value, previous_value):
+    if previous_value is None or pd.isna(previous_value) or pd.isna(current_value):
+        return None
     if previous_value == 0:
         return 0
     return ((current_value - previous_value) / previous_value) * 100
 
-# Function to display a metric with a colored delta
+# Function to display a metric with a colored delta; a delta of None means there is nothing to compare with
 def display_metric(label, value, delta_value):
-    if delta_value > 0:
+    if delta_value is None or pd.isna(delta_value):
+        delta_color = "gray"
+        delta_sign = "no comparison data"
+    elif delta_value > 0:
         delta_color = "green"
         delta_sign = f"↑ {delta_value:.2f}%"
     elif delta_value < 0:
@@ -82,14 +98,171 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
+# Function to build a version string for a data file from its modification time and size
+def file_version(filename):
+    file_stat = os.stat(filename)
+    return f"{filename}:{file_stat.st_mtime_ns}:{file_stat.st_size}"
+
+# Function to sort a dataset by its date column so it can be sliced with binary search
+def sort_by_date(data, date_col='date'):
+    if data is None or data.empty or date_col not in data.columns:
+        return data
+    if not data[date_col].is_monotonic_increasing:
+        # Stable sort keeps the original row order within a day; NaT rows go last
+        data = data.sort_values(by=date_col, kind='mergesort', na_position='last')
+    data = data.reset_index(drop=True)
+    data.attrs['sorted_by'] = date_col
+    return data
+
 # Function to filter data based on date range
-def filter_data_by_date(data, start_date, end_date):
-    if data is None or data.empty:
+def filter_data_by_date(data, start_date, end_date, date_col='date'):
+    """
+    Return the rows of a date-sorted dataset that fall within [start_date, end_date].
+
+    The dataset is expected to come from sort_by_date(), so the range is found with two
+    binary searches and returned as a positional slice instead of building boolean masks.
+    """
+    if data is None or data.empty or date_col not in data.columns:
         return data
-    # Convert start_date and end_date to pandas.Timestamp
-    start_date = pd.to_datetime(start_date)
-    end_date = pd.to_datetime(end_date)
-    return data[(data['date'] >= start_date) & (data['date'] <= end_date)]
+    if data.attrs.get('sorted_by') != date_col:
+        data = sort_by_date(data, date_col)
+
+    # Convert start_date and end_date to numpy datetimes; the end date is inclusive
+    start_date = pd.Timestamp(start_date).normalize().to_datetime64()
+    end_date = (pd.Timestamp(end_date).normalize() + pd.Timedelta(days=1)).to_datetime64()
+
+    dates = data[date_col].values
+    start_pos = dates.searchsorted(start_date, side='left')
+    end_pos = dates.searchsorted(end_date, side='left')
+    filtered = data.iloc[start_pos:end_pos]
+    # Record the range so cached results for this slice are keyed by it, and where the
+    # slice starts so row positions in the full dataset can be mapped onto it
+    filtered.attrs = {**data.attrs, 'date_range': (str(start_date), str(end_date)),
+                      'row_offset': data.attrs.get('row_offset', 0) + start_pos}
+    return filtered
+
+# Function to group a dataset and aggregate a metric, cached across reruns and sessions
+def aggregate_by(page, data, by, metric, agg="sum", where=None):
+    """
+    Group data by a column and aggregate a metric, reusing earlier results.
+
+    Results are keyed by (dataset version, page, date range, parameters), so the same view
+    requested by another session or after a server restart is served from result_cache.
+
+    :param where: Optional {column: value} equality filters applied before grouping
+    """
+    def compute():
+        subset = data
+        for column, value in (where or {}).items():
+            subset = subset[subset[column] == value]
+        result = subset.groupby(by, observed=True)[metric].agg(agg).reset_index()
+        # Categorical groups come out in vocabulary order; keep them in value order
+        if isinstance(result[by].dtype, pd.CategoricalDtype):
+            result = result.sort_values(by=by, key=lambda values: values.astype(str), ignore_index=True)
+        # Derived version so charts of this result can be cached without hashing it
+        result.attrs['version'] = repr((dataset_version(data), page, params))
+        return result
+
+    params = (by, metric, agg, tuple(sorted((where or {}).items())))
+    return result_cache.get_or_compute((dataset_version(data), page, params), compute)
+
+# Function to get the aggregate_by filter selecting one dimension's rows of a stacked breakdown report
+def breakdown_rows(data, dimension):
+    return {BREAKDOWN_COLUMN: dimension} if BREAKDOWN_COLUMN in data.columns else None
+
+# Function to keep a dataset's error events, as a frame versioned apart from the dataset it came from
+def error_events(data):
+    def compute():
+        errors = data[is_error_event(data["eventName"]).to_numpy()].reset_index(drop=True)
+        errors.attrs['version'] = repr((dataset_version(data), "error_events"))
+        return errors
+
+    return result_cache.get_or_compute((dataset_version(data), "error_events"), compute)
+
+# Function to get the path trie of a dataset's page paths, built once per dataset version
+def get_path_trie(data, column="pagePath"):
+    return result_cache.get_or_compute((dataset_version(data), "path_trie", column), lambda: PathTrie(data[column]))
+
+# Function to roll a metric up by site section, cached like aggregate_by
+def section_rollup(page, data, metric, agg="sum", depth=1, section="/", where=None, column="pagePath"):
+    """
+    Aggregate a metric by the site sections `depth` directory levels below `section`.
+
+    :param where: Optional {column: value} equality filters applied before the rollup
+    """
+    def compute():
+        mask = None
+        for where_column, value in (where or {}).items():
+            matches = (data[where_column] == value).to_numpy()
+            mask = matches if mask is None else mask & matches
+        result = get_path_trie(data, column).rollup(data[metric].to_numpy(), agg, depth, section, mask)
+        result = result.rename(columns={"value": metric})
+        # Derived version so charts of this result can be cached without hashing it
+        result.attrs['version'] = repr((dataset_version(data), page, params))
+        return result
+
+    params = ("section_rollup", column, metric, agg, depth, section, tuple(sorted((where or {}).items())))
+    return result_cache.get_or_compute((dataset_version(data), page, params), compute)
+
+# Function to display a metric rolled up by site section, with drill-down and depth controls
+def show_section_rollup(page, data, metric, agg="sum", where=None, title=None):
+    trie = get_path_trie(data)
+    col1, col2 = st.columns(2)
+    with col1:
+        section = st.selectbox("Section", trie.parent_sections(), key=f"{page}_section")
+    levels = trie.max_depth - len(path_segments(section))
+    with col2:
+        depth = st.slider("Levels below section", 1, levels, 1, key=f"{page}_depth") if levels > 1 else 1
+
+    rollup = section_rollup(page, data, metric, agg, depth, section, where)
+    if rollup.empty:
+        st.warning("No data for this section.")
+        return
+    fig = cached_chart("bar", rollup, x="section", y=metric, hover_data=["rows"], title=title or f"{metric} by Section")
+    st.plotly_chart(fig, use_container_width=True)
+
+# Function to get the cache key of a dataset's top-K index
+def top_k_index_key(version, sorted_by, metric, dimension, date_col):
+    return (version, sorted_by, "top_k_index", metric, dimension, date_col)
+
+# Function to get the top-K index of a dataset's metric, built once per dataset version
+def get_top_k_index(data, metric, dimension=None, date_col=None):
+    key = top_k_index_key(dataset_version(data), data.attrs.get('sorted_by'), metric, dimension, date_col)
+    return result_cache.get_or_compute(key, lambda: TopKIndex(data, metric, dimension, date_col))
+
+# Function to get the top rows of a dataset by a metric, or its top dimension values by their total
+def top_k(data, metric, n=10, dimension=None, date_col=None):
+    """
+    Return the top n rows of data by metric or, with a dimension, the top n values of the
+    dimension with their metric totals, best first, without sorting the dataset.
+
+    Date slices from filter_data_by_date are answered from the full dataset's index when
+    main() has built it, restricted to the slice's range, so a new date range needs no
+    new index. Otherwise an index is built for data itself.
+    """
+    index, offset, start_date, end_date = None, 0, None, None
+    date_range = data.attrs.get('date_range')
+    if date_range and date_col is not None and data.attrs.get('sorted_by') == date_col:
+        key = top_k_index_key((data.attrs.get('version'), None), date_col, metric, dimension, date_col)
+        index = result_cache.get(result_cache.make_key(*key))
+        if index is not None:
+            offset = data.attrs.get('row_offset', 0)
+            start_date = pd.Timestamp(date_range[0])
+            end_date = pd.Timestamp(date_range[1]) - pd.Timedelta(days=1)  # stored end is exclusive
+    if index is None:
+        index = get_top_k_index(data, metric, dimension, date_col)
+
+    keys, values = index.top(n, start_date, end_date)
+    if dimension is None:
+        positions = keys - offset
+        if len(positions) and (positions.min() < 0 or positions.max() >= len(data)):
+            # The slice does not line up with the full dataset's index; rank the slice itself
+            positions, _ = get_top_k_index(data, metric, dimension, date_col).top(n)
+        return derive_version(data.iloc[positions], data, "top_k", metric, n, date_col)
+
+    if pd.api.types.is_integer_dtype(data[metric]):
+        values = values.astype("int64")
+    return derive_version(pd.DataFrame({dimension: keys, metric: values}), data, "top_k", metric, n, dimension, date_col)
 
 # Add this function to load social media data
 def load_social_media_data(filename):
@@ -131,7 +304,9 @@ def load_facebook_data(filename):
         # Convert 'Publish time' to datetime format
         if "Publish time" in facebook_data.columns:
             facebook_data["Publish time"] = pd.to_datetime(facebook_data["Publish time"], errors='coerce')
+            facebook_data = sort_by_date(facebook_data, "Publish time")
 
+        facebook_data.attrs['version'] = file_version(filename)
         return facebook_data
     except Exception as e:
         print(f"Error loading Facebook data: {e}")
@@ -147,212 +322,254 @@ def load_instagram_data(filename):
         print(f"Error loading Instagram data: {e}")
         return None
 
-def show_social_media_calendar(facebook_data, instagram_data, linkedin_posts):
-    # Initialize an empty list to store events
-    events = []
+# Define platform-specific colors
+CALENDAR_PLATFORM_COLORS = {
+    "Facebook": "#1877F2",  # Facebook blue
+    "Instagram": "#E1306C",  # Instagram pink
+    "LinkedIn": "#0077B5",  # LinkedIn blue
+}
+
+# Post metrics shown for each platform as {label: source column}
+CALENDAR_PLATFORM_METRICS = {
+    "Facebook": {
+        "Reach": "Reach",
+        "Engagement": "Reactions, comments and shares",
+        "Clicks": "Total clicks",
+        "Negative Feedback": "Negative feedback from users",
+    },
+    "Instagram": {
+        "Reach": "Reach",
+        "Engagement": "Reactions, comments and shares",
+        "Clicks": "Total clicks",
+        "Negative Feedback": "Negative feedback from users",
+    },
+    "LinkedIn": {
+        "Impressions": "Impressions",
+        "Clicks": "Clicks",
+        "Engagement Rate": "Engagement rate",
+        "Likes": "Likes",
+        "Comments": "Comments",
+        "Reposts": "Reposts",
+    },
+}
+
+# Function to turn one platform's posts into a date-sorted frame of calendar events
+def build_platform_events(data, platform, date_col, title_col):
+    metric_columns = CALENDAR_PLATFORM_METRICS[platform]
+    when = pd.to_datetime(data[date_col], errors='coerce')  # "Lifetime" summary rows become NaT
+    valid = when.notna()
+
+    events = data.loc[valid].reindex(columns=list(metric_columns.values()))
+    events.columns = list(metric_columns)
+    events = events.astype(object).where(events.notna(), "N/A")  # Replace NaN with "N/A"
+    events.insert(0, "title", data.loc[valid, title_col].fillna("").astype(str).to_numpy())
+    events.insert(0, "start", when[valid].dt.strftime("%Y-%m-%dT%H:%M:%S").to_numpy())
+    events.insert(0, "date", when[valid].to_numpy())
+    return sort_by_date(events)
+
+# Function to build the calendar events of every platform, cached per dataset version
+def build_calendar_events(facebook_data, instagram_data, linkedin_posts):
+    def compute():
+        events = {}
+        if facebook_data is not None and not facebook_data.empty:
+            events["Facebook"] = build_platform_events(facebook_data, "Facebook", "Publish time", "Title")
+        if instagram_data is not None and not instagram_data.empty:
+            events["Instagram"] = build_platform_events(instagram_data, "Instagram", "Date", "Title")
+        if linkedin_posts is not None and not linkedin_posts.empty:
+            # Check if required columns exist
+            if all(col in linkedin_posts.columns for col in ["Created date", "Post title"]):
+                events["LinkedIn"] = build_platform_events(linkedin_posts, "LinkedIn", "Created date", "Post title")
+            else:
+                print("⚠️ Required columns not found in LinkedIn posts data. Skipping LinkedIn data.")
+        return events
 
-    # Define platform-specific colors
-    platform_colors = {
-        "Facebook": "#1877F2",  # Facebook blue
-        "Instagram": "#E1306C",  # Instagram pink
-        "LinkedIn": "#0077B5",  # LinkedIn blue
-    }
+    versions = tuple(dataset_version(data) for data in (facebook_data, instagram_data, linkedin_posts))
+    return result_cache.get_or_compute((versions, "calendar_events"), compute)
 
-    # Helper function to clean metrics
-    def clean_metrics(metrics):
-        cleaned_metrics = {}
-        for key, value in metrics.items():
-            if pd.isna(value):  # Replace NaN with "N/A"
-                cleaned_metrics[key] = "N/A"
-            else:
-                cleaned_metrics[key] = value
-        return cleaned_metrics
+# Function to convert the events inside a date window into the calendar component's format
+def calendar_events_in_window(platform_events, window_start, window_end):
+    events = []
+    for platform, platform_frame in platform_events.items():
+        visible = filter_data_by_date(platform_frame, window_start, window_end)
+        metric_labels = list(CALENDAR_PLATFORM_METRICS[platform])
+        for start, title, metrics in zip(visible["start"], visible["title"], visible[metric_labels].to_dict("records")):
+            events.append({
+                "title": title,
+                "start": start,
+                "end": start,
+                "color": CALENDAR_PLATFORM_COLORS[platform],
+                "extendedProps": {"platform": platform, "metrics": metrics},
+            })
+    return events
+
+@st.fragment
+def show_social_media_calendar(facebook_data, instagram_data, linkedin_posts):
+    """
+    Display the posting calendar one month at a time.
 
-    # Process Facebook Posts
-    if facebook_data is not None and not facebook_data.empty:
-        for _, row in facebook_data.iterrows():
-            event = {
-                "title": row["Title"],
-                "start": pd.to_datetime(row["Publish time"]).strftime("%Y-%m-%dT%H:%M:%S"),
-                "end": pd.to_datetime(row["Publish time"]).strftime("%Y-%m-%dT%H:%M:%S"),
-                "color": platform_colors["Facebook"],  # Facebook color
-                "extendedProps": {
-                    "platform": "Facebook",
-                    "metrics": clean_metrics({
-                        "Reach": row.get("Reach"),
-                        "Engagement": row.get("Reactions, comments and shares"),
-                        "Clicks": row.get("Total clicks"),
-                        "Negative Feedback": row.get("Negative feedback from users"),
-                    }),
-                },
-            }
-            events.append(event)
-
-    # Process Instagram Posts
-    if instagram_data is not None and not instagram_data.empty:
-        for _, row in instagram_data.iterrows():
-            # Handle "Lifetime" values by skipping them
-            if row["Date"] == "Lifetime":
-                continue
-            event = {
-                "title": row["Title"],
-                "start": pd.to_datetime(row["Date"]).strftime("%Y-%m-%dT%H:%M:%S"),
-                "end": pd.to_datetime(row["Date"]).strftime("%Y-%m-%dT%H:%M:%S"),
-                "color": platform_colors["Instagram"],  # Instagram color
-                "extendedProps": {
-                    "platform": "Instagram",
-                    "metrics": clean_metrics({
-                        "Reach": row.get("Reach"),
-                        "Engagement": row.get("Reactions, comments and shares"),
-                        "Clicks": row.get("Total clicks"),
-                        "Negative Feedback": row.get("Negative feedback from users"),
-                    }),
-                },
-            }
-            events.append(event)
-
-    # Process LinkedIn Posts
-    if linkedin_posts is not None and not linkedin_posts.empty:
-        # Debug: Print column names to verify
-        print("LinkedIn Posts Columns:", linkedin_posts.columns)
-
-        # Check if required columns exist
-        required_columns = ["Created date", "Post title"]
-        if all(col in linkedin_posts.columns for col in required_columns):
-            for _, row in linkedin_posts.iterrows():
-                event = {
-                    "title": row["Post title"],
-                    "start": pd.to_datetime(row["Created date"]).strftime("%Y-%m-%dT%H:%M:%S"),
-                    "end": pd.to_datetime(row["Created date"]).strftime("%Y-%m-%dT%H:%M:%S"),
-                    "color": platform_colors["LinkedIn"],  # LinkedIn color
-                    "extendedProps": {
-                        "platform": "LinkedIn",
-                        "metrics": clean_metrics({
-                            "Impressions": row.get("Impressions"),
-                            "Clicks": row.get("Clicks"),
-                            "Engagement Rate": row.get("Engagement rate"),
-                            "Likes": row.get("Likes"),
-                            "Comments": row.get("Comments"),
-                            "Reposts": row.get("Reposts"),
-                        }),
-                    },
-                }
-                events.append(event)
-        else:
-            print("⚠️ Required columns not found in LinkedIn posts data. Skipping LinkedIn data.")
-
-    # Display the Calendar
-    if events:
-        # Configure the calendar
-        calendar_options = {
-            "editable": False,  # Disable editing
-            "selectable": True,  # Allow selecting dates
-            "initialView": "dayGridMonth",  # Default view: month
-            "headerToolbar": {
-                "left": "prev,next today",
-                "center": "title",
-                "right": "dayGridMonth,timeGridWeek,timeGridDay",
-            },
-        }
-
-        # Render the calendar
-        st.write("## Social Media Posting Calendar")
-        calendar_result = calendar(events=events, options=calendar_options)
-
-        # Display selected event details
-        if calendar_result.get("eventClick"):
-            selected_event = calendar_result["eventClick"]["event"]
-            st.write(f"**Selected Post:** {selected_event['title']}")
-            st.write(f"**Platform:** {selected_event['extendedProps']['platform']}")
-            st.write(f"**Date:** {selected_event['start']}")
-
-            # Display metrics
-            st.write("### Post Performance Metrics")
-            metrics = selected_event["extendedProps"]["metrics"]
-            for metric_name, metric_value in metrics.items():
-                st.write(f"**{metric_name}:** {metric_value}")
-    else:
+    Events are built once per dataset version and only the ones around the visible month
+    are sent to the calendar component. streamlit-calendar does not report the dates it is
+    showing, so the month is navigated with Streamlit buttons and passed in as initialDate.
+    As a fragment, changing the month reruns only the calendar.
+    """
+    platform_events = build_calendar_events(facebook_data, instagram_data, linkedin_posts)
+    if not any(len(frame) for frame in platform_events.values()):
         st.warning("⚠️ No social media posts available for calendar view.")
+        return
+
+    # Start on the month of the latest post
+    if "calendar_month" not in st.session_state:
+        latest_post = max(frame["date"].max() for frame in platform_events.values() if len(frame))
+        st.session_state.calendar_month = latest_post.to_period("M").to_timestamp()
+
+    st.write("## Social Media Posting Calendar")
+    col1, col2, col3 = st.columns([1, 4, 1])
+    with col1:
+        if st.button("◀ Previous month"):
+            st.session_state.calendar_month -= pd.DateOffset(months=1)
+    with col3:
+        if st.button("Next month ▶"):
+            st.session_state.calendar_month += pd.DateOffset(months=1)
+    month_start = st.session_state.calendar_month
+    with col2:
+        st.markdown(f"**{month_start:%B %Y}**")
+
+    # The month grid also shows the trailing and leading days of the adjacent months
+    window_start = month_start - pd.Timedelta(days=7)
+    window_end = month_start + pd.DateOffset(months=1) + pd.Timedelta(days=14)
+    events = calendar_events_in_window(platform_events, window_start, window_end)
+
+    # Configure the calendar; only the month grid is offered, since events are sent for the
+    # visible month alone and a week or day view navigated inside the component could be empty
+    calendar_options = {
+        "editable": False,  # Disable editing
+        "selectable": True,  # Allow selecting dates
+        "initialView": "dayGridMonth",  # Month view only
+        "initialDate": month_start.strftime("%Y-%m-%d"),
+        "headerToolbar": {
+            "left": "",
+            "center": "title",
+            "right": "",
+        },
+    }
+
+    # Render the calendar; the key re-mounts it when the month changes
+    calendar_result = calendar(events=events, options=calendar_options, callbacks=["eventClick"],
+                               key=f"social_calendar_{month_start:%Y_%m}")
+
+    # Display selected event details
+    if calendar_result.get("eventClick"):
+        selected_event = calendar_result["eventClick"]["event"]
+        st.write(f"**Selected Post:** {selected_event['title']}")
+        st.write(f"**Platform:** {selected_event['extendedProps']['platform']}")
+        st.write(f"**Date:** {selected_event['start']}")
+
+        # Display metrics
+        st.write("### Post Performance Metrics")
+        metrics = selected_event["extendedProps"]["metrics"]
+        for metric_name, metric_value in metrics.items():
+            st.write(f"**{metric_name}:** {metric_value}")
+
+# Function to get the prefix-sum index over a dataset's daily metrics, built once per dataset version
+def get_prefix_index(data):
+    return result_cache.get_or_compute((dataset_version(data), "prefix_sum_index"), lambda: PrefixSumIndex(data))
+
+# Function to compute a KPI for the selected date range and its comparison period (None without comparison data)
+def period_kpi(data, metric, date_range, compare_mode, agg="sum"):
+    index = get_prefix_index(data)
+    start_date, end_date = date_range if date_range else (index.start, index.end)
+    return index.compare(metric, start_date, end_date, compare_mode, agg)
 
 # Page 1: Overview
-def page_overview(user_traffic_data, engagement_data, conversion_data):
+@st.fragment
+def page_overview(user_traffic_data, engagement_data, conversion_data, date_range=None):
+    """
+    Display the Overview page.
+
+    The datasets are passed unfiltered so KPI tiles can compare the selected date range
+    against an earlier period; charts only show the selected range. As a fragment, the
+    comparison and granularity controls rerun only this page.
+    """
     st.title("📊 Overview")
     st.markdown("""
         Welcome to the **Digital Marketing & SEO Dashboard**!  
         This page provides a high-level overview of your website's performance.
     """)
 
+    compare_label = st.radio("Compare to", list(COMPARISON_MODES), horizontal=True)
+    compare_mode = COMPARISON_MODES[compare_label]
+    granularity = st.radio("Granularity", list(GRANULARITIES), horizontal=True)
+
     if user_traffic_data is not None and not user_traffic_data.empty:
         st.header("🚦 User & Traffic Data")
         col1, col2, col3 = st.columns(3)
         with col1:
-            total_users = user_traffic_data["totalUsers"].sum()
-            previous_total_users = user_traffic_data["totalUsers"].shift(7).sum()  # WoW comparison
+            total_users, previous_total_users = period_kpi(user_traffic_data, "totalUsers", date_range, compare_mode)
             delta_users = calculate_delta(total_users, previous_total_users)
-            display_metric("Total Users", total_users, delta_users)
+            display_metric("Total Users", int(total_users), delta_users)
         with col2:
-            avg_bounce_rate = user_traffic_data["bounceRate"].mean()
-            previous_bounce_rate = user_traffic_data["bounceRate"].shift(7).mean()  # WoW comparison
+            avg_bounce_rate, previous_bounce_rate = period_kpi(user_traffic_data, "bounceRate", date_range, compare_mode, agg="mean")
             delta_bounce_rate = calculate_delta(avg_bounce_rate, previous_bounce_rate)
             display_metric("Average Bounce Rate", f"{avg_bounce_rate:.2f}%", delta_bounce_rate)
         with col3:
-            total_sessions = user_traffic_data["sessions"].sum()
-            previous_sessions = user_traffic_data["sessions"].shift(7).sum()  # WoW comparison
+            total_sessions, previous_sessions = period_kpi(user_traffic_data, "sessions", date_range, compare_mode)
             delta_sessions = calculate_delta(total_sessions, previous_sessions)
-            display_metric("Total Sessions", total_sessions, delta_sessions)
+            display_metric("Total Sessions", int(total_sessions), delta_sessions)
 
         # Column chart: Active Users Over Time
         st.subheader("Active Users Over Time")
-        fig = px.bar(user_traffic_data, x="date", y="activeUsers", title="Active Users Over Time")
-        st.plotly_chart(fig, use_container_width=True)
+        chart_data = filter_data_by_date(user_traffic_data, *date_range) if date_range else user_traffic_data
+        chart_data = bucket_metrics(chart_data, ["activeUsers"], granularity)
+        time_series_chart("bar", chart_data, key="overview_active_users", x="period", y="activeUsers", title="Active Users Over Time")
 
     if engagement_data is not None and not engagement_data.empty:
         st.header("🎯 User Engagement & Behavior")
         col1, col2, col3 = st.columns(3)
         with col1:
-            avg_session_duration = engagement_data["averageSessionDuration"].mean()
-            previous_session_duration = engagement_data["averageSessionDuration"].shift(7).mean()  # WoW comparison
+            avg_session_duration, previous_session_duration = period_kpi(engagement_data, "averageSessionDuration", date_range, compare_mode, agg="mean")
             delta_session_duration = calculate_delta(avg_session_duration, previous_session_duration)
             display_metric("Average Session Duration", f"{avg_session_duration:.2f} seconds", delta_session_duration)
         with col2:
-            avg_pages_per_session = engagement_data["screenPageViewsPerSession"].mean()
-            previous_pages_per_session = engagement_data["screenPageViewsPerSession"].shift(7).mean()  # WoW comparison
+            avg_pages_per_session, previous_pages_per_session = period_kpi(engagement_data, "screenPageViewsPerSession", date_range, compare_mode, agg="mean")
             delta_pages_per_session = calculate_delta(avg_pages_per_session, previous_pages_per_session)
             display_metric("Average Pages per Session", f"{avg_pages_per_session:.2f}", delta_pages_per_session)
         with col3:
-            total_events = engagement_data["eventCount"].sum()
-            previous_events = engagement_data["eventCount"].shift(7).sum()  # WoW comparison
+            total_events, previous_events = period_kpi(engagement_data, "eventCount", date_range, compare_mode)
             delta_events = calculate_delta(total_events, previous_events)
-            display_metric("Total Events", total_events, delta_events)
+            display_metric("Total Events", int(total_events), delta_events)
 
         # Column chart: Event Count Over Time
         st.subheader("Event Count Over Time")
-        fig = px.bar(engagement_data, x="date", y="eventCount", title="Event Count Over Time")
-        st.plotly_chart(fig, use_container_width=True)
+        chart_data = filter_data_by_date(engagement_data, *date_range) if date_range else engagement_data
+        chart_data = bucket_metrics(chart_data, ["eventCount"], granularity)
+        time_series_chart("bar", chart_data, key="overview_event_count", x="period", y="eventCount", title="Event Count Over Time")
 
     if conversion_data is not None and not conversion_data.empty:
         st.header("💰 Conversion & Goal Tracking")
         col1, col2, col3 = st.columns(3)
         with col1:
-            total_conversions = conversion_data["conversions"].sum()
-            previous_conversions = conversion_data["conversions"].shift(7).sum()  # WoW comparison
+            total_conversions, previous_conversions = period_kpi(conversion_data, "conversions", date_range, compare_mode)
             delta_conversions = calculate_delta(total_conversions, previous_conversions)
-            display_metric("Total Conversions", total_conversions, delta_conversions)
+            display_metric("Total Conversions", int(total_conversions), delta_conversions)
         with col2:
-            total_revenue = conversion_data["totalRevenue"].sum()
-            previous_revenue = conversion_data["totalRevenue"].shift(7).sum()  # WoW comparison
+            total_revenue, previous_revenue = period_kpi(conversion_data, "totalRevenue", date_range, compare_mode)
             delta_revenue = calculate_delta(total_revenue, previous_revenue)
             display_metric("Total Revenue", f"${total_revenue:,.2f}", delta_revenue)
         with col3:
-            conversion_rate = (total_conversions / total_users) * 100
-            previous_conversion_rate = (previous_conversions / previous_total_users) * 100  # WoW comparison
-            delta_conversion_rate = calculate_delta(conversion_rate, previous_conversion_rate)
-            display_metric("Conversion Rate", f"{conversion_rate:.2f}%", delta_conversion_rate)
+            if user_traffic_data is not None and not user_traffic_data.empty:
+                conversion_rate = (total_conversions / total_users) * 100 if total_users else 0
+                if previous_conversions is None or previous_total_users is None:
+                    previous_conversion_rate = None
+                else:
+                    previous_conversion_rate = (previous_conversions / previous_total_users) * 100 if previous_total_users else 0
+                delta_conversion_rate = calculate_delta(conversion_rate, previous_conversion_rate)
+                display_metric("Conversion Rate", f"{conversion_rate:.2f}%", delta_conversion_rate)
 
         # Column chart: Conversions Over Time
         st.subheader("Conversions Over Time")
-        fig = px.bar(conversion_data, x="date", y="conversions", title="Conversions Over Time")
-        st.plotly_chart(fig, use_container_width=True)
+        chart_data = filter_data_by_date(conversion_data, *date_range) if date_range else conversion_data
+        chart_data = bucket_metrics(chart_data, ["conversions"], granularity)
+        time_series_chart("bar", chart_data, key="overview_conversions", x="period", y="conversions", title="Conversions Over Time")
 
 # Page 2: Acquisition
 def page_acquisition(acquisition_data):
@@ -360,17 +577,19 @@ def page_acquisition(acquisition_data):
     st.markdown("This page shows where your users are coming from.")
 
     if acquisition_data is not None and not acquisition_data.empty:
+        source_data = aggregate_by("page_acquisition", acquisition_data, "sessionSource", "sessions")
+
         # Metric: Top Traffic Source
-        top_source = acquisition_data.groupby("sessionSource")["sessions"].sum().idxmax()
+        top_source = source_data.loc[source_data["sessions"].idxmax(), "sessionSource"]
         st.metric("Top Traffic Source", top_source)
 
         # Pie chart: Traffic Sources
         st.subheader("Traffic Sources")
-        source_data = acquisition_data.groupby("sessionSource")["sessions"].sum().reset_index()
-        fig = px.pie(source_data, values="sessions", names="sessionSource", title="Traffic Sources")
+        fig = cached_chart("pie", source_data, values="sessions", names="sessionSource", title="Traffic Sources")
         st.plotly_chart(fig, use_container_width=True)
 
 # Page 3: Page Views
+@st.fragment
 def page_page_views(page_views_data):
     st.title("📄 Page Views")
     st.markdown("This page shows the most viewed pages on your website.")
@@ -378,10 +597,14 @@ def page_page_views(page_views_data):
     if page_views_data is not None and not page_views_data.empty:
         # Top 10 Pages by Views
         st.subheader("Top 10 Pages by Views")
-        top_pages = page_views_data.groupby("pageTitle")["screenPageViews"].sum().nlargest(10).reset_index()
-        fig = px.bar(top_pages, x="pageTitle", y="screenPageViews", title="Top 10 Pages by Views")
+        top_pages = top_k(page_views_data, "screenPageViews", dimension="pageTitle", date_col="date")
+        fig = cached_chart("bar", top_pages, x="pageTitle", y="screenPageViews", title="Top 10 Pages by Views")
         st.plotly_chart(fig, use_container_width=True)
 
+        # Views rolled up by site section
+        st.subheader("Page Views by Section")
+        show_section_rollup("page_page_views", page_views_data, "screenPageViews", title="Page Views by Section")
+
 # Page 4: Demographics
 def page_demographics(demographics_data):
     st.title("👥 Demographics")
@@ -390,19 +613,20 @@ def page_demographics(demographics_data):
     if demographics_data is not None and not demographics_data.empty:
         # Group by age bracket and gender
         st.subheader("Active Users by Age Bracket")
-        age_data = demographics_data.groupby("userAgeBracket")["activeUsers"].sum().reset_index()
-        fig = px.bar(age_data, x="userAgeBracket", y="activeUsers", title="Active Users by Age Bracket")
+        age_data = aggregate_by("page_demographics", demographics_data, "userAgeBracket", "activeUsers", where=breakdown_rows(demographics_data, "userAgeBracket"))
+        fig = cached_chart("bar", age_data, x="userAgeBracket", y="activeUsers", title="Active Users by Age Bracket")
         st.plotly_chart(fig, use_container_width=True)
 
         st.subheader("Active Users by Gender")
-        gender_data = demographics_data.groupby("userGender")["activeUsers"].sum().reset_index()
-        fig = px.pie(gender_data, values="activeUsers", names="userGender", title="Active Users by Gender")
+        gender_data = aggregate_by("page_demographics", demographics_data, "userGender", "activeUsers", where=breakdown_rows(demographics_data, "userGender"))
+        fig = cached_chart("pie", gender_data, values="activeUsers", names="userGender", title="Active Users by Gender")
         st.plotly_chart(fig, use_container_width=True)
 
         # Group by country
         st.subheader("Active Users by Country")
-        country_data = demographics_data.groupby("country")["activeUsers"].sum().reset_index()
-        fig = px.choropleth(
+        country_data = aggregate_by("page_demographics", demographics_data, "country", "activeUsers", where=breakdown_rows(demographics_data, "country"))
+        fig = cached_chart(
+            "choropleth",
             country_data,
             locations="country",  # Column with country names
             locationmode="country names",  # Use country names for mapping
@@ -422,20 +646,20 @@ def page_device_technology(device_data):
     if device_data is not None and not device_data.empty:
         # Group by device category
         st.subheader("Active Users by Device Category")
-        device_category_data = device_data.groupby("deviceCategory")["activeUsers"].sum().reset_index()
-        fig = px.bar(device_category_data, x="deviceCategory", y="activeUsers", title="Active Users by Device Category")
+        device_category_data = aggregate_by("page_device_technology", device_data, "deviceCategory", "activeUsers", where=breakdown_rows(device_data, "deviceCategory"))
+        fig = cached_chart("bar", device_category_data, x="deviceCategory", y="activeUsers", title="Active Users by Device Category")
         st.plotly_chart(fig, use_container_width=True)
 
         # Group by operating system
         st.subheader("Active Users by Operating System")
-        os_data = device_data.groupby("operatingSystem")["activeUsers"].sum().reset_index()
-        fig = px.pie(os_data, values="activeUsers", names="operatingSystem", title="Active Users by Operating System")
+        os_data = aggregate_by("page_device_technology", device_data, "operatingSystem", "activeUsers", where=breakdown_rows(device_data, "operatingSystem"))
+        fig = cached_chart("pie", os_data, values="activeUsers", names="operatingSystem", title="Active Users by Operating System")
         st.plotly_chart(fig, use_container_width=True)
 
         # Group by browser
         st.subheader("Active Users by Browser")
-        browser_data = device_data.groupby("browser")["activeUsers"].sum().reset_index()
-        fig = px.bar(browser_data, x="browser", y="activeUsers", title="Active Users by Browser")
+        browser_data = aggregate_by("page_device_technology", device_data, "browser", "activeUsers", where=breakdown_rows(device_data, "browser"))
+        fig = cached_chart("bar", browser_data, x="browser", y="activeUsers", title="Active Users by Browser")
         st.plotly_chart(fig, use_container_width=True)
     else:
         st.warning("No device & technology data available.")
@@ -448,8 +672,8 @@ def page_events(events_data):
     if events_data is not None and not events_data.empty:
         # Group by event name
         st.subheader("Event Count by Event Name")
-        event_count_data = events_data.groupby("eventName")["eventCount"].sum().reset_index()
-        fig = px.bar(event_count_data, x="eventName", y="eventCount", title="Event Count by Event Name")
+        event_count_data = aggregate_by("page_events", events_data, "eventName", "eventCount")
+        fig = cached_chart("bar", event_count_data, x="eventName", y="eventCount", title="Event Count by Event Name")
         st.plotly_chart(fig, use_container_width=True)
     else:
         st.warning("No events data available.")
@@ -462,14 +686,14 @@ def page_ecommerce(ecommerce_data):
     if ecommerce_data is not None and not ecommerce_data.empty:
         # Group by product name
         st.subheader("Revenue by Product")
-        product_revenue_data = ecommerce_data.groupby("productName")["itemRevenue"].sum().reset_index()
-        fig = px.bar(product_revenue_data, x="productName", y="itemRevenue", title="Revenue by Product")
+        product_revenue_data = aggregate_by("page_ecommerce", ecommerce_data, "productName", "itemRevenue")
+        fig = cached_chart("bar", product_revenue_data, x="productName", y="itemRevenue", title="Revenue by Product")
         st.plotly_chart(fig, use_container_width=True)
 
         # Group by product category
         st.subheader("Items Purchased by Product Category")
-        category_data = ecommerce_data.groupby("productCategory")["itemsPurchased"].sum().reset_index()
-        fig = px.pie(category_data, values="itemsPurchased", names="productCategory", title="Items Purchased by Product Category")
+        category_data = aggregate_by("page_ecommerce", ecommerce_data, "productCategory", "itemsPurchased")
+        fig = cached_chart("pie", category_data, values="itemsPurchased", names="productCategory", title="Items Purchased by Product Category")
         st.plotly_chart(fig, use_container_width=True)
     else:
         st.warning("No e-commerce data available.")
@@ -482,14 +706,14 @@ def page_ltv(ltv_data):
     if ltv_data is not None and not ltv_data.empty:
         # Group by lifetime bucket
         st.subheader("Lifetime Revenue by User Bucket")
-        ltv_revenue_data = ltv_data.groupby("userLifetimeBucket")["userLifetimeRevenue"].sum().reset_index()
-        fig = px.bar(ltv_revenue_data, x="userLifetimeBucket", y="userLifetimeRevenue", title="Lifetime Revenue by User Bucket")
+        ltv_revenue_data = aggregate_by("page_ltv", ltv_data, "userLifetimeBucket", "userLifetimeRevenue")
+        fig = cached_chart("bar", ltv_revenue_data, x="userLifetimeBucket", y="userLifetimeRevenue", title="Lifetime Revenue by User Bucket")
         st.plotly_chart(fig, use_container_width=True)
 
         # Group by lifetime transactions
         st.subheader("Lifetime Transactions by User Bucket")
-        ltv_transactions_data = ltv_data.groupby("userLifetimeBucket")["userLifetimeTransactions"].sum().reset_index()
-        fig = px.bar(ltv_transactions_data, x="userLifetimeBucket", y="userLifetimeTransactions", title="Lifetime Transactions by User Bucket")
+        ltv_transactions_data = aggregate_by("page_ltv", ltv_data, "userLifetimeBucket", "userLifetimeTransactions")
+        fig = cached_chart("bar", ltv_transactions_data, x="userLifetimeBucket", y="userLifetimeTransactions", title="Lifetime Transactions by User Bucket")
         st.plotly_chart(fig, use_container_width=True)
     else:
         st.warning("No LTV data available.")
@@ -504,14 +728,14 @@ def page_audience(audience_data):
         if "audienceName" in audience_data.columns:
             # Group by audience name
             st.subheader("Active Users by Audience")
-            audience_users_data = audience_data.groupby("audienceName")["activeUsers"].sum().reset_index()
-            fig = px.bar(audience_users_data, x="audienceName", y="activeUsers", title="Active Users by Audience")
+            audience_users_data = aggregate_by("page_audience", audience_data, "audienceName", "activeUsers")
+            fig = cached_chart("bar", audience_users_data, x="audienceName", y="activeUsers", title="Active Users by Audience")
             st.plotly_chart(fig, use_container_width=True)
 
             # Group by conversions
             st.subheader("Conversions by Audience")
-            audience_conversions_data = audience_data.groupby("audienceName")["conversions"].sum().reset_index()
-            fig = px.pie(audience_conversions_data, values="conversions", names="audienceName", title="Conversions by Audience")
+            audience_conversions_data = aggregate_by("page_audience", audience_data, "audienceName", "conversions")
+            fig = cached_chart("pie", audience_conversions_data, values="conversions", names="audienceName", title="Conversions by Audience")
             st.plotly_chart(fig, use_container_width=True)
         else:
             st.warning("The 'audienceName' column is missing in the audience data.")
@@ -528,16 +752,16 @@ def page_app(app_data):
         if "screenPageViews" in app_data.columns:
             # Group by app version
             st.subheader("Screen Views by App Version")
-            app_version_data = app_data.groupby("appVersion")["screenPageViews"].sum().reset_index()
-            fig = px.bar(app_version_data, x="appVersion", y="screenPageViews", title="Screen Views by App Version")
+            app_version_data = aggregate_by("page_app", app_data, "appVersion", "screenPageViews")
+            fig = cached_chart("bar", app_version_data, x="appVersion", y="screenPageViews", title="Screen Views by App Version")
             st.plotly_chart(fig, use_container_width=True)
         else:
             st.warning("The 'screenPageViews' column is missing in the app data.")
 
         # Group by platform
         st.subheader("User Engagement by Platform")
-        platform_data = app_data.groupby("platform")["userEngagementDuration"].sum().reset_index()
-        fig = px.pie(platform_data, values="userEngagementDuration", names="platform", title="User Engagement by Platform")
+        platform_data = aggregate_by("page_app", app_data, "platform", "userEngagementDuration")
+        fig = cached_chart("pie", platform_data, values="userEngagementDuration", names="platform", title="User Engagement by Platform")
         st.plotly_chart(fig, use_container_width=True)
     else:
         st.warning("No app-specific data available.")
@@ -550,14 +774,14 @@ def page_funnel(funnel_data):
     if funnel_data is not None and not funnel_data.empty:
         # Group by funnel step
         st.subheader("Conversions by Funnel Step")
-        funnel_conversions_data = funnel_data.groupby("funnelStep")["funnelConversions"].sum().reset_index()
-        fig = px.bar(funnel_conversions_data, x="funnelStep", y="funnelConversions", title="Conversions by Funnel Step")
+        funnel_conversions_data = aggregate_by("page_funnel", funnel_data, "funnelStep", "funnelConversions")
+        fig = cached_chart("bar", funnel_conversions_data, x="funnelStep", y="funnelConversions", title="Conversions by Funnel Step")
         st.plotly_chart(fig, use_container_width=True)
 
         # Group by funnel drop-off rate
         st.subheader("Drop-Off Rate by Funnel Step")
-        funnel_dropoff_data = funnel_data.groupby("funnelStep")["funnelDropOffRate"].mean().reset_index()
-        fig = px.line(funnel_dropoff_data, x="funnelStep", y="funnelDropOffRate", title="Drop-Off Rate by Funnel Step")
+        funnel_dropoff_data = aggregate_by("page_funnel", funnel_data, "funnelStep", "funnelDropOffRate", agg="mean")
+        fig = cached_chart("line", funnel_dropoff_data, x="funnelStep", y="funnelDropOffRate", title="Drop-Off Rate by Funnel Step")
         st.plotly_chart(fig, use_container_width=True)
     else:
         st.warning("No funnel analysis data available.")
@@ -570,19 +794,20 @@ def page_retention(retention_data):
     if retention_data is not None and not retention_data.empty:
         # Group by cohort
         st.subheader("Retained Users by Cohort")
-        cohort_data = retention_data.groupby("cohort")["retainedUsers"].sum().reset_index()
-        fig = px.bar(cohort_data, x="cohort", y="retainedUsers", title="Retained Users by Cohort")
+        cohort_data = aggregate_by("page_retention", retention_data, "cohort", "retainedUsers")
+        fig = cached_chart("bar", cohort_data, x="cohort", y="retainedUsers", title="Retained Users by Cohort")
         st.plotly_chart(fig, use_container_width=True)
 
         # Group by retention rate
         st.subheader("Retention Rate by Cohort")
-        retention_rate_data = retention_data.groupby("cohort")["retentionRate"].mean().reset_index()
-        fig = px.line(retention_rate_data, x="cohort", y="retentionRate", title="Retention Rate by Cohort")
+        retention_rate_data = aggregate_by("page_retention", retention_data, "cohort", "retentionRate", agg="mean")
+        fig = cached_chart("line", retention_rate_data, x="cohort", y="retentionRate", title="Retention Rate by Cohort")
         st.plotly_chart(fig, use_container_width=True)
     else:
         st.warning("No retention & cohorts data available.")
 
 # Page 13: Site Speed & Performance
+@st.fragment
 def page_site_speed(site_speed_data):
     st.title("⏱️ Site Speed & Performance")
     st.markdown("This page shows the performance of your website.")
@@ -590,29 +815,37 @@ def page_site_speed(site_speed_data):
     if site_speed_data is not None and not site_speed_data.empty:
         # Check if 'eventName' column exists
         if "eventName" in site_speed_data.columns:
-            # Filter for the custom event 'page_load'
-            page_load_data = site_speed_data[site_speed_data["eventName"] == "page_load"]
+            # Filter for the custom event 'page_load' and calculate average page load time by page path
+            load_time_data = aggregate_by("page_site_speed", site_speed_data, "pagePath", "averageSessionDuration",
+                                          agg="mean", where={"eventName": "page_load"})
 
-            if not page_load_data.empty:
-                # Group by page path and calculate average page load time
+            if not load_time_data.empty:
                 st.subheader("Average Page Load Time by Page")
-                load_time_data = page_load_data.groupby("pagePath")["averageSessionDuration"].mean().reset_index()
-                fig = px.bar(load_time_data, x="pagePath", y="averageSessionDuration", title="Average Page Load Time by Page")
+                fig = cached_chart("bar", load_time_data, x="pagePath", y="averageSessionDuration", title="Average Page Load Time by Page")
                 st.plotly_chart(fig, use_container_width=True)
+
+                st.subheader("Average Page Load Time by Section")
+                show_section_rollup("page_site_speed", site_speed_data, "averageSessionDuration", agg="mean",
+                                    where={"eventName": "page_load"}, title="Average Page Load Time by Section")
             else:
                 st.warning("No page load time data available.")
         else:
             # If 'eventName' is missing, display general site speed data
             st.subheader("Average Session Duration by Page")
-            load_time_data = site_speed_data.groupby("pagePath")["averageSessionDuration"].mean().reset_index()
-            fig = px.bar(load_time_data, x="pagePath", y="averageSessionDuration", title="Average Session Duration by Page")
+            load_time_data = aggregate_by("page_site_speed", site_speed_data, "pagePath", "averageSessionDuration", agg="mean")
+            fig = cached_chart("bar", load_time_data, x="pagePath", y="averageSessionDuration", title="Average Session Duration by Page")
             st.plotly_chart(fig, use_container_width=True)
+
+            st.subheader("Average Session Duration by Section")
+            show_section_rollup("page_site_speed", site_speed_data, "averageSessionDuration", agg="mean",
+                                title="Average Session Duration by Section")
     else:
         st.warning("No site speed & performance data available.")
 
 
 
 # Page 14: Error Tracking
+@st.fragment
 def page_error_tracking(error_data):
     st.title("❌ Error Tracking")
     st.markdown("This page shows errors encountered by users.")
@@ -620,24 +853,64 @@ def page_error_tracking(error_data):
     if error_data is not None and not error_data.empty:
         # Group by error type
         st.subheader("Error Count by Error Type")
-        error_count_data = error_data.groupby("eventName")["eventCount"].sum().reset_index()
-        fig = px.bar(error_count_data, x="eventName", y="eventCount", title="Error Count by Error Type")
+        error_count_data = aggregate_by("page_error_tracking", error_data, "eventName", "eventCount")
+        fig = cached_chart("bar", error_count_data, x="eventName", y="eventCount", title="Error Count by Error Type")
         st.plotly_chart(fig, use_container_width=True)
+
+        # Errors rolled up by site section
+        if "pagePath" in error_data.columns:
+            st.subheader("Error Count by Section")
+            show_section_rollup("page_error_tracking", error_data, "eventCount", title="Error Count by Section")
     else:
         st.warning("No error tracking data available.")
 
 
+# Deepseek API endpoint and key
+DEEPSEEK_API_URL = "https://api.deepseek.ai/v1/chat"  # Replace with actual endpoint
+DEEPSEEK_API_KEY = "<YOUR API KEY>"  # Replace with your API key
+
+# Function to get the AI client shared by all sessions, so its connection pool and concurrency limit are too
+@st.cache_resource
+def get_ai_client():
+    return AIInsightsClient(DEEPSEEK_API_URL, api_key=DEEPSEEK_API_KEY)
+
 # Page 15: Deepseek AI Insights with Digital Marketing Expert
+@st.fragment
 def page_deepseek_ai(user_traffic_data, conversion_data, demographics_data, device_data, events_data, ecommerce_data, ltv_data, audience_data, app_data, funnel_data, retention_data, site_speed_data, error_data):
     st.title("🤖 AI Insights")
     st.markdown("This page provides advanced insights and recommendations using AI as your Digital Marketing Expert.")
 
-    # Deepseek API endpoint and headers (global scope)
-    DEEPSEEK_API_URL = "https://api.deepseek.ai/v1/chat"  # Replace with actual endpoint
-    headers = {
-        "Authorization": f"Bearer <YOUR API KEY>",  # Replace with your API key
-        "Content-Type": "application/json"
+    client = get_ai_client()
+
+    # All available datasets for Deepseek AI; serialized once per dataset version by build_ai_payload
+    datasets = {
+        "user_traffic": user_traffic_data,
+        "conversions": conversion_data,
+        "demographics": demographics_data,
+        "device": device_data,
+        "events": events_data,
+        "ecommerce": ecommerce_data,
+        "ltv": ltv_data,
+        "audience": audience_data,
+        "app": app_data,
+        "funnel": funnel_data,
+        "retention": retention_data,
+        "site_speed": site_speed_data,
+        "errors": error_data,
     }
+    fallback_response = "Deepseek AI is currently unavailable. Here are some general insights based on your data: [Placeholder Insights]"
+
+    # Function to stream an answer into the page, falling back to predefined insights on errors
+    def stream_answer(query):
+        try:
+            return st.write_stream(client.stream(query, datasets))
+        except AIResponseError as e:
+            st.error(f"Failed to get response from Deepseek AI. Status Code: {e.status_code}")
+        except requests.exceptions.RequestException as e:
+            st.error(f"Failed to connect to Deepseek AI. Please check your internet connection or the API endpoint. Error: {e}")
+        # Fallback: Use predefined insights
+        st.markdown(fallback_response)
+        return fallback_response
 
     # Chatbot Interface
     st.subheader("Digital Marketing Expert Chatbot")
@@ -650,78 +923,6 @@ def page_deepseek_ai(user_traffic_data, conversion_data, demographics_data, devi
     # User input
     user_input = st.text_input("Ask me anything about your digital marketing data:")
 
-    if user_input:
-        # Prepare all available data for Deepseek AI
-        data_to_send = {
-            "query": user_input,
-            "data": {}
-        }
-
-        # Function to convert Timestamp columns to strings
-        def convert_timestamps(df):
-            for col in df.columns:
-                if pd.api.types.is_datetime64_any_dtype(df[col]):
-                    df[col] = df[col].astype(str)  # Convert Timestamp to string
-            return df
-
-        # Add available datasets to the payload
-        if user_traffic_data is not None:
-            user_traffic_data = convert_timestamps(user_traffic_data)
-            data_to_send["data"]["user_traffic"] = user_traffic_data.to_dict(orient="records")
-        if conversion_data is not None:
-            conversion_data = convert_timestamps(conversion_data)
-            data_to_send["data"]["conversions"] = conversion_data.to_dict(orient="records")
-        if demographics_data is not None:
-            demographics_data = convert_timestamps(demographics_data)
-            data_to_send["data"]["demographics"] = demographics_data.to_dict(orient="records")
-        if device_data is not None:
-            device_data = convert_timestamps(device_data)
-            data_to_send["data"]["device"] = device_data.to_dict(orient="records")
-        if events_data is not None:
-            events_data = convert_timestamps(events_data)
-            data_to_send["data"]["events"] = events_data.to_dict(orient="records")
-        if ecommerce_data is not None:
-            ecommerce_data = convert_timestamps(ecommerce_data)
-            data_to_send["data"]["ecommerce"] = ecommerce_data.to_dict(orient="records")
-        if ltv_data is not None:
-            ltv_data = convert_timestamps(ltv_data)
-            data_to_send["data"]["ltv"] = ltv_data.to_dict(orient="records")
-        if audience_data is not None:
-            audience_data = convert_timestamps(audience_data)
-            data_to_send["data"]["audience"] = audience_data.to_dict(orient="records")
-        if app_data is not None:
-            app_data = convert_timestamps(app_data)
-            data_to_send["data"]["app"] = app_data.to_dict(orient="records")
-        if funnel_data is not None:
-            funnel_data = convert_timestamps(funnel_data)
-            data_to_send["data"]["funnel"] = funnel_data.to_dict(orient="records")
-        if retention_data is not None:
-            retention_data = convert_timestamps(retention_data)
-            data_to_send["data"]["retention"] = retention_data.to_dict(orient="records")
-        if site_speed_data is not None:
-            site_speed_data = convert_timestamps(site_speed_data)
-            data_to_send["data"]["site_speed"] = site_speed_data.to_dict(orient="records")
-        if error_data is not None:
-            error_data = convert_timestamps(error_data)
-            data_to_send["data"]["errors"] = error_data.to_dict(orient="records")
-
-        # Send user query and data to Deepseek AI
-        try:
-            response = requests.post(DEEPSEEK_API_URL, headers=headers, json=data_to_send, timeout=10)  # Add timeout
-            if response.status_code == 200:
-                chatbot_response = response.json().get("response", "No response from Deepseek AI.")
-                st.session_state.chat_history.append({"user": user_input, "bot": chatbot_response})
-            else:
-                st.error(f"Failed to get response from Deepseek AI. Status Code: {response.status_code}")
-                # Fallback: Use predefined insights
-                chatbot_response = "Deepseek AI is currently unavailable. Here are some general insights based on your data: [Placeholder Insights]"
-                st.session_state.chat_history.append({"user": user_input, "bot": chatbot_response})
-        except requests.exceptions.RequestException as e:
-            st.error(f"Failed to connect to Deepseek AI. Please check your internet connection or the API endpoint. Error: {e}")
-            # Fallback: Use predefined insights
-            chatbot_response = "Deepseek AI is currently unavailable. Here are some general insights based on your data: [Placeholder Insights]"
-            st.session_state.chat_history.append({"user": user_input, "bot": chatbot_response})
-
     # Display chat history
     st.subheader("Chat History")
     for chat in st.session_state.chat_history:
@@ -729,123 +930,159 @@ def page_deepseek_ai(user_traffic_data, conversion_data, demographics_data, devi
         st.markdown(f"**Bot:** {chat['bot']}")
         st.markdown("---")
 
+    # Send a new question to Deepseek AI; the text input keeps its value on unrelated reruns
+    if user_input and user_input != st.session_state.get("last_question"):
+        st.session_state.last_question = user_input
+        st.markdown(f"**You:** {user_input}")
+        st.markdown("**Bot:**")
+        chatbot_response = stream_answer(user_input) or "No response from Deepseek AI."
+        st.session_state.chat_history.append({"user": user_input, "bot": chatbot_response})
+        st.markdown("---")
+
     # Insights and Prescriptions Section
     st.subheader("Automated Insights and Prescriptions")
     if st.button("Generate Insights and Prescriptions"):
-        # Prepare all available data for Deepseek AI
-        data_to_send = {
-            "query": "Analyze the provided data and provide insights and prescriptions for future digital marketing goals.",
-            "data": {}
-        }
-
-        # Function to convert Timestamp columns to strings
-        def convert_timestamps(df):
-            for col in df.columns:
-                if pd.api.types.is_datetime64_any_dtype(df[col]):
-                    df[col] = df[col].astype(str)  # Convert Timestamp to string
-            return df
-
-        # Add available datasets to the payload
-        if user_traffic_data is not None:
-            user_traffic_data = convert_timestamps(user_traffic_data)
-            data_to_send["data"]["user_traffic"] = user_traffic_data.to_dict(orient="records")
-        if conversion_data is not None:
-            conversion_data = convert_timestamps(conversion_data)
-            data_to_send["data"]["conversions"] = conversion_data.to_dict(orient="records")
-        if demographics_data is not None:
-            demographics_data = convert_timestamps(demographics_data)
-            data_to_send["data"]["demographics"] = demographics_data.to_dict(orient="records")
-        if device_data is not None:
-            device_data = convert_timestamps(device_data)
-            data_to_send["data"]["device"] = device_data.to_dict(orient="records")
-        if events_data is not None:
-            events_data = convert_timestamps(events_data)
-            data_to_send["data"]["events"] = events_data.to_dict(orient="records")
-        if ecommerce_data is not None:
-            ecommerce_data = convert_timestamps(ecommerce_data)
-            data_to_send["data"]["ecommerce"] = ecommerce_data.to_dict(orient="records")
-        if ltv_data is not None:
-            ltv_data = convert_timestamps(ltv_data)
-            data_to_send["data"]["ltv"] = ltv_data.to_dict(orient="records")
-        if audience_data is not None:
-            audience_data = convert_timestamps(audience_data)
-            data_to_send["data"]["audience"] = audience_data.to_dict(orient="records")
-        if app_data is not None:
-            app_data = convert_timestamps(app_data)
-            data_to_send["data"]["app"] = app_data.to_dict(orient="records")
-        if funnel_data is not None:
-            funnel_data = convert_timestamps(funnel_data)
-            data_to_send["data"]["funnel"] = funnel_data.to_dict(orient="records")
-        if retention_data is not None:
-            retention_data = convert_timestamps(retention_data)
-            data_to_send["data"]["retention"] = retention_data.to_dict(orient="records")
-        if site_speed_data is not None:
-            site_speed_data = convert_timestamps(site_speed_data)
-            data_to_send["data"]["site_speed"] = site_speed_data.to_dict(orient="records")
-        if error_data is not None:
-            error_data = convert_timestamps(error_data)
-            data_to_send["data"]["errors"] = error_data.to_dict(orient="records")
-
-        # Send data to Deepseek AI
-        try:
-            response = requests.post(DEEPSEEK_API_URL, headers=headers, json=data_to_send, timeout=10)  # Add timeout
-            if response.status_code == 200:
-                insights = response.json().get("response", "No insights generated.")
-                st.markdown(f"**Insights and Prescriptions:** {insights}")
-            else:
-                st.error(f"Failed to generate insights. Status Code: {response.status_code}")
-                # Fallback: Use predefined insights
-                st.markdown("**Insights and Prescriptions:** Deepseek AI is currently unavailable. Here are some general insights based on your data: [Placeholder Insights]")
-        except requests.exceptions.RequestException as e:
-            st.error(f"Failed to connect to Deepseek AI. Please check your internet connection or the API endpoint. Error: {e}")
-            # Fallback: Use predefined insights
-            st.markdown("**Insights and Prescriptions:** Deepseek AI is currently unavailable. Here are some general insights based on your data: [Placeholder Insights]")
+        st.markdown("**Insights and Prescriptions:**")
+        insights = stream_answer("Analyze the provided data and provide insights and prescriptions for future digital marketing goals.")
+        if not insights:
+            st.markdown("No insights generated.")
+
+# Function to get the trigram keyword index of a Search Console column, built once per dataset version
+def get_keyword_index(data, column):
+    return result_cache.get_or_compute((dataset_version(data), "keyword_index", column), lambda: KeywordIndex(data, column))
+
+# Function to get the topic clusters of a Search Console column, built once per dataset version
+def get_keyword_clusters(data, column="Query"):
+    def compute():
+        clusters = KeywordClusters(get_keyword_index(data, column))
+        # Derived version so charts of the topic summary can be cached without hashing it
+        clusters.summary.attrs['version'] = repr((dataset_version(data), "keyword_clusters", column))
+        return clusters
+
+    return result_cache.get_or_compute((dataset_version(data), "keyword_clusters", column), compute)
+
+# Function to get the rank history index, rebuilt only when the store's partitions change
+def get_rank_index(root=RANK_HISTORY_DIR):
+    store = RankHistoryStore(root)
+    version = store.version()
+    return result_cache.get_or_compute((version, "rank_index"), lambda: RankIndex(store.read())), version
 
 #Page 16: Function for keyword analysis
-def page_search_console(search_console_data):
+@st.fragment
+def page_search_console(search_console_data, rank_history_dir=RANK_HISTORY_DIR):
     st.title("🔍 Search Console Data")
     st.markdown("This page shows search performance data from Google Search Console.")
 
     if search_console_data is not None and not search_console_data.empty:
+        # Keyword search over queries or pages, answered from the trigram index
+        st.subheader("Keyword Search")
+        col1, col2, col3 = st.columns([3, 1, 1])
+        with col1:
+            search_term = st.text_input("Search term", placeholder="e.g. data entry")
+        with col2:
+            search_column = st.radio("Search in", ["Query", "Page"], horizontal=True)
+        with col3:
+            match_mode = st.radio("Match", ["Contains", "Starts with"], horizontal=True)
+
+        if search_term.strip():
+            keyword_index = get_keyword_index(search_console_data, search_column)
+            prefix = match_mode == "Starts with"
+            clicks, impressions, ctr, position = keyword_index.totals(search_term, prefix)
+            matches = keyword_index.results(search_term, prefix)
+
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                display_metric("Clicks", int(clicks), 0)
+            with col2:
+                display_metric("Impressions", int(impressions), 0)
+            with col3:
+                display_metric("CTR", f"{ctr:.2%}", 0)
+            with col4:
+                display_metric("Avg Position", "-" if pd.isna(position) else f"{position:.1f}", 0)
+
+            st.caption(f"{len(matches):,} matching {search_column.lower()} values"
+                       + (", showing the 1,000 most clicked" if len(matches) > 1000 else ""))
+            st.dataframe(matches.head(1000))
+
+        # Rank tracking from the daily history store
+        st.subheader("Rank Tracking")
+        rank_index, rank_version = get_rank_index(rank_history_dir)
+        if rank_index.queries:
+            tracked = st.multiselect("Tracked queries", rank_index.queries, default=rank_index.queries[:5])
+            if tracked:
+                ranks = rank_index.histories(tracked)
+                ranks.attrs['version'] = repr((rank_version, tuple(tracked)))
+                def build_ranks():
+                    fig = px.line(ranks, x="date", y="Position", color="Query", markers=True, title="Average Position Over Time")
+                    fig.update_yaxes(autorange="reversed")  # Position 1 at the top
+                    return fig
+                st.plotly_chart(cached_figure(ranks, "rank_tracking", build_ranks), use_container_width=True)
+        else:
+            st.info("No rank history yet. Daily positions are collected each time the data is refreshed.")
+
+        # Topics: long-tail queries rolled up by the words they share
+        st.subheader("Keyword Topics")
+        clusters = get_keyword_clusters(search_console_data, "Query")
+        topics = clusters.summary
+        if not topics.empty:
+            fig = cached_chart("bar", derive_version(topics.head(20), topics, "head", 20), x="Topic", y="Impressions", title="Top Topics by Impressions")
+            st.plotly_chart(fig, use_container_width=True)
+            st.dataframe(topics.drop(columns="cluster").rename(columns={"Query": "Queries"}))
+
+            topic = st.selectbox("Queries in topic", topics["cluster"], format_func=lambda cluster: clusters.names[cluster])
+            st.dataframe(get_keyword_index(search_console_data, "Query").table(clusters.member_ids(topic)))
+
         # Display top queries
         st.subheader("Top Queries by Clicks")
-        top_queries = search_console_data.sort_values(by="Clicks", ascending=False).head(10)
+        top_queries = top_k(search_console_data, "Clicks")
         st.dataframe(top_queries)
 
         # Display top pages
         st.subheader("Top Pages by Clicks")
-        top_pages = search_console_data.groupby("Page")["Clicks"].sum().reset_index().sort_values(by="Clicks", ascending=False).head(10)
+        top_pages = top_k(search_console_data, "Clicks", dimension="Page")
         st.dataframe(top_pages)
     else:
         st.warning("No search console data available.")
 
 #Page17: SEO Metrics Overview
-def page_seo_overview(search_console_data, ga4_data, seo_data):
+def page_seo_overview(search_console_data, ga4_data, seo_data, page_views_data=None):
     st.title("📊 SEO Metrics Overview")
     st.markdown("This page provides an overview of key SEO metrics.")
 
     if search_console_data is not None and not search_console_data.empty:
         st.header("Google Search Console Data")
         st.subheader("Top Queries by Clicks")
-        top_queries = search_console_data.groupby('Query')['Clicks'].sum().reset_index().sort_values(by='Clicks', ascending=False).head(10)
+        top_queries = top_k(search_console_data, "Clicks", dimension="Query")
         st.dataframe(top_queries)
 
         st.subheader("CTR by Device")
-        ctr_by_device = search_console_data.groupby('Device')['CTR'].mean().reset_index()
-        fig = px.bar(ctr_by_device, x='Device', y='CTR', title="CTR by Device")
+        ctr_by_device = aggregate_by("page_seo_overview", search_console_data, "Device", "CTR", agg="mean")
+        fig = cached_chart("bar", ctr_by_device, x='Device', y='CTR', title="CTR by Device")
         st.plotly_chart(fig, use_container_width=True)
 
     if ga4_data is not None and not ga4_data.empty:
         st.header("Google Analytics 4 Data")
         st.subheader("Sessions by Page")
-        sessions_by_page = ga4_data.groupby('Page')['Sessions'].sum().reset_index().sort_values(by='Sessions', ascending=False).head(10)
+        sessions_by_page = top_k(ga4_data, "Sessions", dimension="Page")
         st.dataframe(sessions_by_page)
 
         st.subheader("Average Session Duration by Device")
-        avg_duration_by_device = ga4_data.groupby('Device')['AvgSessionDuration'].mean().reset_index()
-        fig = px.bar(avg_duration_by_device, x='Device', y='AvgSessionDuration', title="Average Session Duration by Device")
+        avg_duration_by_device = aggregate_by("page_seo_overview", ga4_data, "Device", "AvgSessionDuration", agg="mean")
+        fig = cached_chart("bar", avg_duration_by_device, x='Device', y='AvgSessionDuration', title="Average Session Duration by Device")
         st.plotly_chart(fig, use_container_width=True)
 
+    # Search -> visit -> engagement per landing page, joined on normalized URLs
+    if search_console_data is not None and not search_console_data.empty and any(
+            data is not None and not data.empty for data in (page_views_data, ga4_data)):
+        st.header("SEO Funnel by Landing Page")
+        funnel = seo_funnel(search_console_data, page_views_data, ga4_data)
+        if not funnel.empty:
+            traffic = [column for column in ("Clicks", "Sessions", "screenPageViews") if column in funnel.columns]
+            fig = cached_chart("bar", derive_version(funnel.head(15), funnel, "head", 15), x=LANDING_PAGE, y=traffic, barmode="group",
+                               title="Clicks, Sessions and Views for the Top Landing Pages")
+            st.plotly_chart(fig, use_container_width=True)
+            st.dataframe(funnel)
+
     if seo_data is not None and not seo_data.empty:
         st.header("Third-Party SEO Data")
         st.subheader("Backlinks and Domain Authority")
@@ -931,21 +1168,24 @@ def page_facebook(facebook_data):
             total_clicks = facebook_data["Total clicks"].sum()
             display_metric("Total Clicks", total_clicks, 0)
 
-        # Engagement Trends Over Time
+        # Engagement Trends Over Time (built once, shown again further down the page)
         st.subheader("📊 Facebook Engagement Trends")
-        facebook_data["Date"] = pd.to_datetime(facebook_data["Publish time"], errors='coerce').dt.date
-        fb_trends = facebook_data.groupby("Date")[["Reactions, comments and shares", "Comments", "Shares"]].sum().reset_index()
-        fig = px.line(fb_trends, x="Date", y=["Reactions, comments and shares", "Comments", "Shares"], title="Facebook Engagement Trends")
-        st.plotly_chart(fig, use_container_width=True)
+        def build_trends():
+            trend_columns = ["Reactions, comments and shares", "Comments", "Shares"]
+            post_dates = pd.to_datetime(facebook_data["Publish time"], errors='coerce').dt.date.rename("Date")
+            fb_trends = facebook_data.groupby(post_dates)[trend_columns].sum().reset_index()
+            return px.line(fb_trends, x="Date", y=trend_columns, title="Facebook Engagement Trends")
+        trends_fig = cached_figure(facebook_data, "facebook_engagement_trends", build_trends, filter_key="fillna")
+        st.plotly_chart(trends_fig, use_container_width=True)
 
         # Top 5 Engaging Posts
         st.subheader("🔥 Top 5 Most Engaging Posts")
-        top_posts = facebook_data.sort_values(by="Reactions, comments and shares", ascending=False).head(5)
+        top_posts = top_k(facebook_data, "Reactions, comments and shares", n=5, date_col="Publish time")
         st.dataframe(top_posts[["Title", "Reactions, comments and shares", "Comments", "Shares", "Permalink"]])
 
         # Reach vs. Engagement
         st.subheader("📊 Reach vs. Engagement")
-        fig = px.scatter(facebook_data, x="Reach", y="Reactions, comments and shares", size="Engaged users", title="Reach vs. Engagement Performance")
+        fig = cached_chart("scatter", facebook_data, filter_key="fillna", x="Reach", y="Reactions, comments and shares", size="Engaged users", title="Reach vs. Engagement Performance")
         st.plotly_chart(fig, use_container_width=True)
 
         st.subheader("💰 Revenue & User Experience Metrics")
@@ -962,27 +1202,24 @@ def page_facebook(facebook_data):
 
         # Engagement Trends Over Time
         st.subheader("📊 Facebook Engagement Trends")
-        facebook_data["Date"] = pd.to_datetime(facebook_data["Publish time"], errors='coerce').dt.date
-        fb_trends = facebook_data.groupby("Date")[["Reactions, comments and shares", "Comments", "Shares"]].sum().reset_index()
-
-        fig1 = px.line(fb_trends, x="Date", y=["Reactions, comments and shares", "Comments", "Shares"], title="Facebook Engagement Trends")
-        st.plotly_chart(fig1, use_container_width=True, key="facebook_trends")
+        st.plotly_chart(trends_fig, use_container_width=True, key="facebook_trends")
 
         # Engagement Distribution Chart
         st.subheader("📊 Engagement Distribution")
-        fig2 = px.histogram(facebook_data, x="Reactions, comments and shares", nbins=20, title="Engagement Distribution")
+        fig2 = cached_chart("histogram", facebook_data, filter_key="fillna", x="Reactions, comments and shares", nbins=20, title="Engagement Distribution")
         st.plotly_chart(fig2, use_container_width=True, key="facebook_distribution")
 
         # Top 5 Performing Posts
         st.subheader("🔥 Top 5 Most Engaging Posts")
-        top_posts = facebook_data.sort_values(by="Reactions, comments and shares", ascending=False).head(5)
+        top_posts = top_k(facebook_data, "Reactions, comments and shares", n=5, date_col="Publish time")
         st.dataframe(top_posts[["Title", "Reactions, comments and shares", "Comments", "Shares", "Permalink"]])
 
         # Reach vs. Engagement (Scatter Plot)
         facebook_data["Engaged users"] = facebook_data["Engaged users"].fillna(0)
         scatter_data = facebook_data[["Reach", "Reactions, comments and shares", "Engaged users"]].dropna()
+        derive_version(scatter_data, facebook_data, "reach_engagement_scatter")
         
-        fig3 = px.scatter(scatter_data, x="Reach", y="Reactions, comments and shares", size="Engaged users",
+        fig3 = cached_chart("scatter", scatter_data, x="Reach", y="Reactions, comments and shares", size="Engaged users",
                           title="Reach vs. Engagement Performance")
         st.plotly_chart(fig3, use_container_width=True, key="facebook_scatter")
     else:
@@ -1006,20 +1243,22 @@ def page_instagram(instagram_data):
             display_metric("Total Followers", total_followers, 0)
 
         st.subheader("Likes Over Time")
-        fig = px.line(instagram_data, x="Date", y="Reach", title="Likes Over Time")
-        st.plotly_chart(fig, use_container_width=True)
+        time_series_chart("line", instagram_data, key="instagram_reach", x="Date", y="Reach", title="Likes Over Time")
 
         st.subheader("Comments Over Time")
-        fig = px.line(instagram_data, x="Date", y="Comments", title="Comments Over Time")
-        st.plotly_chart(fig, use_container_width=True)
+        time_series_chart("line", instagram_data, key="instagram_comments", x="Date", y="Comments", title="Comments Over Time")
 
 # Function to display LinkedIn data in the dashboard
+@st.fragment
 def page_linkedin_analysis(metrics_df, posts_df):
     """
     Display LinkedIn metrics and posts analysis in a single page.
+
+    As a fragment, changing the granularity reruns only this page.
     """
     st.title("🔗 LinkedIn Analysis")
     st.markdown("This page analyzes LinkedIn engagement metrics and individual posts.")
+    granularity = st.radio("Granularity", list(GRANULARITIES), index=1, horizontal=True)
 
     # Section 1: LinkedIn Metrics
     st.header("📊 LinkedIn Metrics")
@@ -1037,25 +1276,28 @@ def page_linkedin_analysis(metrics_df, posts_df):
             total_engagement = metrics_df['Engagement rate (total)'].mean()
             display_metric("Avg Engagement Rate", f"{total_engagement:.2f}%",0)
 
+        # Bucket totals and the average engagement rate at the selected granularity
+        totals = bucket_metrics(metrics_df, ['Impressions (total)', 'Clicks (total)'], granularity, date_col='Date')
+        engagement = bucket_metrics(metrics_df, ['Engagement rate (total)'], granularity, date_col='Date', agg="mean")
+        performance = totals.merge(engagement, on='period', how='left')
+
         # Plot impressions over time
         st.subheader("Impressions Over Time")
-        fig = px.line(metrics_df, x='Date', y='Impressions (total)', title="Total Impressions Over Time")
-        st.plotly_chart(fig, use_container_width=True)
+        time_series_chart("line", performance, key="linkedin_impressions", x='period', y='Impressions (total)', title="Total Impressions Over Time")
 
         # Plot engagement rate over time
         st.subheader("Engagement Rate Over Time")
-        fig = px.line(metrics_df, x='Date', y='Engagement rate (total)', title="Engagement Rate Over Time")
-        st.plotly_chart(fig, use_container_width=True)
+        time_series_chart("line", performance, key="linkedin_engagement_rate", x='period', y='Engagement rate (total)', title="Engagement Rate Over Time")
 
         # Impressions vs Clicks vs Engagement Rate
         st.subheader("📊 Impressions vs Clicks vs Engagement")
-        fig = px.line(metrics_df, x="Date", y=["Impressions (total)", "Clicks (total)", "Engagement rate (total)"],
-                      title="LinkedIn Performance Over Time")
-        st.plotly_chart(fig, use_container_width=True)
+        time_series_chart("line", performance, key="linkedin_performance", x="period",
+                          y=["Impressions (total)", "Clicks (total)", "Engagement rate (total)"],
+                          title="LinkedIn Performance Over Time")
 
         # Engagement Rate Histogram
         st.subheader("📊 Engagement Rate Distribution")
-        fig = px.histogram(metrics_df, x="Engagement rate (total)", nbins=10, title="Distribution of Engagement Rate")
+        fig = cached_chart("histogram", metrics_df, x="Engagement rate (total)", nbins=10, title="Distribution of Engagement Rate")
         st.plotly_chart(fig, use_container_width=True)
 
     else:
@@ -1066,27 +1308,27 @@ def page_linkedin_analysis(metrics_df, posts_df):
     if posts_df is not None and not posts_df.empty:
         # Display top posts by impressions
         st.subheader("Top Posts by Impressions")
-        top_posts = posts_df.sort_values(by='Impressions', ascending=False).head(10)
+        top_posts = top_k(posts_df, 'Impressions', date_col='Created date')
         st.dataframe(top_posts[['Post title', 'Impressions', 'Clicks', 'Engagement rate']])
 
         # Plot engagement metrics for top posts
         st.subheader("Engagement Metrics for Top Posts")
-        fig = px.bar(top_posts, x='Post title', y=['Likes', 'Comments', 'Reposts'], 
+        fig = cached_chart("bar", top_posts, x='Post title', y=['Likes', 'Comments', 'Reposts'], 
                      title="Engagement Metrics for Top Posts")
         st.plotly_chart(fig, use_container_width=True)
 
         # Top Posts by Engagement Rate
         st.subheader("🔥 Top 5 Posts by Engagement Rate")
-        top_posts = posts_df.sort_values(by="Engagement rate", ascending=False).head(5)
+        top_posts = top_k(posts_df, "Engagement rate", n=5, date_col="Created date")
         st.dataframe(top_posts[['Post title', 'Impressions', 'Clicks', 'Engagement rate']])
 
         # Most Shared LinkedIn Posts
         st.subheader("🔄 Most Shared LinkedIn Posts")
-        fig = px.bar(posts_df.sort_values(by="Reposts", ascending=False).head(10),
+        fig = cached_chart("bar", top_k(posts_df, "Reposts", date_col="Created date"),
                      x="Post title", y="Reposts", title="Most Shared LinkedIn Posts")
         st.plotly_chart(fig, use_container_width=True)
 
-        display_post_metrics(posts_df,metrics_df)
+        display_post_metrics(posts_df, metrics_df, granularity)
     else:
         st.warning("No LinkedIn posts data found.")
 
@@ -1108,11 +1350,10 @@ def page_youtube(youtube_data):
             display_metric("Total Comments", total_comments, 0)
 
         st.subheader("Views Over Time")
-        fig = px.line(youtube_data, x="Date", y="Views", title="Views Over Time")
-        st.plotly_chart(fig, use_container_width=True)
+        time_series_chart("line", youtube_data, key="youtube_views", x="Date", y="Views", title="Views Over Time")
 
         st.subheader("Top Videos by Views")
-        top_videos = youtube_data.sort_values(by="Views", ascending=False).head(10)
+        top_videos = top_k(youtube_data, "Views")
         st.dataframe(top_videos)
 
 def page_x(x_data):
@@ -1133,14 +1374,13 @@ def page_x(x_data):
             display_metric("Total Likes", total_likes, 0)
 
         st.subheader("Engagement Over Time")
-        fig = px.line(x_data, x="Date", y="Engagement", title="Engagement Over Time")
-        st.plotly_chart(fig, use_container_width=True)
+        time_series_chart("line", x_data, key="x_engagement", x="Date", y="Engagement", title="Engagement Over Time")
 
         st.subheader("Top Tweets by Engagement")
-        top_tweets = x_data.sort_values(by="Engagement", ascending=False).head(10)
+        top_tweets = top_k(x_data, "Engagement")
         st.dataframe(top_tweets)
 
-def calculate_post_metrics(posts_df):
+def calculate_post_metrics(posts_df, granularity="Weekly"):
     if posts_df is None or posts_df.empty:
         return None
 
@@ -1152,51 +1392,48 @@ def calculate_post_metrics(posts_df):
         st.error("❌ No valid date column found in the LinkedIn posts dataset.")
         return None
 
-    # Convert to datetime
-    posts_df[date_col] = pd.to_datetime(posts_df[date_col])
-
-    # Aggregate posts weekly
-    posts_df['week'] = posts_df[date_col].dt.to_period('W').astype(str)
-    weekly_posts = posts_df.groupby('week').size().reset_index(name='num_posts')
+    # Count posts per calendar bucket, including buckets without posts
+    posts = pd.DataFrame({date_col: pd.to_datetime(posts_df[date_col]), 'num_posts': 1})
+    posts.attrs = dict(posts_df.attrs)
+    period_posts = bucket_metrics(posts, ['num_posts'], granularity, date_col=date_col).copy()
 
-    # Calculate week-over-week growth
-    weekly_posts['post_growth'] = weekly_posts['num_posts'].pct_change() * 100
+    # Calculate period-over-period growth
+    period_posts['post_growth'] = growth_rate(period_posts['num_posts'])
     
-    return weekly_posts
+    return period_posts
 
-def display_post_metrics(posts_df, linkedin_metrics):
+def display_post_metrics(posts_df, linkedin_metrics, granularity="Weekly"):
     if posts_df is None or posts_df.empty:
         st.warning("No LinkedIn post data available.")
         return
 
-    weekly_posts = calculate_post_metrics(posts_df)
-    if weekly_posts is None or weekly_posts.empty:
+    period_posts = calculate_post_metrics(posts_df, granularity)
+    if period_posts is None or period_posts.empty:
         return
 
+    period_name = {"Daily": "Day", "Weekly": "Week", "Monthly": "Month"}[granularity]
     st.subheader("📈 LinkedIn Post Growth Metrics")
     
     col1, col2 = st.columns(2)
 
     with col1:
-        latest_week = weekly_posts.iloc[-1] if not weekly_posts.empty else None
-        num_posts = latest_week['num_posts'] if latest_week is not None else 0
-        display_metric("📌 Posts This Week", num_posts, 0)
+        latest_period = period_posts.iloc[-1]
+        display_metric(f"📌 Posts This {period_name}", int(latest_period['num_posts']), 0)
 
     with col2:
-        post_growth = latest_week['post_growth'] if latest_week is not None else 0
+        post_growth = latest_period['post_growth']
+        post_growth = 0 if pd.isna(post_growth) else post_growth
         display_metric("📈 Post Growth (%)", f"{post_growth:.2f}%", post_growth)
 
     # Compare post growth with views and reach
     if linkedin_metrics is not None and not linkedin_metrics.empty:
-        linkedin_metrics['week'] = pd.to_datetime(linkedin_metrics['Date']).dt.to_period('W').astype(str)
-        weekly_metrics = linkedin_metrics.groupby('week')[['Impressions (total)', 'Clicks (total)']].sum().reset_index()
-        weekly_data = weekly_posts.merge(weekly_metrics, on='week', how='left')
-
-        st.subheader("📊 Weekly Post Trends vs Engagement")
-        fig = px.line(weekly_data, x='week', y=['num_posts', 'Impressions (total)'],
-                      title="Weekly Posts vs Impressions",
-                      markers=True)
-        fig.update_traces(line=dict(width=2))
+        period_metrics = bucket_metrics(linkedin_metrics, ['Impressions (total)', 'Clicks (total)'], granularity, date_col='Date')
+        period_data = period_posts.merge(period_metrics, on='period', how='left')
+
+        st.subheader(f"📊 {granularity} Post Trends vs Engagement")
+        fig = cached_chart("line", period_data, x='period', y=['num_posts', 'Impressions (total)'],
+                      title=f"{granularity} Posts vs Impressions",
+                      markers=True, traces=dict(line=dict(width=2)))
         st.plotly_chart(fig, use_container_width=True)
         
 @st.cache_data
@@ -1204,13 +1441,20 @@ def load_data(filename):
     try:
         data = pd.read_csv(filename)
         
-        # Convert 'date' column to datetime format (YYYYMMDD -> YYYY-MM-DD)
+        # Convert 'date' column to datetime format (YYYYMMDD -> YYYY-MM-DD) and keep rows sorted by it
         if 'date' in data.columns:
             data['date'] = pd.to_datetime(data['date'], format='%Y%m%d')
+            data = sort_by_date(data)
+
+        # Store dimension columns as categoricals with codes shared across the directory's datasets
+        encode_dimensions(data, vocabulary_for(os.path.dirname(filename)))
         
         if data.empty:
             print(f"Warning: The file {filename} is empty.")
             return None  # Return None for empty files without showing a warning
+
+        # Version the dataset by its source file so cached results are invalidated on refresh
+        data.attrs['version'] = file_version(filename)
         return data
     except FileNotFoundError:
         print(f"Error: The file {filename} was not found.")
@@ -1219,29 +1463,74 @@ def load_data(filename):
         print(f"Error loading data from {filename}: {e}")
         return None
 
+# Function to load partitions of a report from a property's partitioned store
+@st.cache_data
+def load_partitions(data_dir, report, partitions):
+    """
+    Load the given ((month, checksum), ...) partitions of a report. The checksums are part
+    of the cache key, so months rewritten by a refresh are read again and others are not.
+    """
+    try:
+        data = PartitionedStore(data_dir).read(report, [month for month, _ in partitions])
+        if data is None or data.empty:
+            return None
+        data = sort_by_date(data)
+
+        # Store dimension columns as categoricals with codes shared across the property's datasets
+        encode_dimensions(data, vocabulary_for(data_dir))
+
+        # Version the dataset by its partitions so cached results are invalidated on refresh
+        data.attrs['version'] = repr((data_dir, report, partitions))
+        return data
+    except Exception as e:
+        print(f"Error loading {report} partitions from {data_dir}: {e}")
+        return None
+
+# Function to load a dated report, reading only the monthly partitions a date range touches
+def load_report(data_dir, filename, date_range=None):
+    """
+    Return a report from the property's partitioned store, or from its CSV file if the
+    report has not been stored in partitions yet.
+
+    With date_range (start, end), months outside the range are skipped using the store's
+    manifest. Whole months are returned; filter_data_by_date() narrows them to the range.
+    """
+    start_date, end_date = date_range or (None, None)
+    partitions = PartitionedStore(data_dir).partitions(report_name(filename), start_date, end_date)
+    if partitions is None:
+        return load_data(os.path.join(data_dir, filename))
+    if not partitions:
+        return None
+    return load_partitions(data_dir, report_name(filename), partitions)
+
+# Function to load a stacked breakdown report, or the cross-product report it replaced
+def load_breakdown_report(data_dir, filename, legacy_filename, date_range=None):
+    """
+    Return the breakdown report if it has been extracted, else the older cross-product
+    report, so properties not refreshed since the switch keep their pages.
+    """
+    if PartitionedStore(data_dir).partitions(report_name(filename)) is not None \
+            or os.path.exists(os.path.join(data_dir, filename)):
+        return load_report(data_dir, filename, date_range)
+    return load_report(data_dir, legacy_filename, date_range)
+
 # Main function for the dashboard
 def main():
-    # Load data
-    user_traffic_data = load_data("analytics_data/user_traffic_data.csv")
-    engagement_data = load_data("analytics_data/engagement_data.csv")
-    acquisition_data = load_data("analytics_data/acquisition_data.csv")
-    conversion_data = load_data("analytics_data/conversion_data.csv")
-    page_views_data = load_data("analytics_data/page_views_data.csv")
-    demographics_data = load_data("analytics_data/demographics_data.csv")
-    device_data = load_data("analytics_data/device_data.csv")
-    events_data = load_data("analytics_data/events_data.csv")
-    ecommerce_data = load_data("analytics_data/ecommerce_data.csv")
-    ltv_data = load_data("analytics_data/ltv_data.csv")
-    audience_data = load_data("analytics_data/audience_data.csv")
-    app_data = load_data("analytics_data/app_data.csv")
-    funnel_data = load_data("analytics_data/funnel_data.csv")
-    retention_data = load_data("analytics_data/retention_data.csv")
-    site_speed_data = load_data("analytics_data/site_speed_data.csv")
-    error_data = load_data("analytics_data/error_data.csv")
-    search_console_data = load_data("analytics_data/search_console_data.csv")
-    search_console_data = load_data('analytics_data/search_console_data.csv')
-    ga4_data = load_data('analytics_data/ga4_data.csv')
-    seo_data = load_data('analytics_data/seo_data.csv')
+    # Property to show; each property in the manifest has its own data directory
+    properties = load_manifest()
+    property_names = [prop["name"] for prop in properties]
+    selected_property = st.sidebar.selectbox("Property", property_names) if len(properties) > 1 else property_names[0]
+    prop = properties[property_names.index(selected_property)]
+    data_dir = prop["data_dir"]
+
+    # Load data; datasets compared across periods on the Overview page keep their full history
+    # (one row per day), the other dated reports are loaded for the selected range below
+    user_traffic_data = load_report(data_dir, "user_traffic_data.csv")
+    engagement_data = load_report(data_dir, "engagement_data.csv")
+    conversion_data = load_report(data_dir, "conversion_data.csv")
+    search_console_data = load_data(os.path.join(data_dir, "search_console_data.csv"))
+    ga4_data = load_data(os.path.join(data_dir, "ga4_data.csv"))
+    seo_data = load_data(os.path.join(data_dir, "seo_data.csv"))
     
     # Load social media data
     linkedin_metrics, linkedin_posts = load_linkedin_excel_data("social_media_data/pro-efficient-data-entry_content_1742193384396.xlsx")
@@ -1249,6 +1538,14 @@ def main():
     instagram_data = load_instagram_data("social_media_data/Feb-01-2025_Mar-15-2025_613168031534769.csv")
     youtube_data = load_social_media_data("social_media_data/youtube_data.xlsx")
     x_data = load_social_media_data("social_media_data/x_data.xlsx")
+    linkedin_metrics = sort_by_date(linkedin_metrics, "Date")
+    linkedin_posts = sort_by_date(linkedin_posts, "Created date")
+
+    # Keyword search indexes for the Keyword Analysis page
+    if search_console_data is not None and not search_console_data.empty:
+        for column in ("Query", "Page"):
+            get_keyword_index(search_console_data, column)
+        get_keyword_clusters(search_console_data, "Query")
 
     # Sidebar for navigation
     st.sidebar.title("Navigation")
@@ -1279,9 +1576,14 @@ def main():
     # Date range filter
     st.sidebar.header("Date Filter")
     if user_traffic_data is not None and not user_traffic_data.empty:
-        # Set the minimum date to February 15, 2025
-        min_date = pd.to_datetime("2025-02-10").date()  # Fixed start date
-        max_date = user_traffic_data['date'].max().date()  # Convert to datetime.date
+        # The range covers the stored days, read from the partition manifest; reports still
+        # kept as a CSV file span the property's extraction start date to their last day
+        bounds = PartitionedStore(data_dir).date_bounds(report_name("user_traffic_data.csv"))
+        if bounds is not None:
+            min_date, max_date = bounds[0].date(), bounds[1].date()
+        else:
+            min_date = pd.to_datetime(prop["start_date"]).date()
+            max_date = user_traffic_data['date'].max().date()  # Convert to datetime.date
         selected_date_range = st.sidebar.date_input(
             "Select Date Range",
             [min_date, max_date],
@@ -1291,20 +1593,71 @@ def main():
     else:
         selected_date_range = None
 
-    # Filter data based on selected date range
-    if selected_date_range:
+    # Load the other dated reports, reading only the partitions the selected range touches
+    report_range = tuple(selected_date_range) if selected_date_range and len(selected_date_range) == 2 else None
+    acquisition_data = load_report(data_dir, "acquisition_data.csv", report_range)
+    page_views_data = load_report(data_dir, "page_views_data.csv", report_range)
+    demographics_data = load_breakdown_report(data_dir, "demographics_breakdown_data.csv", "demographics_data.csv", report_range)
+    device_data = load_breakdown_report(data_dir, "device_breakdown_data.csv", "device_data.csv", report_range)
+    events_data = load_report(data_dir, "events_data.csv", report_range)
+    ecommerce_data = load_report(data_dir, "ecommerce_data.csv", report_range)
+    ltv_data = load_report(data_dir, "ltv_data.csv", report_range)
+    audience_data = load_report(data_dir, "audience_data.csv", report_range)
+    app_data = load_report(data_dir, "app_data.csv", report_range)
+    funnel_data = load_report(data_dir, "funnel_data.csv", report_range)
+    retention_data = load_report(data_dir, "retention_data.csv", report_range)
+    site_speed_data = load_report(data_dir, "site_speed_data.csv", report_range)
+    error_data = load_report(data_dir, "error_data.csv", report_range)
+    # Reports stored before the extractor filtered for errors hold every event; keep only the errors
+    if error_data is not None:
+        error_data = error_events(error_data)
+
+    # Leaderboard indexes over the loaded history; date-filtered pages query them for their range
+    leaderboards = [
+        (page_views_data, "screenPageViews", "pageTitle", "date"),
+        (facebook_data, "Reactions, comments and shares", None, "Publish time"),
+        (linkedin_posts, "Impressions", None, "Created date"),
+        (linkedin_posts, "Engagement rate", None, "Created date"),
+        (linkedin_posts, "Reposts", None, "Created date"),
+    ]
+    for data, metric, dimension, date_col in leaderboards:
+        if data is not None and not data.empty:
+            get_top_k_index(data, metric, dimension, date_col)
+
+    # Keep the full history for period comparisons on the Overview page
+    overview_datasets = (user_traffic_data, engagement_data, conversion_data)
+
+    # Filter every date-bearing dataset based on selected date range
+    # (the date input returns a single date while the user is still picking the range)
+    date_range = None
+    if selected_date_range and len(selected_date_range) == 2:
         start_date, end_date = selected_date_range
+        date_range = (start_date, end_date)
         user_traffic_data = filter_data_by_date(user_traffic_data, start_date, end_date)
         engagement_data = filter_data_by_date(engagement_data, start_date, end_date)
         acquisition_data = filter_data_by_date(acquisition_data, start_date, end_date)
         conversion_data = filter_data_by_date(conversion_data, start_date, end_date)
         page_views_data = filter_data_by_date(page_views_data, start_date, end_date)
         demographics_data = filter_data_by_date(demographics_data, start_date, end_date)
-
-    # Display the selected page
+        device_data = filter_data_by_date(device_data, start_date, end_date)
+        events_data = filter_data_by_date(events_data, start_date, end_date)
+        ecommerce_data = filter_data_by_date(ecommerce_data, start_date, end_date)
+        ltv_data = filter_data_by_date(ltv_data, start_date, end_date)
+        audience_data = filter_data_by_date(audience_data, start_date, end_date)
+        app_data = filter_data_by_date(app_data, start_date, end_date)
+        funnel_data = filter_data_by_date(funnel_data, start_date, end_date)
+        retention_data = filter_data_by_date(retention_data, start_date, end_date)
+        site_speed_data = filter_data_by_date(site_speed_data, start_date, end_date)
+        error_data = filter_data_by_date(error_data, start_date, end_date)
+        facebook_data = filter_data_by_date(facebook_data, start_date, end_date, date_col="Publish time")
+        linkedin_metrics = filter_data_by_date(linkedin_metrics, start_date, end_date, date_col="Date")
+        linkedin_posts = filter_data_by_date(linkedin_posts, start_date, end_date, date_col="Created date")
+
+    # Display the selected page; pages with their own controls are fragments, so using
+    # those controls reruns only the page instead of main()
     if section == "Search Engine Optimization (SEO)":
         if page == "Overview":
-            page_overview(user_traffic_data, engagement_data, conversion_data)
+            page_overview(*overview_datasets, date_range=date_range)
         elif page == "Acquisition":
             page_acquisition(acquisition_data)
         elif page == "Page Views":
@@ -1334,9 +1687,11 @@ def main():
         elif page == "AI Insights":
             page_deepseek_ai(user_traffic_data, conversion_data, demographics_data, device_data, events_data, ecommerce_data, ltv_data, audience_data, app_data, funnel_data, retention_data, site_speed_data, error_data)
         elif page == "Keyword Analysis":
-            page_search_console(search_console_data)
+            page_search_console(search_console_data, os.path.join(data_dir, "rank_history"))
         elif page == "SEO Metrics Overview":
-            page_seo_overview(search_console_data, ga4_data, seo_data)
+            # The funnel sets page views beside lifetime Search Console and GA4 totals, so it
+            # gets the full page view history rather than the selected range
+            page_seo_overview(search_console_data, ga4_data, seo_data, load_report(data_dir, "page_views_data.csv"))
 
     elif section == "Social Media Management (SMM)":
         if page == "Overview":
@@ -2,12 +2,21 @@ from github import Github
 import base64
 from google.analytics.data_v1beta import BetaAnalyticsDataClient
 from google.analytics.data_v1beta.types import (
+    BatchRunPivotReportsRequest,
     DateRange,
     Dimension,
+    Filter,
+    FilterExpression,
+    FilterExpressionList,
     Metric,
+    MetricAggregation,
+    NumericValue,
+    OrderBy,
+    Pivot,
+    RunPivotReportRequest,
     RunReportRequest,
 )
-from google.api_core.exceptions import PermissionDenied
+from google.api_core.exceptions import PermissionDenied, ResourceExhausted
 import pandas as pd
 import streamlit as st
 import matplotlib.pyplot as plt
@@ -21,7 +30,14 @@ from google.oauth2 import service_account
 import requests
 import logging
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
+from rank_history import RankHistoryStore
+from properties import DEFAULT_PROPERTIES, load_manifest
+from partitioned_store import PartitionedStore, report_name
+from dimensions import BREAKDOWN_COLUMN, TOTAL_BREAKDOWN
 
 # Configure logging to show only ERROR messages
 logging.basicConfig(level=logging.ERROR, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -40,7 +56,7 @@ SCOPES = ['https://www.googleapis.com/auth/webmasters.readonly', 'https://www.go
 # SERVICE_ACCOUNT_FILE = 'proefficient-data-entry-194479023ae8.json'
 
 # Google Analytics Property ID (e.g., 'properties/123456789')
-PROPERTY_ID = "properties/477624929"
+PROPERTY_ID = DEFAULT_PROPERTIES[0]["property_id"]  # Default property; properties.json lists them all
 
 # File to save the data
 OUTPUT_DIR = "analytics_data"
@@ -50,9 +66,14 @@ os.makedirs(OUTPUT_DIR, exist_ok=True)
 # creds = service_account.Credentials.from_service_account_file(
 #     SERVICE_ACCOUNT_FILE, scopes=SCOPES)
 
+# GitHub rejects parallel Contents API commits to one branch with 409 conflicts, and properties
+# are extracted on several threads, so pushes are made one at a time
+GITHUB_PUSH_LOCK = threading.Lock()
+
+
 def push_to_github(repo_name, file_path, file_content, commit_message, github_token):
     """
-    Push a file to a GitHub repository.
+    Push a file to a GitHub repository. Calls from different threads are serialized.
     
     :param repo_name: Name of the repository (e.g., "Mohshaikh23/Digital-Marketing")
     :param file_path: Path to the file in the repository (e.g., "analytics_data/user_traffic_data.csv")
@@ -60,23 +81,24 @@ def push_to_github(repo_name, file_path, file_content, commit_message, github_to
     :param commit_message: Commit message
     :param github_token: GitHub personal access token
     """
-    try:
-        # Initialize GitHub instance
-        g = Github(github_token)
-        repo = g.get_repo(repo_name)
-        
-        # Check if the file already exists
+    with GITHUB_PUSH_LOCK:
         try:
-            file = repo.get_contents(file_path)
-            # If the file exists, update it
-            repo.update_file(file_path, commit_message, file_content, file.sha)
-        except:
-            # If the file does not exist, create it
-            repo.create_file(file_path, commit_message, file_content)
-        
-        print(f"Successfully pushed {file_path} to GitHub.")
-    except Exception as e:
-        print(f"Failed to push {file_path} to GitHub: {e}")
+            # Initialize GitHub instance
+            g = Github(github_token)
+            repo = g.get_repo(repo_name)
+            
+            # Check if the file already exists
+            try:
+                file = repo.get_contents(file_path)
+                # If the file exists, update it
+                repo.update_file(file_path, commit_message, file_content, file.sha)
+            except:
+                # If the file does not exist, create it
+                repo.create_file(file_path, commit_message, file_content)
+            
+            print(f"Successfully pushed {file_path} to GitHub.")
+        except Exception as e:
+            print(f"Failed to push {file_path} to GitHub: {e}")
 
 # Initialize the client
 def initialize_client():
@@ -190,6 +212,37 @@ def fetch_search_console_data(creds, site_url, start_date, end_date):
     return pd.DataFrame(data, columns=['Query', 'Page', 'Device', 'Clicks', 'Impressions', 'CTR', 'Position'])
 
 
+# Days of Search Console rank history fetched on every refresh; Google revises recent days
+RANK_HISTORY_REFRESH_DAYS = 7
+
+# Function to fetch daily Search Console rows for the rank history store
+def fetch_search_console_daily(creds, site_url, start_date, end_date, row_limit=25000):
+    service = build('searchconsole', 'v1', credentials=creds)
+
+    data = []
+    start_row = 0
+    while True:
+        request = {
+            'startDate': start_date,
+            'endDate': end_date,
+            'dimensions': ['date', 'query', 'page', 'device'],
+            'rowLimit': row_limit,
+            'startRow': start_row,
+        }
+        response = service.searchanalytics().query(siteUrl=site_url, body=request).execute()
+        rows = response.get('rows', [])
+        for row in rows:
+            date, query, page, device = row['keys']
+            data.append([date, query, page, device, row['clicks'], row['impressions'], row['ctr'], row['position']])
+        if len(rows) < row_limit:
+            break
+        start_row += row_limit
+
+    if not data:
+        return None
+    return pd.DataFrame(data, columns=['date', 'Query', 'Page', 'Device', 'Clicks', 'Impressions', 'CTR', 'Position'])
+
+
 # Function to fetch data from Google Analytics 4
 def fetch_ga4_data(creds, property_id, start_date, end_date):
     service = build('analyticsdata', 'v1beta', credentials=creds)
@@ -243,24 +296,26 @@ def authenticate_google_search_console():
     return creds
 
 # Function to save data to a file
-def save_data(data, filename, github_token=None):
+def save_data(data, filename, github_token=None, data_dir=OUTPUT_DIR):
     """
     Save data to a local file and optionally push it to GitHub.
     
     :param data: DataFrame to save
     :param filename: Name of the file to save
     :param github_token: GitHub personal access token (optional)
+    :param data_dir: Directory to save the file in, e.g. a property's store
     """
     if data is not None and not data.empty:
         # Save data locally
-        local_path = os.path.join(OUTPUT_DIR, filename)
+        os.makedirs(data_dir, exist_ok=True)
+        local_path = os.path.join(data_dir, filename)
         data.to_csv(local_path, index=False)
         print(f"Data saved to {local_path}")
         
         # Push to GitHub if token is provided
         if github_token:
             repo_name = "Mohshaikh23/Digital-Marketing"
-            file_path = f"analytics_data/{filename}"
+            file_path = local_path.replace(os.sep, "/")
             with open(local_path, "r") as file:
                 file_content = file.read()
             push_to_github(repo_name, file_path, file_content, f"Update {filename}", github_token)
@@ -268,32 +323,454 @@ def save_data(data, filename, github_token=None):
         print(f"No data to save for {filename}.")
 
 
-def fetch_data(client, dimensions, metrics, date_ranges, filename):
+# Function to save a dated report into the partitioned store and optionally push the changed files to GitHub
+def save_partitioned(data, filename, github_token=None, data_dir=OUTPUT_DIR, allow_empty=False):
+    """
+    Save a report with a 'date' column as monthly Parquet partitions under data_dir.
+
+    Only months whose rows changed since the last refresh are rewritten or pushed.
+    An empty report is skipped, keeping the stored one, unless allow_empty is set.
+
+    :param data: DataFrame to save
+    :param filename: Name of the report's file, e.g. 'page_views_data.csv' (stored as report=page_views)
+    :param github_token: GitHub personal access token (optional)
+    :param data_dir: Root of the partitioned store, e.g. a property's store
+    :param allow_empty: Store an empty report as having no rows, e.g. a filtered report nothing matched
+    """
+    if data is None or (data.empty and not allow_empty):
+        print(f"No data to save for {filename}.")
+        return
+
+    changed = PartitionedStore(data_dir).write(report_name(filename), data)
+    print(f"Data saved to {data_dir} (report={report_name(filename)}): {len(changed) - 1} partitions changed")
+
+    # Push to GitHub if token is provided; deleted partitions are left for the next manual cleanup
+    if github_token:
+        repo_name = "Mohshaikh23/Digital-Marketing"
+        for local_path in changed:
+            if not os.path.exists(local_path):
+                continue
+            with open(local_path, "rb") as file:
+                file_content = file.read()
+            push_to_github(repo_name, local_path.replace(os.sep, "/"), file_content, f"Update {filename}", github_token)
+
+
+# GA4 requests in flight at once per property, within the API's per-property limit
+MAX_PROPERTY_CONCURRENCY = 2
+
+# Retries of a request refused for quota, waiting QUOTA_BACKOFF_SECONDS * 2 ** attempt before each
+QUOTA_RETRIES = 3
+QUOTA_BACKOFF_SECONDS = 2.0
+
+
+class QuotaExhausted(Exception):
+    """
+    Raised for GA4 calls on a property whose quota ran out earlier in the refresh.
+    """
+
+
+class PropertyQuota:
+    """
+    Gate for the GA4 API calls of one property.
+
+    GA4 quotas are per property, so each property gets its own gate: at most
+    max_concurrency of its requests are in flight, a request refused for quota is retried
+    with exponential backoff, and once the retries run out every later call for the
+    property fails fast with QuotaExhausted. Other properties' gates are unaffected.
+    """
+
+    def __init__(self, name, max_concurrency=MAX_PROPERTY_CONCURRENCY, retries=QUOTA_RETRIES,
+                 backoff=QUOTA_BACKOFF_SECONDS):
+        self.name = name
+        self.retries = retries
+        self.backoff = backoff
+        self.exhausted = False
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    def call(self, function, *args, **kwargs):
+        error = None
+        for attempt in range(self.retries + 1):
+            if self.exhausted:
+                raise QuotaExhausted(f"GA4 quota exhausted for {self.name}")
+            with self._slots:
+                try:
+                    return function(*args, **kwargs)
+                except ResourceExhausted as e:
+                    error = e
+            if attempt < self.retries:
+                time.sleep(self.backoff * 2 ** attempt)
+        self.exhausted = True
+        raise QuotaExhausted(f"GA4 quota exhausted for {self.name}: {error}")
+
+
+# Function to make a GA4 API call, through the property's quota gate if it has one
+def _call_api(quota, function, request):
+    return quota.call(function, request) if quota is not None else function(request)
+
+
+# Event names treated as errors, besides any event whose name contains ERROR_EVENT_SUBSTRING
+ERROR_EVENT_NAMES = ["exception", "page_not_found", "404"]
+ERROR_EVENT_SUBSTRING = "error"
+
+
+# Function to tell which event names are errors, matching the Error Tracking report's GA4 filter
+def is_error_event(event_names):
+    names = pd.Series(event_names).astype(str)
+    return names.isin(ERROR_EVENT_NAMES) | names.str.contains(ERROR_EVENT_SUBSTRING, case=False, regex=False)
+
+
+# Function to build a GA4 filter matching a dimension against a string
+def string_filter(field, value, match_type=Filter.StringFilter.MatchType.EXACT, case_sensitive=True):
+    return FilterExpression(filter=Filter(
+        field_name=field,
+        string_filter=Filter.StringFilter(value=value, match_type=match_type, case_sensitive=case_sensitive),
+    ))
+
+
+# Function to build a GA4 filter matching a dimension against a list of values
+def in_list_filter(field, values, case_sensitive=True):
+    return FilterExpression(filter=Filter(
+        field_name=field,
+        in_list_filter=Filter.InListFilter(values=list(values), case_sensitive=case_sensitive),
+    ))
+
+
+# Function to build a GA4 filter comparing a metric with a number
+def numeric_filter(field, operation, value):
+    number = NumericValue(int64_value=value) if isinstance(value, int) else NumericValue(double_value=value)
+    return FilterExpression(filter=Filter(
+        field_name=field,
+        numeric_filter=Filter.NumericFilter(operation=operation, value=number),
+    ))
+
+
+# Function to combine GA4 filters so a row matching any of them is kept
+def any_filter(*expressions):
+    return FilterExpression(or_group=FilterExpressionList(expressions=list(expressions)))
+
+
+# Function to find the dimensions a filter pins to a single value
+def pinned_dimensions(expression):
+    """
+    Return {dimension: value} for the dimensions every row matching the filter has the same
+    value of: case-sensitive exact matches and one-value lists, alone or in an AND group.
+    """
+    if expression is None:
+        return {}
+    expression = FilterExpression.pb(expression)
+    kind = expression.WhichOneof("expr")
+    if kind == "and_group":
+        pinned = {}
+        for child in expression.and_group.expressions:
+            pinned.update(pinned_dimensions(FilterExpression.wrap(child)))
+        return pinned
+    if kind != "filter":
+        return {}
+
+    condition = expression.filter
+    condition_kind = condition.WhichOneof("one_filter")
+    if (condition_kind == "string_filter" and condition.string_filter.case_sensitive
+            and condition.string_filter.match_type == Filter.StringFilter.MatchType.EXACT):
+        return {condition.field_name: condition.string_filter.value}
+    if (condition_kind == "in_list_filter" and condition.in_list_filter.case_sensitive
+            and len(condition.in_list_filter.values) == 1):
+        return {condition.field_name: condition.in_list_filter.values[0]}
+    return {}
+
+
+def fetch_data(client, dimensions, metrics, date_ranges, filename, dimension_filter=None, metric_filter=None,
+               property_id=PROPERTY_ID, quota=None):
+    """
+    Run a GA4 report and return its rows as a DataFrame, empty if no rows matched, or None
+    if the report could not be fetched.
+
+    dimension_filter and metric_filter are GA4 FilterExpressions applied by the API, so
+    only matching rows are returned. Dimensions the dimension filter pins to one value are
+    not requested; their column is filled with that value. Calls go through quota, a
+    PropertyQuota, when given.
+    """
     try:
+        pinned = pinned_dimensions(dimension_filter)
+        requested_dimensions = [dim for dim in dimensions if dim not in pinned]
         request = RunReportRequest(
-            property=PROPERTY_ID,
-            dimensions=[Dimension(name=dim) for dim in dimensions],
+            property=property_id,
+            dimensions=[Dimension(name=dim) for dim in requested_dimensions],
             metrics=[Metric(name=metric) for metric in metrics],
             date_ranges=[DateRange(start_date=date_range[0], end_date=date_range[1]) for date_range in date_ranges],
+            dimension_filter=dimension_filter,
+            metric_filter=metric_filter,
         )
-        response = client.run_report(request)
+        response = _call_api(quota, client.run_report, request)
 
         if not response.rows:
-            print(f"⚠️ No data returned for {filename}. Skipping file creation.")
-            return None  # Return None instead of saving empty files
+            print(f"⚠️ No data returned for {filename}.")
+            return pd.DataFrame(columns=list(dimensions) + list(metrics))
 
         rows = []
         for row in response.rows:
-            row_data = {dim: row.dimension_values[i].value for i, dim in enumerate(dimensions)}
+            row_data = {dim: row.dimension_values[i].value for i, dim in enumerate(requested_dimensions)}
             row_data.update({metric: row.metric_values[i].value for i, metric in enumerate(metrics)})
             rows.append(row_data)
 
-        return pd.DataFrame(rows)
+        data = pd.DataFrame(rows)
+        for dim, value in pinned.items():
+            if dim in dimensions:
+                data[dim] = value
+        return data[list(dimensions) + list(metrics)]
+    except Exception as e:
+        print(f"⚠️ Error fetching data: {e}")
+        return None
+
+
+# Most metrics the GA4 Data API accepts in one report request
+MAX_REPORT_METRICS = 10
+
+# Most pivot reports the GA4 Data API accepts in one batch request
+MAX_BATCH_REPORTS = 5
+
+# Pivot page sizes for marginal breakdowns; their product must stay within the API's 250,000.
+# Longer date ranges and larger breakdowns are fetched in further pages
+PIVOT_DATE_LIMIT = 1000
+PIVOT_BREAKDOWN_LIMIT = 250
+
+# Dimension value GA4 gives aggregated dimensions in pivot aggregates
+RESERVED_TOTAL = "RESERVED_TOTAL"
+
+
+# Function to fetch the one-dimensional breakdowns of a report instead of its cross product
+def fetch_marginals(client, dimensions, metrics, date_ranges, filename, marginals, property_id=PROPERTY_ID, quota=None):
+    """
+    Fetch each dimension in marginals on its own against the other dimensions (the date),
+    as pivot reports batched into as few calls as possible.
+
+    Rows are stacked, with BREAKDOWN_COLUMN naming the dimension each row breaks down; the
+    other breakdown dimensions are left empty. The server's per-date totals (the TOTAL metric
+    aggregation) are marked TOTAL_BREAKDOWN. Filtering on one breakdown and grouping by its
+    dimension gives the same sums as the full report, from a sum of cardinalities of rows
+    instead of their product.
+    """
+    try:
+        base = [dim for dim in dimensions if dim not in marginals]
+
+        # Pivots are ordered by their dimensions so pages with different offsets line up
+        def pivot_request(marginal, date_offset, breakdown_offset):
+            return RunPivotReportRequest(
+                dimensions=[Dimension(name=dim) for dim in base + [marginal]],
+                metrics=[Metric(name=metric) for metric in metrics],
+                date_ranges=[DateRange(start_date=date_range[0], end_date=date_range[1]) for date_range in date_ranges],
+                pivots=[
+                    Pivot(field_names=base, offset=date_offset, limit=PIVOT_DATE_LIMIT,
+                          order_bys=[OrderBy(dimension=OrderBy.DimensionOrderBy(dimension_name=dim)) for dim in base]),
+                    Pivot(field_names=[marginal], offset=breakdown_offset, limit=PIVOT_BREAKDOWN_LIMIT,
+                          order_bys=[OrderBy(dimension=OrderBy.DimensionOrderBy(dimension_name=marginal))],
+                          metric_aggregations=[MetricAggregation.TOTAL]),
+                ],
+            )
+
+        # First page of every breakdown; each pivot header's row_count then tells how many
+        # dates and values there are in all, and the remaining pages are fetched the same way
+        pages = [(marginal, 0, 0) for marginal in marginals]
+        fetched = []
+        while pages:
+            reports = []
+            for start in range(0, len(pages), MAX_BATCH_REPORTS):
+                batch = pages[start:start + MAX_BATCH_REPORTS]
+                response = _call_api(quota, client.batch_run_pivot_reports, BatchRunPivotReportsRequest(
+                    property=property_id, requests=[pivot_request(*page) for page in batch]
+                ))
+                reports.extend(response.pivot_reports)
+
+            next_pages = []
+            for (marginal, date_offset, breakdown_offset), report in zip(pages, reports):
+                fetched.append((marginal, breakdown_offset, report))
+                if date_offset or breakdown_offset or len(report.pivot_headers) < 2:
+                    continue
+                date_count, breakdown_count = (header.row_count for header in report.pivot_headers[:2])
+                more = [(marginal, dates, values)
+                        for dates in range(0, date_count, PIVOT_DATE_LIMIT)
+                        for values in range(0, breakdown_count, PIVOT_BREAKDOWN_LIMIT) if dates or values]
+                if more:
+                    logging.warning(f"{filename}: {marginal} has {date_count} dates and {breakdown_count} values, "
+                                    f"more than one pivot page; fetching {len(more)} more pages")
+                next_pages.extend(more)
+            pages = next_pages
+
+        rows = []
+        for marginal, _, report in fetched:
+            for row in report.rows:
+                row_data = {dim: row.dimension_values[i].value for i, dim in enumerate(base + [marginal])}
+                row_data[BREAKDOWN_COLUMN] = marginal
+                row_data.update({metric: row.metric_values[i].value for i, metric in enumerate(metrics)})
+                rows.append(row_data)
+
+        # Totals per date, aggregated across the whole breakdown by the server; every breakdown
+        # has them, so they are taken from the first breakdown's pages of dates only
+        for marginal, breakdown_offset, report in fetched:
+            if marginal != marginals[0] or breakdown_offset:
+                continue
+            for row in report.aggregates:
+                values = [value.value for value in row.dimension_values]
+                if values[-1] != RESERVED_TOTAL or RESERVED_TOTAL in values[:-1]:
+                    continue
+                row_data = dict(zip(base, values[:-1]))
+                row_data[BREAKDOWN_COLUMN] = TOTAL_BREAKDOWN
+                row_data.update({metric: row.metric_values[i].value for i, metric in enumerate(metrics)})
+                rows.append(row_data)
+
+        if not rows:
+            print(f"⚠️ No data returned for {filename}. Skipping file creation.")
+            return None
+        return pd.DataFrame(rows).reindex(columns=list(dimensions) + [BREAKDOWN_COLUMN] + list(metrics))
     except Exception as e:
         print(f"⚠️ Error fetching data: {e}")
         return None
 
 
+# GA4 reports saved by the extractor, one CSV each
+GA4_REPORTS = [
+    # 1. User & Traffic Data (Daily)
+    {"title": "User & Traffic Data", "filename": "user_traffic_data.csv", "dimensions": ["date"],
+     "metrics": ["sessions", "totalUsers", "activeUsers", "screenPageViews", "bounceRate"]},
+    # 2. User Engagement & Behavior (Daily)
+    {"title": "User Engagement & Behavior Data", "filename": "engagement_data.csv", "dimensions": ["date"],
+     "metrics": ["averageSessionDuration", "screenPageViewsPerSession", "eventCount"]},
+    # 3. Acquisition Data (Daily)
+    {"title": "Acquisition Data", "filename": "acquisition_data.csv", "dimensions": ["date", "sessionSource", "sessionMedium"],
+     "metrics": ["sessions", "totalUsers"]},
+    # 4. Conversion & Goal Tracking (Daily)
+    {"title": "Conversion & Goal Tracking Data", "filename": "conversion_data.csv", "dimensions": ["date"],
+     "metrics": ["conversions", "totalRevenue"]},
+    # 5. Page Views Data (Daily)
+    {"title": "Page Views Data", "filename": "page_views_data.csv", "dimensions": ["date", "pagePath", "pageTitle"],
+     "metrics": ["screenPageViews"]},
+    # 6. Demographics Data (Daily), one breakdown per dimension; demographics_data.csv held the cross product
+    {"title": "Demographics Breakdown Data", "filename": "demographics_breakdown_data.csv", "dimensions": ["date", "userAgeBracket", "userGender", "country"],
+     "metrics": ["activeUsers"], "marginals": ["userAgeBracket", "userGender", "country"]},
+    # 7. Device & Technology Data (Daily), one breakdown per dimension; device_data.csv held the cross product
+    {"title": "Device & Technology Breakdown Data", "filename": "device_breakdown_data.csv", "dimensions": ["date", "deviceCategory", "operatingSystem", "browser"],
+     "metrics": ["sessions", "activeUsers"], "marginals": ["deviceCategory", "operatingSystem", "browser"]},
+    # 8. Events Data (Daily)
+    {"title": "Events Data", "filename": "events_data.csv", "dimensions": ["date", "eventName"],
+     "metrics": ["eventCount"]},
+    # 9. E-commerce Data (Daily)
+    {"title": "E-commerce Data", "filename": "ecommerce_data.csv", "dimensions": ["date", "productName", "productCategory"],
+     "metrics": ["itemRevenue", "itemsPurchased"]},
+    # 10. User Lifetime Value (LTV) Data (Daily)
+    {"title": "User Lifetime Value Data", "filename": "ltv_data.csv", "dimensions": ["date", "userLifetimeBucket"],
+     "metrics": ["userLifetimeRevenue", "userLifetimeTransactions"]},
+    # 11. Audience & Segments Data (Daily)
+    {"title": "Audience & Segments Data", "filename": "audience_data.csv", "dimensions": ["date", "audienceName"],
+     "metrics": ["activeUsers", "conversions"]},
+    # 12. App-Specific Data (Daily)
+    {"title": "App-Specific Data", "filename": "app_data.csv", "dimensions": ["date", "appVersion", "platform"],
+     "metrics": ["screenPageViews", "userEngagementDuration"]},
+    # 13. Funnel Analysis Data (Daily)
+    {"title": "Funnel Analysis Data", "filename": "funnel_data.csv", "dimensions": ["date", "eventName", "pagePath"],
+     "metrics": ["funnelConversions", "funnelDropOffRate"]},
+    # 14. Retention & Cohorts Data (Daily)
+    {"title": "Retention & Cohorts Data", "filename": "retention_data.csv", "dimensions": ["date", "cohort", "cohortNthDay"],
+     "metrics": ["activeUsers"]},
+    # 15. Site Speed & Performance Data (Daily), only the custom page load event
+    {"title": "Site Speed & Performance Data", "filename": "site_speed_data.csv", "dimensions": ["date", "pagePath", "eventName"],
+     "metrics": ["averageSessionDuration"], "dimension_filter": string_filter("eventName", "page_load")},
+    # 16. Error Tracking Data (Daily); only error events cross the wire, not page_view and user_engagement
+    {"title": "Error Tracking Data", "filename": "error_data.csv", "dimensions": ["date", "pagePath", "eventName"],
+     "metrics": ["eventCount"],
+     "dimension_filter": any_filter(
+         in_list_filter("eventName", ERROR_EVENT_NAMES),
+         string_filter("eventName", ERROR_EVENT_SUBSTRING, match_type=Filter.StringFilter.MatchType.CONTAINS,
+                       case_sensitive=False),
+     )},
+]
+
+
+# Function to identify a filter expression so equal filters compare equal
+def _filter_key(expression):
+    return None if expression is None else FilterExpression.serialize(expression)
+
+
+# Function to merge report definitions that can be fetched with one request
+def plan_reports(reports, max_metrics=MAX_REPORT_METRICS):
+    """
+    Group reports with the same dimensions and filters into merged requests.
+
+    Reports are packed first-fit, in order, into requests of at most max_metrics distinct
+    metrics. Metric filters apply to whole rows, so only reports without one, or with the
+    same one, are merged. Reports fetched as marginal breakdowns are never merged.
+
+    :return: List of requests, each a dict with 'dimensions', 'metrics', the filters and
+             the 'reports' it serves
+    """
+    planned = []
+    for report in reports:
+        key = (tuple(report["dimensions"]), _filter_key(report.get("dimension_filter")),
+               _filter_key(report.get("metric_filter")))
+        if report.get("marginals"):
+            key += (report["filename"],)
+        for request in planned:
+            if request["key"] != key:
+                continue
+            metrics = request["metrics"] + [metric for metric in report["metrics"] if metric not in request["metrics"]]
+            if len(metrics) <= max_metrics:
+                request["metrics"] = metrics
+                request["reports"].append(report)
+                break
+        else:
+            planned.append({
+                "key": key,
+                "dimensions": list(report["dimensions"]),
+                "metrics": list(dict.fromkeys(report["metrics"])),
+                "dimension_filter": report.get("dimension_filter"),
+                "metric_filter": report.get("metric_filter"),
+                "marginals": report.get("marginals"),
+                "reports": [report],
+            })
+    return planned
+
+
+# Function to cut one report's rows out of a merged request's result
+def _split_report(data, report):
+    if data is None:
+        return None
+    columns = list(report["dimensions"]) + list(report["metrics"])
+    data = data[columns]
+    # GA4 leaves out rows whose metrics are all zero; drop the rows only other reports' metrics kept
+    nonzero = (data[report["metrics"]].apply(pd.to_numeric, errors="coerce").fillna(0) != 0).any(axis=1)
+    return data[nonzero].reset_index(drop=True)
+
+
+# Function to fetch a list of report definitions with as few API calls as possible
+def fetch_reports(client, reports, date_ranges, max_metrics=MAX_REPORT_METRICS, property_id=PROPERTY_ID, quota=None):
+    """
+    Fetch reports through plan_reports and return {filename: DataFrame or None}, with the
+    same columns and rows as fetching each report on its own.
+    """
+    results = {}
+    planned = plan_reports(reports, max_metrics)
+    logging.info(f"Fetching {len(reports)} GA4 reports with {len(planned)} requests...")
+    for request in planned:
+        filenames = [report["filename"] for report in request["reports"]]
+        logging.info(f"Fetching {', '.join(report['title'] for report in request['reports'])} (Daily)...")
+        if request["marginals"]:
+            results[filenames[0]] = fetch_marginals(client, request["dimensions"], request["metrics"], date_ranges,
+                                                    filenames[0], request["marginals"], property_id=property_id, quota=quota)
+            continue
+        data = fetch_data(
+            client,
+            dimensions=request["dimensions"],
+            metrics=request["metrics"],
+            date_ranges=date_ranges,
+            filename=", ".join(filenames),
+            dimension_filter=request["dimension_filter"],
+            metric_filter=request["metric_filter"],
+            property_id=property_id,
+            quota=quota,
+        )
+        for report in request["reports"]:
+            results[report["filename"]] = data if len(request["reports"]) == 1 else _split_report(data, report)
+    return results
+
+
 def load_linkedin_excel_data(filename):
     """
     Load and preprocess LinkedIn data from an Excel file.
@@ -332,230 +809,96 @@ def load_linkedin_excel_data(filename):
         return None, None
 
 # Main function to fetch and save all data
-def main():
+# Properties extracted at once; each runs its own requests, so refresh time grows with
+# the number of properties divided by this, not with the number of properties
+EXTRACT_WORKERS = 8
 
-    # Initialize GitHub token (replace with your actual token or use an environment variable)
-    github_token = os.getenv("GITHUB_TOKEN")  # Replace with your GitHub token
 
-    client = initialize_client()
-    if not client:
-        return
+# Function to refresh every dataset of one manifest property into its own store
+def extract_property(client, creds, prop, github_token=None):
+    """
+    Fetch the GA4 reports, Search Console data and rank history of one property from the
+    manifest into its data directory. GA4 calls go through the property's own
+    PropertyQuota, so running out of quota on one property never holds up another.
 
-    creds = authenticate_google_apis()
-    site_url = 'https://proefficientdataentry.com/'  # Replace with your website URL
-    property_id = PROPERTY_ID  # Replace with your GA4 property ID
-    start_date = '2025-02-10'  # Replace with your start date
+    :return: Dict with the property name, the number of GA4 reports saved and whether
+             its quota ran out
+    """
+    name, property_id, site_url, data_dir = prop["name"], prop["property_id"], prop["site_url"], prop["data_dir"]
+    os.makedirs(data_dir, exist_ok=True)
+    quota = PropertyQuota(name)
+    start_date = prop["start_date"]
     end_date = datetime.today().strftime('%Y-%m-%d')
+    date_ranges = [(start_date, "today")]
 
-    # Define date ranges starting from February 10, 2025
-    date_ranges = [("2025-02-10", "today")]
-
-    # 1. User & Traffic Data (Daily)
-    logging.info("Fetching User & Traffic Data (Daily)...")
-    user_traffic_data = fetch_data(
-        client,
-        dimensions=["date"],  # Ensure daily data by including the 'date' dimension
-        metrics=["sessions", "totalUsers", "activeUsers", "screenPageViews", "bounceRate"],
-        date_ranges=date_ranges,
-        filename="user_traffic_data.csv"
-    )
-    save_data(user_traffic_data, "user_traffic_data.csv",github_token)
-
-    # 2. User Engagement & Behavior (Daily)
-    logging.info("Fetching User Engagement & Behavior Data (Daily)...")
-    engagement_data = fetch_data(
-        client,
-        dimensions=["date"],  # Ensure daily data by including the 'date' dimension
-        metrics=["averageSessionDuration", "screenPageViewsPerSession", "eventCount"],
-        date_ranges=date_ranges,
-        filename="engagement_data.csv"
-    )
-    save_data(engagement_data, "engagement_data.csv",github_token)
-
-    # 3. Acquisition Data (Daily)
-    logging.info("Fetching Acquisition Data (Daily)...")
-    acquisition_data = fetch_data(
-        client,
-        dimensions=["date", "sessionSource", "sessionMedium"],  # Ensure daily data by including the 'date' dimension
-        metrics=["sessions", "totalUsers"],
-        date_ranges=date_ranges,
-        filename="acquisition_data.csv"
-    )
-    save_data(acquisition_data, "acquisition_data.csv",github_token)
-
-    # 4. Conversion & Goal Tracking (Daily)
-    logging.info("Fetching Conversion & Goal Tracking Data (Daily)...")
-    conversion_data = fetch_data(
-        client,
-        dimensions=["date"],  # Ensure daily data by including the 'date' dimension
-        metrics=["conversions", "totalRevenue"],
-        date_ranges=date_ranges,
-        filename="conversion_data.csv"
-    )
-    save_data(conversion_data, "conversion_data.csv",github_token)
-
-    # 5. Page Views Data (Daily)
-    logging.info("Fetching Page Views Data (Daily)...")
-    page_views_data = fetch_data(
-        client,
-        dimensions=["date", "pagePath", "pageTitle"],  # Include page-specific dimensions
-        metrics=["screenPageViews"],  # Metric for page views
-        date_ranges=date_ranges,
-        filename="page_views_data.csv"
-    )
-    save_data(page_views_data, "page_views_data.csv",github_token)
-
-    # 6. Demographics Data (Daily)
-    logging.info("Fetching Demographics Data (Daily)...")
-    demographics_data = fetch_data(
-        client,
-        dimensions=["date", "userAgeBracket", "userGender","country"],  # Valid dimensions
-        metrics=["activeUsers"],  # Valid metric
-        date_ranges=date_ranges,
-        filename="demographics_data.csv"
-    )
-    save_data(demographics_data, "demographics_data.csv",github_token)
-
-    # 7. Device & Technology Data (Daily)
-    logging.info("Fetching Device & Technology Data (Daily)...")
-    device_data = fetch_data(
-        client,
-        dimensions=["date", "deviceCategory", "operatingSystem", "browser"],
-        metrics=["sessions", "activeUsers"],
-        date_ranges=date_ranges,
-        filename="device_data.csv"
-    )
-    save_data(device_data, "device_data.csv",github_token)
-
-    # 8. Events Data (Daily)
-    logging.info("Fetching Events Data (Daily)...")
-    events_data = fetch_data(
-        client,
-        dimensions=["date", "eventName"],
-        metrics=["eventCount"],
-        date_ranges=date_ranges,
-        filename="events_data.csv"
-    )
-    save_data(events_data, "events_data.csv",github_token)
-
-    # 9. E-commerce Data (Daily)
-    logging.info("Fetching E-commerce Data (Daily)...")
-    ecommerce_data = fetch_data(
-        client,
-        dimensions=["date", "productName", "productCategory"],
-        metrics=["itemRevenue", "itemsPurchased"],
-        date_ranges=date_ranges,
-        filename="ecommerce_data.csv"
-    )
-    save_data(ecommerce_data, "ecommerce_data.csv",github_token)
-
-    # 10. User Lifetime Value (LTV) Data (Daily)
-    logging.info("Fetching User Lifetime Value Data (Daily)...")
-    ltv_data = fetch_data(
-        client,
-        dimensions=["date", "userLifetimeBucket"],
-        metrics=["userLifetimeRevenue", "userLifetimeTransactions"],
-        date_ranges=date_ranges,
-        filename="ltv_data.csv"
-    )
-    save_data(ltv_data, "ltv_data.csv",github_token)
-
-    # 11. Audience & Segments Data (Daily)
-    logging.info("Fetching Audience & Segments Data (Daily)...")
-    audience_data = fetch_data(
-        client,
-        dimensions=["date", "audienceName"],  # Use audienceName instead of segment
-        metrics=["activeUsers", "conversions"],
-        date_ranges=date_ranges,
-        filename="audience_data.csv"
-    )
-    save_data(audience_data, "audience_data.csv",github_token)
-
-    # 12. App-Specific Data (Daily)
-    logging.info("Fetching App-Specific Data (Daily)...")
-    app_data = fetch_data(
-        client,
-        dimensions=["date", "appVersion", "platform"],
-        metrics=["screenPageViews", "userEngagementDuration"],  # Use screenPageViews
-        date_ranges=date_ranges,
-        filename="app_data.csv"
-    )
-    save_data(app_data, "app_data.csv",github_token)
-
-
-    # 13. Funnel Analysis Data (Daily)
-    logging.info("Fetching Funnel Analysis Data (Daily)...")
-    funnel_data = fetch_data(
-        client,
-        dimensions=["date", "eventName", "pagePath"],
-        metrics=["funnelConversions", "funnelDropOffRate"],
-        date_ranges=date_ranges,
-        filename="funnel_data.csv"
-    )
-    save_data(funnel_data, "funnel_data.csv",github_token)
-
-    # 14. Retention & Cohorts Data (Daily)
-    logging.info("Fetching Retention & Cohorts Data (Daily)...")
-    retention_data = fetch_data(
-        client,
-        dimensions=["date", "cohort", "cohortNthDay"],
-        metrics=["activeUsers"],
-        date_ranges=date_ranges,
-        filename="retention_data.csv"
-    )
-    save_data(retention_data, "retention_data.csv",github_token)
-
-    # 15. Site Speed & Performance Data (Daily)
-    logging.info("Fetching Site Speed & Performance Data (Daily)...")
-    site_speed_data = fetch_data(
-        client,
-        dimensions=["date", "pagePath", "eventName"],  # Include eventName
-        metrics=["averageSessionDuration"],  # Valid metric
-        date_ranges=date_ranges,
-        filename="site_speed_data.csv"
-    )
-    save_data(site_speed_data, "site_speed_data.csv",github_token)
-
-
-    # 16. Error Tracking Data (Daily)
-    logging.info("Fetching Error Tracking Data (Daily)...")
-    error_data = fetch_data(
-        client,
-        dimensions=["date", "pagePath", "eventName"],  # Track custom error events
-        metrics=["eventCount"],  # Count of error events
-        date_ranges=date_ranges,
-        filename="error_data.csv"
-    )
-    save_data(error_data, "error_data.csv",github_token)
+    # 1-16. GA4 reports, fetched with as few requests as the planner can merge them into
+    reports = fetch_reports(client, GA4_REPORTS, date_ranges, property_id=property_id, quota=quota)
+    for report in GA4_REPORTS:
+        # A filtered report that matched nothing replaces the stored one, and any older unfiltered CSV
+        save_partitioned(reports[report["filename"]], report["filename"], github_token, data_dir=data_dir,
+                         allow_empty=report.get("dimension_filter") is not None)
 
     # 17. Google Search Console Data (Daily)
-    logging.info("Fetching Google Search Console Data (Daily)...")
-    creds = authenticate_google_search_console()
-    site_url = 'https://proefficientdataentry.com/'  # Replace with your website URL
-    start_date = '2025-02-10'  # Replace with your start date
-    end_date = datetime.today().strftime('%Y-%m-%d')
-
-    # Fetch search analytics data
+    logging.info(f"Fetching Google Search Console Data (Daily) for {name}...")
     search_console_data = fetch_search_console_data(creds, site_url, start_date, end_date)
-    
+    search_console_path = os.path.join(data_dir, 'search_console_data.csv')
     if search_console_data is not None:
         # Save the data to a CSV file
-        search_console_data.to_csv('analytics_data/search_console_data.csv', index=False)
-        logging.info("Search Console data saved to 'analytics_data/search_console_data.csv'")
+        search_console_data.to_csv(search_console_path, index=False)
+        logging.info(f"Search Console data saved to '{search_console_path}'")
+    else:
+        logging.error(f"No data fetched from Google Search Console for {name}.")
+
+    # Append the latest days to the property's rank history; re-fetched days replace their earlier rows
+    logging.info(f"Updating Search Console rank history for {name}...")
+    history_start = (datetime.today() - timedelta(days=RANK_HISTORY_REFRESH_DAYS)).strftime('%Y-%m-%d')
+    daily_search_console_data = fetch_search_console_daily(creds, site_url, history_start, end_date)
+    if daily_search_console_data is not None:
+        stored = RankHistoryStore(os.path.join(data_dir, "rank_history")).append(daily_search_console_data)
+        logging.info(f"Rank history of {name} updated: {stored} rows across {daily_search_console_data['date'].nunique()} days")
     else:
-        logging.error("No data fetched from Google Search Console.")
+        logging.error(f"No daily data fetched from Google Search Console for {name}.")
 
     # Fetch data from Google Analytics 4
-    logging.info("Fetching Google Analytics 4 data...")
+    logging.info(f"Fetching Google Analytics 4 data for {name}...")
     ga4_data = fetch_ga4_data(creds, property_id, start_date, end_date)
-    ga4_data.to_csv('analytics_data/ga4_data.csv', index=False)
+    ga4_data.to_csv(os.path.join(data_dir, 'ga4_data.csv'), index=False)
 
     # Fetch third-party SEO data (e.g., Ahrefs)
-    logging.info("Fetching third-party SEO data...")
+    logging.info(f"Fetching third-party SEO data for {name}...")
     api_key = 'your_api_key'  # Replace with your API key
     backlinks, domain_authority = fetch_seo_data(api_key)
     seo_data = pd.DataFrame({'Backlinks': [backlinks], 'DomainAuthority': [domain_authority]})
-    seo_data.to_csv('analytics_data/seo_data.csv', index=False)
+    seo_data.to_csv(os.path.join(data_dir, 'seo_data.csv'), index=False)
+
+    saved = sum(data is not None and not data.empty for data in reports.values())
+    return {"name": name, "reports": saved, "quota_exhausted": quota.exhausted}
+
+
+def main():
+
+    # Initialize GitHub token (replace with your actual token or use an environment variable)
+    github_token = os.getenv("GITHUB_TOKEN")  # Replace with your GitHub token
+
+    client = initialize_client()
+    if not client:
+        return
+
+    authenticate_google_apis()
+    creds = authenticate_google_search_console()
+
+    # Every property in the manifest, extracted in parallel; one failing does not stop the others
+    properties = load_manifest()
+    logging.info(f"Refreshing {len(properties)} properties...")
+    with ThreadPoolExecutor(max_workers=min(EXTRACT_WORKERS, len(properties))) as pool:
+        futures = {pool.submit(extract_property, client, creds, prop, github_token): prop["name"] for prop in properties}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+                logging.info(f"Refreshed {result['name']}: {result['reports']}/{len(GA4_REPORTS)} GA4 reports"
+                             + (" (quota exhausted)" if result["quota_exhausted"] else ""))
+            except Exception as e:
+                logging.error(f"Failed to refresh {futures[future]}: {e}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,86 @@
+# dimensions.py
+import os
+import threading
+
+import pandas as pd
+
+# Dimension columns stored as categoricals when a dataset is loaded
+DIMENSION_COLUMNS = (
+    "sessionSource", "sessionMedium", "deviceCategory", "operatingSystem", "browser",
+    "eventName", "pagePath", "pageTitle", "country", "userAgeBracket", "userGender",
+    "appVersion", "platform", "audienceName", "Query", "Page", "Device",
+)
+
+# Column of a stacked breakdown report naming the dimension each row breaks down, or
+# TOTAL_BREAKDOWN for the per-date totals, whose breakdown dimensions are all empty
+BREAKDOWN_COLUMN = "breakdown"
+TOTAL_BREAKDOWN = "total"
+
+
+class DimensionVocabulary:
+    """
+    Append-only vocabulary of values per dimension, shared by the datasets that use it.
+
+    A value keeps the code it was first given for the life of the process, so the same
+    dimension in different datasets is encoded with the same integer codes. Codes are
+    process-local: they follow the order values were first seen in and are not persisted.
+    """
+
+    def __init__(self):
+        self._codes = {}
+        self._values = {}
+        self._dtypes = {}
+        self._lock = threading.Lock()
+
+    def dtype(self, dimension, values):
+        """
+        Add any new values to a dimension's vocabulary and return its CategoricalDtype.
+        """
+        with self._lock:
+            codes = self._codes.setdefault(dimension, {})
+            vocabulary = self._values.setdefault(dimension, [])
+            for value in values:
+                if value not in codes:
+                    codes[value] = len(vocabulary)
+                    vocabulary.append(value)
+
+            # Reuse the dtype while the vocabulary has not grown
+            size, dtype = self._dtypes.get(dimension, (None, None))
+            if size != len(vocabulary):
+                dtype = pd.CategoricalDtype(list(vocabulary))
+                self._dtypes[dimension] = (len(vocabulary), dtype)
+            return dtype
+
+    def __len__(self):
+        return sum(len(values) for values in self._values.values())
+
+
+# Vocabularies used by the dashboard's loaders, one per data directory, so one property's
+# values never enter another property's categories
+_vocabularies = {}
+_vocabularies_lock = threading.Lock()
+
+
+# Function to get the vocabulary shared by the datasets of one data directory
+def vocabulary_for(data_dir):
+    with _vocabularies_lock:
+        return _vocabularies.setdefault(os.path.normpath(data_dir), DimensionVocabulary())
+
+
+# Function to store a dataset's dimension columns as categoricals backed by a shared vocabulary
+def encode_dimensions(data, vocabulary, columns=DIMENSION_COLUMNS):
+    """
+    Convert the dimension columns of a DataFrame in place to categoricals.
+
+    Values are stored as strings; missing values stay missing. Group these columns with
+    observed=True so results only contain values present in the data.
+    """
+    if data is None:
+        return data
+    for column in columns:
+        if column not in data.columns or isinstance(data[column].dtype, pd.CategoricalDtype):
+            continue
+        values = data[column].where(data[column].isna(), data[column].astype(str))
+        dtype = vocabulary.dtype(column, values.dropna().unique())
+        data[column] = pd.Categorical(values, dtype=dtype)
+    return data
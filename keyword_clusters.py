@@ -0,0 +1,136 @@
+# keyword_clusters.py
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# Upper bound on the number of topics; the default grows with the square root of the query count
+MAX_KEYWORD_CLUSTERS = 200
+
+# Mini-batch k-means settings
+CLUSTER_BATCH_SIZE = 2048
+CLUSTER_ITERATIONS = 60
+CLUSTER_SEED = 0
+
+# Rows assigned at once in the final pass, bounding the dense similarity block
+ASSIGN_CHUNK_ROWS = 50000
+
+# Terms used to name a topic
+TOPIC_NAME_TERMS = 3
+
+
+# Function to vectorize texts into an L2-normalized sparse TF-IDF matrix
+def tfidf_matrix(texts):
+    """
+    Return (matrix, terms) where matrix[i] is the TF-IDF vector of texts[i] over its words.
+
+    Tokenizing, counting and weighting are done on whole arrays; no text is compared with
+    another. Texts without words get an all-zero row.
+    """
+    words = pd.Series(list(texts), dtype=object).str.lower().str.findall(r"[^\W_]+").explode().dropna()
+    term_ids, terms = pd.factorize(words)
+    counts = sparse.csr_matrix((np.ones(len(term_ids)), (words.index.to_numpy(), term_ids)),
+                               shape=(len(texts), len(terms)))
+    counts.sum_duplicates()
+
+    # Smoothed inverse document frequency, as in scikit-learn's TfidfVectorizer
+    document_frequency = np.bincount(counts.indices, minlength=len(terms))
+    idf = np.log((1 + len(texts)) / (1 + document_frequency)) + 1
+    tfidf = counts @ sparse.diags(idf)
+
+    norms = np.sqrt(np.asarray(tfidf.multiply(tfidf).sum(axis=1)).ravel())
+    tfidf = sparse.diags(1 / np.where(norms > 0, norms, 1)) @ tfidf
+    return tfidf.tocsr(), np.asarray(terms, dtype=object)
+
+
+# Function to normalize the rows of a dense matrix in place
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1)
+    matrix /= np.where(norms > 0, norms, 1)[:, None]
+    return matrix
+
+
+# Function to cluster the rows of a normalized sparse matrix by cosine similarity
+def minibatch_kmeans(matrix, n_clusters, batch_size=CLUSTER_BATCH_SIZE, iterations=CLUSTER_ITERATIONS, seed=CLUSTER_SEED):
+    """
+    Spherical mini-batch k-means (Sculley, 2010) over the rows of a CSR matrix.
+
+    Each step assigns a random batch to its most similar centroids with one sparse-dense
+    product and moves every centroid towards the mean of its rows by 1 / (rows seen so far).
+    All-zero rows are labelled -1.
+
+    :return: Tuple of (labels, centroids)
+    """
+    rng = np.random.default_rng(seed)
+    nonempty = np.flatnonzero(np.diff(matrix.indptr) > 0)
+    labels = np.full(matrix.shape[0], -1, dtype=np.int64)
+    n_clusters = min(n_clusters, len(nonempty))
+    if n_clusters == 0:
+        return labels, np.zeros((0, matrix.shape[1]))
+
+    centroids = matrix[rng.choice(nonempty, n_clusters, replace=False)].toarray()
+    seen = np.zeros(n_clusters)
+    for _ in range(iterations):
+        batch = matrix[rng.choice(nonempty, min(batch_size, len(nonempty)), replace=False)]
+        nearest = np.asarray(batch @ centroids.T).argmax(axis=1)
+
+        batch_counts = np.bincount(nearest, minlength=n_clusters)
+        membership = sparse.csr_matrix((np.ones(len(nearest)), (nearest, np.arange(len(nearest)))),
+                                       shape=(n_clusters, len(nearest)))
+        batch_sums = (membership @ batch).toarray()
+
+        updated = batch_counts > 0
+        seen[updated] += batch_counts[updated]
+        rate = (batch_counts[updated] / seen[updated])[:, None]
+        centroids[updated] = (1 - rate) * centroids[updated] + rate * batch_sums[updated] / batch_counts[updated][:, None]
+        _normalize_rows(centroids)
+
+    for start in range(0, len(nonempty), ASSIGN_CHUNK_ROWS):
+        rows = nonempty[start:start + ASSIGN_CHUNK_ROWS]
+        labels[rows] = np.asarray(matrix[rows] @ centroids.T).argmax(axis=1)
+    return labels, centroids
+
+
+class KeywordClusters:
+    """
+    Topics of the values of a KeywordIndex, from mini-batch k-means over TF-IDF vectors.
+
+    Each topic is named after the heaviest terms of its centroid, and its metrics are the
+    totals of its values' metrics in the index.
+    """
+
+    def __init__(self, keyword_index, n_clusters=None):
+        if n_clusters is None:
+            n_clusters = int(np.clip(np.sqrt(len(keyword_index.values) / 2), 2, MAX_KEYWORD_CLUSTERS))
+        matrix, terms = tfidf_matrix(keyword_index.values)
+        self.labels, centroids = minibatch_kmeans(matrix, n_clusters)
+
+        self.names = []
+        for centroid in centroids:
+            heaviest = np.argsort(-centroid)[:TOPIC_NAME_TERMS]
+            self.names.append(" ".join(terms[heaviest[centroid[heaviest] > 0]]))
+
+        # Topic totals, from the per-value totals of the index
+        clustered = self.labels >= 0
+        labels = self.labels[clustered]
+        topics = len(self.names)
+        clicks = np.bincount(labels, weights=keyword_index.clicks[clustered], minlength=topics)
+        impressions = np.bincount(labels, weights=keyword_index.impressions[clustered], minlength=topics)
+        summary = pd.DataFrame({
+            "cluster": np.arange(topics),
+            "Topic": self.names,
+            keyword_index.column: np.bincount(labels, minlength=topics),
+            "Clicks": clicks.astype("int64"),
+            "Impressions": impressions.astype("int64"),
+            "CTR": np.divide(clicks, impressions, out=np.zeros(topics), where=impressions > 0),
+        })
+        if keyword_index.weighted_positions is not None:
+            weighted_positions = np.bincount(labels, weights=keyword_index.weighted_positions[clustered], minlength=topics)
+            summary["Position"] = np.divide(weighted_positions, impressions, out=np.full(topics, np.nan), where=impressions > 0)
+        self.summary = (summary[summary[keyword_index.column] > 0]
+                        .sort_values(by=["Impressions", "Clicks"], ascending=False, kind="mergesort", ignore_index=True))
+
+    def member_ids(self, cluster):
+        """
+        Return the ids, in the keyword index, of the values in a topic.
+        """
+        return np.flatnonzero(self.labels == cluster)
@@ -0,0 +1,117 @@
+# keyword_index.py
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+# Marks the start of a value so prefix searches can use trigrams too
+PREFIX_MARK = "\x02"
+
+# Empty posting list
+_NO_MATCHES = np.empty(0, dtype=np.int32)
+
+
+# Function to split text into its overlapping three-character sequences
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class KeywordIndex:
+    """
+    Trigram inverted index over the distinct values of a Search Console text column.
+
+    Every distinct value (query or page) is listed under each trigram it contains, so a
+    search intersects the posting lists of the term's trigrams and only checks the few
+    values left, instead of scanning every string. Clicks, impressions and
+    impression-weighted position are totalled per value once, when the index is built.
+    """
+
+    def __init__(self, data, column):
+        self.column = column
+        codes, uniques = pd.factorize(data[column])
+        self.values = [str(value) for value in uniques]
+        self._lowered = [value.lower() for value in self.values]
+
+        postings = defaultdict(list)
+        for value_id, text in enumerate(self._lowered):
+            for gram in trigrams(PREFIX_MARK + text):
+                postings[gram].append(value_id)
+        self._postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+
+        # Per-value totals; position is averaged weighted by impressions, as Search Console does
+        valid = codes >= 0
+        codes = codes[valid]
+        impressions = pd.to_numeric(data["Impressions"], errors="coerce").fillna(0).to_numpy(dtype=float)[valid]
+        self.clicks = np.bincount(codes, weights=pd.to_numeric(data["Clicks"], errors="coerce").fillna(0).to_numpy(dtype=float)[valid],
+                                  minlength=len(self.values))
+        self.impressions = np.bincount(codes, weights=impressions, minlength=len(self.values))
+        if "Position" in data.columns:
+            positions = pd.to_numeric(data["Position"], errors="coerce").fillna(0).to_numpy(dtype=float)[valid]
+            self.weighted_positions = np.bincount(codes, weights=positions * impressions, minlength=len(self.values))
+        else:
+            self.weighted_positions = None
+
+    def search(self, term, prefix=False):
+        """
+        Return the ids of the values containing term (or starting with it if prefix=True),
+        ignoring case.
+        """
+        term = term.strip().lower()
+        if not term:
+            return _NO_MATCHES
+
+        grams = trigrams(PREFIX_MARK + term if prefix else term)
+        if grams:
+            # Intersect the shortest posting lists first
+            lists = sorted((self._postings.get(gram, _NO_MATCHES) for gram in grams), key=len)
+            candidates = lists[0]
+            for ids in lists[1:]:
+                if not len(candidates):
+                    break
+                candidates = np.intersect1d(candidates, ids, assume_unique=True)
+        else:
+            # Terms too short for a trigram are checked against every value
+            candidates = np.arange(len(self.values), dtype=np.int32)
+
+        # Trigram matches are candidates; keep the values that really contain the term
+        if prefix:
+            matches = [value_id for value_id in candidates if self._lowered[value_id].startswith(term)]
+        else:
+            matches = [value_id for value_id in candidates if term in self._lowered[value_id]]
+        return np.array(matches, dtype=np.int32)
+
+    def results(self, term, prefix=False):
+        """
+        Return the matching values with their clicks, impressions, CTR and average position,
+        most clicked first.
+        """
+        return self.table(self.search(term, prefix))
+
+    def table(self, ids):
+        """
+        Return the values with the given ids and their metrics, most clicked first.
+        """
+        clicks, impressions = self.clicks[ids], self.impressions[ids]
+        results = pd.DataFrame({
+            self.column: [self.values[value_id] for value_id in ids],
+            "Clicks": clicks.astype("int64"),
+            "Impressions": impressions.astype("int64"),
+            "CTR": np.divide(clicks, impressions, out=np.zeros_like(clicks), where=impressions > 0),
+        })
+        if self.weighted_positions is not None:
+            results["Position"] = np.divide(self.weighted_positions[ids], impressions,
+                                            out=np.full(len(ids), np.nan), where=impressions > 0)
+        return results.sort_values(by=["Clicks", "Impressions"], ascending=False, kind="mergesort", ignore_index=True)
+
+    def totals(self, term, prefix=False):
+        """
+        Return (clicks, impressions, CTR, average position) over all matching values.
+        """
+        ids = self.search(term, prefix)
+        clicks = float(self.clicks[ids].sum())
+        impressions = float(self.impressions[ids].sum())
+        ctr = clicks / impressions if impressions else 0.0
+        position = np.nan
+        if self.weighted_positions is not None and impressions:
+            position = float(self.weighted_positions[ids].sum()) / impressions
+        return clicks, impressions, ctr, position
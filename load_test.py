@@ -0,0 +1,115 @@
+# load_test.py
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import requests
+
+from ai_client import AIInsightsClient
+from partitioned_store import PartitionedStore
+
+# Questions cycled through by the load generator
+QUESTIONS = [
+    "How is my traffic trending?",
+    "What is my conversion rate?",
+    "What do my demographics look like?",
+    "Which pages should I improve first?",
+]
+
+
+# Function to load the analytics datasets the same way the dashboard sends them to the AI page
+def load_datasets(data_dir="analytics_data"):
+    datasets = {}
+    for filename in sorted(glob.glob(os.path.join(data_dir, "*.csv"))):
+        data = pd.read_csv(filename)
+        if 'date' in data.columns:
+            data['date'] = pd.to_datetime(data['date'], format='%Y%m%d')
+        data.attrs['version'] = f"{filename}:{os.stat(filename).st_mtime_ns}"
+        datasets[os.path.basename(filename).replace("_data.csv", "").replace(".csv", "")] = data
+
+    # Reports in the partitioned store take the place of their CSV files
+    store = PartitionedStore(data_dir)
+    for report in store.manifest():
+        data = store.read(report)
+        data.attrs['version'] = repr((data_dir, report, store.partitions(report)))
+        datasets[report] = data
+    return datasets
+
+
+# Function to time one request; returns (total seconds, seconds to first chunk, error)
+def timed_request(client, query, datasets, stream):
+    started = time.perf_counter()
+    first_chunk = None
+    try:
+        if stream:
+            for _ in client.stream(query, datasets):
+                if first_chunk is None:
+                    first_chunk = time.perf_counter() - started
+        else:
+            client.ask(query, datasets)
+            first_chunk = time.perf_counter() - started
+        return time.perf_counter() - started, first_chunk, None
+    except Exception as e:
+        return time.perf_counter() - started, first_chunk, e
+
+
+# Function to format latency percentiles in milliseconds
+def percentiles(values):
+    if not values:
+        return "n/a"
+    p50, p95, p99 = np.percentile(np.array(values) * 1000, [50, 95, 99])
+    return f"p50={p50:.1f}ms p95={p95:.1f}ms p99={p99:.1f}ms"
+
+
+def run_load_test(url, total_requests, concurrency, stream=False, compress=False, use_cache=False, data_dir="analytics_data"):
+    """
+    Drive the dashboard's AI client against an endpoint and print latency and throughput.
+    """
+    datasets = load_datasets(data_dir)
+    client = AIInsightsClient(url, max_concurrency=concurrency, compress=compress, cache_responses=use_cache)
+    queries = [QUESTIONS[i % len(QUESTIONS)] for i in range(total_requests)]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda query: timed_request(client, query, datasets, stream), queries))
+    elapsed = time.perf_counter() - started
+
+    latencies = [total for total, _, error in results if error is None]
+    first_chunks = [first for _, first, error in results if error is None and first is not None]
+    errors = [error for _, _, error in results if error is not None]
+
+    print(f"Requests: {total_requests}  Concurrency: {concurrency}  Stream: {stream}  Gzip: {compress}")
+    print(f"Throughput: {len(latencies) / elapsed:.1f} req/s over {elapsed:.2f}s")
+    print(f"Latency: {percentiles(latencies)}")
+    if stream:
+        print(f"Time to first chunk: {percentiles(first_chunks)}")
+    if errors:
+        print(f"Errors: {len(errors)} (first: {errors[0]})")
+
+    # Payload accounting from the mock server (one worker's counters)
+    try:
+        server_stats = requests.get(url.rsplit("/v1/", 1)[0] + "/v1/stats", timeout=5).json()
+        print(f"Server worker {server_stats['pid']}: {server_stats['requests']} requests, "
+              f"{server_stats['request_bytes']} bytes on the wire, {server_stats['decoded_bytes']} bytes decoded, "
+              f"largest {server_stats['max_request_bytes']} bytes")
+    except Exception as e:
+        print(f"⚠️ Could not read server stats: {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the AI Insights client against the mock AI server (app.py).")
+    parser.add_argument("--url", default="http://localhost:8000/v1/chat")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--stream", action="store_true", help="Use the server-sent events endpoint")
+    parser.add_argument("--gzip", action="store_true", help="Send gzip-compressed request bodies")
+    parser.add_argument("--use-cache", action="store_true", help="Allow answers to be served from the response cache")
+    parser.add_argument("--data-dir", default="analytics_data")
+    args = parser.parse_args()
+
+    run_load_test(args.url, args.requests, args.concurrency, stream=args.stream, compress=args.gzip,
+                  use_cache=args.use_cache, data_dir=args.data_dir)
@@ -0,0 +1,284 @@
+# metric_index.py
+import numpy as np
+import pandas as pd
+
+# Comparison modes offered next to the KPI tiles
+COMPARISON_MODES = {
+    "Previous period": "previous_period",
+    "Same period last year": "previous_year",
+}
+
+
+# Function to work out the comparison range for a selected date range
+def comparison_range(start_date, end_date, mode="previous_period"):
+    """
+    Return the (start, end) range to compare [start_date, end_date] against.
+
+    :param mode: 'previous_period' for the equally long range that ends the day before
+                 start_date, or 'previous_year' for the same dates one year earlier
+    """
+    start_date = pd.Timestamp(start_date).normalize()
+    end_date = pd.Timestamp(end_date).normalize()
+    if mode == "previous_year":
+        return start_date - pd.DateOffset(years=1), end_date - pd.DateOffset(years=1)
+    length = end_date - start_date + pd.Timedelta(days=1)
+    return start_date - length, end_date - length
+
+
+class PrefixSumIndex:
+    """
+    Prefix sums and non-null counts of daily metrics over a dense calendar.
+
+    Each metric is summed per day and laid out on one row per calendar day, so the sum,
+    count or mean over any date range is the difference of two prefix entries. Ranges
+    that fall partly or wholly outside the data are clipped to it.
+    """
+
+    def __init__(self, data, metrics=None, date_col='date'):
+        if metrics is None:
+            metrics = [col for col in data.select_dtypes(include="number").columns if col != date_col]
+        self.metrics = list(metrics)
+        self._columns = {metric: i for i, metric in enumerate(self.metrics)}
+
+        dated = data.dropna(subset=[date_col])
+        days = dated[date_col].dt.normalize()
+        daily_sums = dated[self.metrics].groupby(days).sum()
+        daily_counts = dated[self.metrics].groupby(days).count()
+
+        if daily_sums.empty:
+            self.start = self.end = None
+            self.sums = np.zeros((1, len(self.metrics)))
+            self.counts = np.zeros((1, len(self.metrics)), dtype=np.int64)
+            return
+
+        calendar = pd.date_range(daily_sums.index.min(), daily_sums.index.max(), freq="D")
+        self.start, self.end = calendar[0], calendar[-1]
+
+        # Row i holds the totals of the first i days, so range totals need no loop
+        zero_row = np.zeros((1, len(self.metrics)))
+        self.sums = np.vstack([zero_row, daily_sums.reindex(calendar, fill_value=0).to_numpy(dtype=float).cumsum(axis=0)])
+        self.counts = np.vstack([zero_row, daily_counts.reindex(calendar, fill_value=0).to_numpy(dtype=float).cumsum(axis=0)]).astype(np.int64)
+
+    def _bounds(self, start_date, end_date):
+        if self.start is None:
+            return 0, 0
+        days = len(self.sums) - 1
+        first = (pd.Timestamp(start_date).normalize() - self.start).days
+        last = (pd.Timestamp(end_date).normalize() - self.start).days + 1
+        return min(max(first, 0), days), min(max(last, 0), days)
+
+    def sum(self, metric, start_date, end_date):
+        first, last = self._bounds(start_date, end_date)
+        column = self._columns[metric]
+        return self.sums[last, column] - self.sums[first, column]
+
+    def count(self, metric, start_date, end_date):
+        first, last = self._bounds(start_date, end_date)
+        column = self._columns[metric]
+        return int(self.counts[last, column] - self.counts[first, column])
+
+    def mean(self, metric, start_date, end_date):
+        count = self.count(metric, start_date, end_date)
+        return self.sum(metric, start_date, end_date) / count if count else np.nan
+
+    def compare(self, metric, start_date, end_date, mode="previous_period", agg="sum"):
+        """
+        Return (current, previous) values of a metric for a range and its comparison range.
+
+        previous is None when the comparison range has no rows of the metric, so a missing
+        period is not mistaken for a zero or averaged into NaN.
+        """
+        prev_start, prev_end = comparison_range(start_date, end_date, mode)
+        aggregate = self.mean if agg == "mean" else self.sum
+        previous = aggregate(metric, prev_start, prev_end) if self.count(metric, prev_start, prev_end) else None
+        return aggregate(metric, start_date, end_date), previous
+
+
+# Granularities offered by the time-bucketing engine and their calendar-aligned resample rules
+# (weeks start on Monday and months on the 1st, each labelled by its first day)
+GRANULARITIES = {
+    "Daily": "D",
+    "Weekly": "W-MON",
+    "Monthly": "MS",
+}
+
+
+# Function to bucket daily metrics into calendar periods
+def resample_metrics(data, metrics, granularity="Daily", date_col='date', agg="sum"):
+    """
+    Aggregate metrics into calendar-aligned daily, weekly or monthly buckets.
+
+    Rows are summed per day and reindexed to a dense calendar first, so days without rows
+    count as zero instead of being skipped, and then resampled in one pass. With agg='mean'
+    each bucket is the mean of the non-null values that fell into it.
+
+    :return: DataFrame with a 'period' column (bucket start) followed by the metrics
+    """
+    metrics = list(metrics)
+    dated = data.dropna(subset=[date_col])
+    if dated.empty:
+        return pd.DataFrame(columns=["period", *metrics])
+
+    days = dated[date_col].dt.normalize()
+    calendar = pd.date_range(days.min(), days.max(), freq="D")
+    rule = GRANULARITIES[granularity]
+
+    grouped = dated[metrics].groupby(days)
+    sums = grouped.sum().reindex(calendar, fill_value=0).resample(rule, closed="left", label="left").sum()
+    if agg == "mean":
+        counts = grouped.count().reindex(calendar, fill_value=0).resample(rule, closed="left", label="left").sum()
+        buckets = sums / counts.where(counts > 0)
+    else:
+        buckets = sums
+
+    buckets.index.name = "period"
+    return buckets.reset_index()
+
+
+# Function to compute period-over-period growth on a calendar-aligned series
+def growth_rate(series, periods=1):
+    """
+    Percentage change against the value `periods` buckets earlier.
+
+    The series must come from resample_metrics(), so every bucket is present and the
+    positional shift matches a calendar shift.
+    """
+    previous = series.shift(periods)
+    return ((series - previous) / previous.where(previous != 0)) * 100
+
+
+# Rows kept per day by a row-ranking TopKIndex, and so the longest leaderboard it can serve
+TOP_K_DEPTH = 100
+
+# Day number given to rows without a date; sorts before every real day
+_NO_DATE = np.iinfo(np.int64).min
+
+
+# Function to pick the n best entries by value without sorting all of them
+def _top_n(keys, values, n):
+    if len(values) > n:
+        candidates = np.argpartition(-values, n - 1)[:n]
+    else:
+        candidates = np.arange(len(values))
+    # Best first; ties go to the lower key (earlier row or first-seen value)
+    order = np.lexsort((keys[candidates], -values[candidates]))
+    return candidates[order]
+
+
+class TopKIndex:
+    """
+    Leaderboard of a metric kept as per-day partial results.
+
+    Without a dimension the index ranks rows: each day keeps only its `depth` best rows,
+    and the best rows of any date range are among the kept rows of its days. With a
+    dimension it ranks dimension values by their total: each day keeps its per-value
+    totals, and a range's totals are the sum of its days'. A query only partitions the
+    candidates of the requested days, and append() folds new rows into the days they touch.
+
+    Rows are identified by position, counting on from the first dataset across appends.
+    Rows with a missing metric or dimension value are not ranked.
+    """
+
+    def __init__(self, data, metric, dimension=None, date_col=None, depth=TOP_K_DEPTH):
+        self.metric = metric
+        self.dimension = dimension
+        self.date_col = date_col
+        self.depth = depth
+        self.rows = 0
+        self._labels = []
+        self._codes = {}
+        self._days = np.empty(0, dtype=np.int64)
+        self._keys = np.empty(0, dtype=np.int64)
+        self._values = np.empty(0, dtype=float)
+        self.append(data)
+
+    @staticmethod
+    def _day(value):
+        return pd.Timestamp(value).normalize().to_datetime64().astype("datetime64[D]").astype(np.int64)
+
+    def _day_numbers(self, data):
+        if self.date_col is None:
+            return np.zeros(len(data), dtype=np.int64)
+        dates = pd.to_datetime(data[self.date_col]).to_numpy().astype("datetime64[D]")
+        return np.where(np.isnat(dates), _NO_DATE, dates.astype(np.int64))
+
+    def _encode(self, labels):
+        # Codes are stable across appends, so per-day totals from different appends add up
+        codes, uniques = pd.factorize(labels)
+        mapping = []
+        for label in uniques:
+            if label not in self._codes:
+                self._codes[label] = len(self._labels)
+                self._labels.append(label)
+            mapping.append(self._codes[label])
+        return np.append(np.array(mapping, dtype=np.int64), -1)[codes]
+
+    def append(self, data):
+        """
+        Add rows to the index, updating only the partial results of the days they fall on.
+        """
+        values = pd.to_numeric(data[self.metric], errors="coerce").to_numpy(dtype=float)
+        days = self._day_numbers(data)
+        if self.dimension is None:
+            keys = np.arange(self.rows, self.rows + len(data), dtype=np.int64)
+        else:
+            keys = self._encode(data[self.dimension])
+        self.rows += len(data)
+
+        valid = ~np.isnan(values) & (keys >= 0)
+        days, keys, values = days[valid], keys[valid], values[valid]
+
+        # Days already in the index are recomputed together with the new rows
+        if len(self._days) and len(days) and days.min() <= self._days[-1]:
+            days = np.concatenate([self._days, days])
+            keys = np.concatenate([self._keys, keys])
+            values = np.concatenate([self._values, values])
+            self._days, self._keys, self._values = self._days[:0], self._keys[:0], self._values[:0]
+
+        days, keys, values = self._partials(days, keys, values)
+        self._days = np.concatenate([self._days, days])
+        self._keys = np.concatenate([self._keys, keys])
+        self._values = np.concatenate([self._values, values])
+
+    def _partials(self, days, keys, values):
+        if self.dimension is not None:
+            # Total per (day, value), ordered by day
+            totals = pd.Series(values).groupby([days, keys], sort=True).sum()
+            return (totals.index.get_level_values(0).to_numpy(dtype=np.int64),
+                    totals.index.get_level_values(1).to_numpy(dtype=np.int64), totals.to_numpy(dtype=float))
+
+        # Best `depth` rows per day, ordered by day
+        order = np.lexsort((keys, -values, days))
+        days, keys, values = days[order], keys[order], values[order]
+        day_starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+        rank = np.arange(len(days)) - np.repeat(day_starts, np.diff(np.r_[day_starts, len(days)]))
+        keep = rank < self.depth
+        return days[keep], keys[keep], values[keep]
+
+    def top(self, n=10, start_date=None, end_date=None):
+        """
+        Return (keys, values) of the n best entries, best first, optionally for the days
+        from start_date to end_date inclusive.
+
+        Keys are row positions, or dimension values when the index has a dimension.
+        """
+        if self.dimension is None and n > self.depth:
+            raise ValueError(f"TopKIndex keeps {self.depth} rows per day; cannot return the top {n}")
+
+        first, last = 0, len(self._days)
+        if start_date is not None or end_date is not None:
+            first = self._days.searchsorted(self._day(start_date) if start_date is not None else _NO_DATE + 1, side="left")
+            if end_date is not None:
+                last = self._days.searchsorted(self._day(end_date), side="right")
+        keys, values = self._keys[first:last], self._values[first:last]
+
+        if self.dimension is not None:
+            # Merge the per-day totals of the range into one total per value
+            totals = np.bincount(keys, weights=values, minlength=len(self._labels))
+            keys = np.unique(keys)
+            values = totals[keys]
+
+        best = _top_n(keys, values, n)
+        if self.dimension is None:
+            return keys[best], values[best]
+        return [self._labels[key] for key in keys[best]], values[best]
@@ -0,0 +1,163 @@
+# partitioned_store.py
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+# Manifest of partition statistics, at the root of a store
+PARTITION_MANIFEST = "partitions.json"
+
+# Parquet compression for the partitions
+PARTITION_COMPRESSION = "zstd"
+
+
+# Function to get the report name a dataset file is stored under: 'page_views_data.csv' -> 'page_views'
+def report_name(filename):
+    name = os.path.basename(filename)
+    for suffix in ("_data.csv", ".csv"):
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+# Function to convert GA4 value strings to numbers where a whole column is numeric, as read_csv would
+def _infer_types(data, date_col):
+    data = data.copy()
+    dates = data[date_col]
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates.astype(str), format="%Y%m%d", errors="coerce")
+    data[date_col] = dates
+    for column in data.columns:
+        if column == date_col or pd.api.types.is_numeric_dtype(data[column]):
+            continue
+        numbers = pd.to_numeric(data[column], errors="coerce")
+        if numbers.notna().sum() == data[column].notna().sum():
+            data[column] = numbers
+    return data
+
+
+# Function to fingerprint a partition's rows, so unchanged months are not rewritten
+def _checksum(rows):
+    hashes = pd.util.hash_pandas_object(rows, index=False).to_numpy()
+    return hashlib.sha1(hashes.tobytes() + "\0".join(map(str, rows.columns)).encode("utf-8")).hexdigest()
+
+
+class PartitionedStore:
+    """
+    Reports stored as one compressed Parquet file per month:
+    root/report=page_views/month=2025-03/part.parquet.
+
+    A manifest at the root records each partition's rows, date range, size and checksum,
+    so a reader picks the partitions overlapping a date range without opening the others,
+    and a writer only rewrites the months whose rows changed.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.manifest_path = os.path.join(root, PARTITION_MANIFEST)
+
+    def manifest(self):
+        """
+        Return {report: {"columns": [...], "partitions": {month: statistics}}}.
+        """
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, "r") as file:
+            return json.load(file)["reports"]
+
+    def _write_manifest(self, reports):
+        temporary_path = f"{self.manifest_path}.tmp"
+        with open(temporary_path, "w") as file:
+            json.dump({"reports": reports}, file, indent=1, sort_keys=True)
+        os.replace(temporary_path, self.manifest_path)
+
+    def write(self, report, data, date_col="date"):
+        """
+        Store a report's rows by month, replacing the report's previous contents.
+
+        Months whose rows are unchanged are left alone and months no longer present are
+        deleted. Rows without a valid date are not stored.
+
+        :return: Paths of the files written or deleted, manifest included
+        """
+        os.makedirs(self.root, exist_ok=True)
+        data = _infer_types(data, date_col)
+        data = data.sort_values(by=date_col, kind="mergesort").reset_index(drop=True)
+        months = data[date_col].dt.strftime("%Y-%m")
+
+        reports = self.manifest()
+        previous = reports.get(report, {}).get("partitions", {})
+        partitions = {}
+        changed = []
+        for month, rows in data.groupby(months, sort=True):
+            rows = rows.reset_index(drop=True)
+            relative_path = os.path.join(f"report={report}", f"month={month}", "part.parquet")
+            path = os.path.join(self.root, relative_path)
+            checksum = _checksum(rows)
+            if previous.get(month, {}).get("checksum") != checksum or not os.path.exists(path):
+                # Write next to the partition and swap it in, so readers never see a partial file
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temporary_path = f"{path}.tmp"
+                rows.to_parquet(temporary_path, index=False, compression=PARTITION_COMPRESSION)
+                os.replace(temporary_path, path)
+                changed.append(path)
+            partitions[month] = {
+                "path": relative_path,
+                "rows": int(len(rows)),
+                "min_date": rows[date_col].min().strftime("%Y-%m-%d"),
+                "max_date": rows[date_col].max().strftime("%Y-%m-%d"),
+                "bytes": os.path.getsize(path),
+                "checksum": checksum,
+            }
+
+        for month, stats in previous.items():
+            if month not in partitions:
+                path = os.path.join(self.root, stats["path"])
+                if os.path.exists(path):
+                    os.remove(path)
+                changed.append(path)
+
+        reports[report] = {"columns": [str(column) for column in data.columns], "date_col": date_col,
+                           "partitions": partitions}
+        self._write_manifest(reports)
+        changed.append(self.manifest_path)
+        return changed
+
+    def partitions(self, report, start_date=None, end_date=None):
+        """
+        Return ((month, checksum), ...) of the report's partitions with rows from start_date
+        to end_date inclusive, oldest first, or None if the report is not stored.
+        """
+        stored = self.manifest().get(report)
+        if stored is None:
+            return None
+        start = None if start_date is None else pd.Timestamp(start_date).strftime("%Y-%m-%d")
+        end = None if end_date is None else pd.Timestamp(end_date).strftime("%Y-%m-%d")
+        return tuple((month, stats["checksum"]) for month, stats in sorted(stored["partitions"].items())
+                     if (start is None or stats["max_date"] >= start) and (end is None or stats["min_date"] <= end))
+
+    def date_bounds(self, report):
+        """
+        Return the (first, last) date of a stored report, or None.
+        """
+        partitions = self.manifest().get(report, {}).get("partitions")
+        if not partitions:
+            return None
+        return (pd.Timestamp(min(stats["min_date"] for stats in partitions.values())),
+                pd.Timestamp(max(stats["max_date"] for stats in partitions.values())))
+
+    def read(self, report, months=None):
+        """
+        Return the rows of the given months of a report (all months if None), oldest first.
+        """
+        stored = self.manifest().get(report)
+        if stored is None:
+            return None
+        if months is None:
+            months = sorted(stored["partitions"])
+        frames = [pd.read_parquet(os.path.join(self.root, stored["partitions"][month]["path"]))
+                  for month in sorted(months) if month in stored["partitions"]]
+        if not frames:
+            return pd.DataFrame(columns=stored["columns"])
+        return pd.concat(frames, ignore_index=True).reindex(columns=stored["columns"])
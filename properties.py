@@ -0,0 +1,59 @@
+# properties.py
+import json
+import os
+import re
+
+# Manifest of the GA4 properties and Search Console sites to extract and show
+PROPERTY_MANIFEST = "properties.json"
+
+# Root of the per-property stores, one directory per property
+PROPERTY_STORE_DIR = os.path.join("analytics_data", "properties")
+
+# Property used when there is no manifest; its data stays where the single-site setup kept it
+DEFAULT_PROPERTIES = [{
+    "name": "proefficientdataentry.com",
+    "property_id": "properties/477624929",
+    "site_url": "https://proefficientdataentry.com/",
+    "start_date": "2025-02-10",
+    "data_dir": "analytics_data",
+}]
+
+
+# Function to turn a property name into a directory name
+def property_slug(name):
+    return re.sub(r"[^a-z0-9._-]+", "-", str(name).lower()).strip("-") or "property"
+
+
+# Function to get the directory a property's data is stored in
+def property_data_dir(prop):
+    return prop.get("data_dir") or os.path.join(PROPERTY_STORE_DIR, property_slug(prop["name"]))
+
+
+# Function to load the property manifest
+def load_manifest(path=PROPERTY_MANIFEST):
+    """
+    Return the properties listed in the manifest, a JSON list of objects with 'name',
+    'property_id' (e.g. 'properties/123456789'), 'site_url' and optionally 'start_date'
+    and 'data_dir'. Without a manifest file, return DEFAULT_PROPERTIES.
+
+    Every returned property has its 'data_dir' filled in.
+    """
+    if os.path.exists(path):
+        with open(path, "r") as file:
+            properties = json.load(file)
+    else:
+        properties = DEFAULT_PROPERTIES
+
+    manifest = []
+    names = set()
+    for prop in properties:
+        missing = [field for field in ("name", "property_id", "site_url") if not prop.get(field)]
+        if missing:
+            raise ValueError(f"Property {prop} in {path} is missing {', '.join(missing)}")
+        if prop["name"] in names:
+            raise ValueError(f"Property name {prop['name']!r} appears twice in {path}")
+        names.add(prop["name"])
+        prop = {"start_date": DEFAULT_PROPERTIES[0]["start_date"], **prop}
+        prop["data_dir"] = property_data_dir(prop)
+        manifest.append(prop)
+    return manifest
@@ -0,0 +1,141 @@
+# rank_history.py
+import os
+
+import numpy as np
+import pandas as pd
+
+# Directory of the daily Search Console partitions
+RANK_HISTORY_DIR = os.path.join("analytics_data", "rank_history")
+
+# Columns of a stored row; (date, Query, Page, Device) identifies it within a day
+RANK_HISTORY_COLUMNS = ["date", "Query", "Page", "Device", "Clicks", "Impressions", "CTR", "Position"]
+RANK_HISTORY_KEY = ["Query", "Page", "Device"]
+
+# Parquet compression for the partitions
+RANK_HISTORY_COMPRESSION = "zstd"
+
+
+class RankHistoryStore:
+    """
+    Append-only store of daily Search Console rows, one compressed Parquet file per day.
+
+    Appending a day replaces that day's partition with the fresh rows, so re-fetching a
+    day never duplicates it and rows Search Console has since dropped from a revised day
+    go too. Partial fetches can be merged in instead. Other days' files are never rewritten.
+    """
+
+    def __init__(self, root=RANK_HISTORY_DIR):
+        self.root = root
+
+    def _path(self, day):
+        return os.path.join(self.root, f"date={day:%Y-%m-%d}.parquet")
+
+    def partitions(self):
+        """
+        Return [(date, path)] of the stored days, oldest first.
+        """
+        if not os.path.isdir(self.root):
+            return []
+        days = []
+        for entry in os.scandir(self.root):
+            if entry.name.startswith("date=") and entry.name.endswith(".parquet"):
+                days.append((pd.Timestamp(entry.name[len("date="):-len(".parquet")]), entry.path))
+        return sorted(days)
+
+    def version(self):
+        """
+        Identify the stored data by its partitions' names, sizes and modification times.
+        """
+        stats = []
+        for day, path in self.partitions():
+            file_stat = os.stat(path)
+            stats.append((f"{day:%Y-%m-%d}", file_stat.st_mtime_ns, file_stat.st_size))
+        return (self.root, tuple(stats))
+
+    def append(self, data, date_col="date", merge=False):
+        """
+        Add Search Console rows with a date column, replacing the partitions of their days.
+
+        :param merge: Merge the rows into the stored days instead, keeping the latest row per
+                      (Query, Page, Device); for fetches that do not cover whole days
+        :return: Number of rows stored across the touched days
+        """
+        if data is None or data.empty:
+            return 0
+        os.makedirs(self.root, exist_ok=True)
+        data = data.assign(date=pd.to_datetime(data[date_col]).dt.normalize())[RANK_HISTORY_COLUMNS]
+
+        stored = 0
+        for day, rows in data.groupby("date", sort=True):
+            path = self._path(day)
+            if merge and os.path.exists(path):
+                rows = pd.concat([pd.read_parquet(path), rows], ignore_index=True)
+            rows = rows.drop_duplicates(subset=RANK_HISTORY_KEY, keep="last").reset_index(drop=True)
+
+            # Write next to the partition and swap it in, so readers never see a partial file
+            temporary_path = f"{path}.tmp"
+            rows.to_parquet(temporary_path, index=False, compression=RANK_HISTORY_COMPRESSION)
+            os.replace(temporary_path, path)
+            stored += len(rows)
+        return stored
+
+    def read(self, start_date=None, end_date=None):
+        """
+        Return the stored rows for the days from start_date to end_date inclusive.
+        """
+        frames = [pd.read_parquet(path) for day, path in self.partitions()
+                  if (start_date is None or day >= pd.Timestamp(start_date))
+                  and (end_date is None or day <= pd.Timestamp(end_date))]
+        if not frames:
+            return pd.DataFrame(columns=RANK_HISTORY_COLUMNS)
+        return pd.concat(frames, ignore_index=True)
+
+
+class RankIndex:
+    """
+    Daily rank history per query, sorted by query and date with each query's row range.
+
+    Rows are rolled up per (query, day) across pages and devices: clicks and impressions
+    are summed and position is averaged weighted by impressions, as Search Console does.
+    Looking up a query is a dictionary lookup and a slice.
+    """
+
+    def __init__(self, history):
+        history = history.dropna(subset=["Query", "date"])
+        impressions = pd.to_numeric(history["Impressions"], errors="coerce").fillna(0)
+        rows = pd.DataFrame({
+            "Query": history["Query"].astype(str),
+            "date": pd.to_datetime(history["date"]),
+            "Clicks": pd.to_numeric(history["Clicks"], errors="coerce").fillna(0),
+            "Impressions": impressions,
+            "weighted_position": pd.to_numeric(history["Position"], errors="coerce").fillna(0) * impressions,
+        })
+        daily = rows.groupby(["Query", "date"], sort=True).sum().reset_index()
+        daily["Position"] = daily.pop("weighted_position") / daily["Impressions"].where(daily["Impressions"] > 0)
+        daily["CTR"] = daily["Clicks"] / daily["Impressions"].where(daily["Impressions"] > 0)
+        self.daily = daily
+
+        # Row range of each query in the sorted table
+        queries = daily["Query"].to_numpy()
+        starts = np.flatnonzero(np.r_[True, queries[1:] != queries[:-1]]) if len(queries) else np.empty(0, dtype=np.int64)
+        ends = np.r_[starts[1:], len(queries)]
+        self._ranges = {queries[start]: (start, end) for start, end in zip(starts, ends)}
+
+        # Queries by total impressions, for picking which to chart
+        totals = daily.groupby("Query", sort=False)["Impressions"].sum()
+        self.queries = totals.sort_values(ascending=False, kind="mergesort").index.tolist()
+
+    def history(self, query):
+        """
+        Return the daily clicks, impressions, CTR and position of one query, oldest first.
+        """
+        start, end = self._ranges.get(query, (0, 0))
+        return self.daily.iloc[start:end]
+
+    def histories(self, queries):
+        """
+        Return the daily history of several queries in one frame.
+        """
+        ranges = [self._ranges[query] for query in queries if query in self._ranges]
+        positions = np.concatenate([np.arange(start, end) for start, end in ranges]) if ranges else []
+        return self.daily.iloc[positions].reset_index(drop=True)
@@ -0,0 +1,210 @@
+# result_cache.py
+import hashlib
+import os
+import pickle
+import re
+import shutil
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# Format of the cache files themselves; bump it if the way entries are stored changes
+CACHE_FORMAT_VERSION = 3
+
+
+# Function to fingerprint the code behind cached results: every module of the app and pandas
+def code_version(directory=os.path.dirname(os.path.abspath(__file__))):
+    """
+    Return a short hash of the source of the .py files in directory and the pandas version.
+
+    Cached results, and the index and figure objects pickled with them, are built by these
+    modules, so any change to them gives the disk tier a new version without a manual bump.
+    """
+    digest = hashlib.sha1(pd.__version__.encode("utf-8"))
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".py"):
+            with open(os.path.join(directory, name), "rb") as file:
+                digest.update(name.encode("utf-8") + b"\0" + file.read())
+    return digest.hexdigest()[:12]
+
+
+# Directory for the on-disk tier; survives server restarts, one subdirectory per format and code version
+CACHE_ROOT = os.path.join(".cache", "results")
+CACHE_DIR = os.path.join(CACHE_ROOT, f"v{CACHE_FORMAT_VERSION}-{code_version()}")
+
+# Name of a version directory of the disk tier, with or without a code version
+VERSION_DIR_PATTERN = re.compile(r"v\d+(-[0-9a-f]+)?")
+
+# Default limits for the two tiers
+MAX_MEMORY_ITEMS = 256
+MAX_DISK_BYTES = 512 * 1024 * 1024  # 512 MB
+
+
+# Function to get a cheap, stable version string for a dataset
+def dataset_version(data):
+    """
+    Identify the contents of a dataset for cache keys.
+
+    Datasets loaded by the dashboard carry a 'version' attr derived from the source file,
+    and date-filtered slices add the selected 'date_range', so no hashing is needed.
+    Frames without a version fall back to hashing their contents.
+    """
+    if data is None:
+        return None
+    version = data.attrs.get('version')
+    if version is None:
+        version = str(pd.util.hash_pandas_object(data, index=False).sum())
+    return (version, data.attrs.get('date_range'))
+
+
+# Function to give a frame derived from a dataset its own version, so it is never cached as its parent
+def derive_version(derived, data, *params):
+    """
+    Set derived.attrs['version'] from the parent dataset's version and the parameters the
+    frame was derived with (e.g. a row limit), and return derived.
+    """
+    derived.attrs['version'] = repr((dataset_version(data), *params))
+    return derived
+
+
+class ResultCache:
+    """
+    Two-tier cache for filtered and aggregated page results.
+
+    Lookups go to an in-memory LRU first and then to pickled files under cache_dir.
+    The disk tier is evicted oldest-accessed first once it grows past max_disk_bytes.
+    When cache_dir is a version directory ('v<N>' or 'v<N>-<code version>'), entries of
+    other versions next to it, and unversioned entries left in its parent, are deleted on
+    first use.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_memory_items=MAX_MEMORY_ITEMS, max_disk_bytes=MAX_DISK_BYTES):
+        self.cache_dir = cache_dir
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = None
+
+    @staticmethod
+    def make_key(*parts):
+        return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+            os.utime(path)  # Mark as recently used for eviction
+        except FileNotFoundError:
+            return default
+        except Exception as e:
+            print(f"⚠️ Discarding unreadable cache entry {path}: {e}")
+            self._remove(path)
+            return default
+
+        self._remember(key, value)
+        return value
+
+    def set(self, key, value):
+        self._remember(key, value)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._path(key)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+            self._track_disk_usage(os.path.getsize(path))
+        except Exception as e:
+            print(f"⚠️ Failed to write cache entry: {e}")
+
+    def get_or_compute(self, key_parts, compute):
+        key = self.make_key(*key_parts)
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                self._remove(os.path.join(self.cache_dir, name))
+        self._disk_bytes = 0
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_items:
+                self._memory.popitem(last=False)
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".pkl"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, os.path.join(self.cache_dir, name)))
+        return entries
+
+    def _remove_other_versions(self):
+        parent, version = os.path.split(os.path.normpath(self.cache_dir))
+        if not VERSION_DIR_PATTERN.fullmatch(version):
+            return
+        for name in os.listdir(parent or "."):
+            path = os.path.join(parent, name)
+            if name == version:
+                continue
+            if VERSION_DIR_PATTERN.fullmatch(name) and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif name.endswith((".pkl", ".tmp")):
+                self._remove(path)
+
+    def _track_disk_usage(self, added_bytes):
+        if self._disk_bytes is None:
+            self._remove_other_versions()
+            self._disk_bytes = sum(size for _, size, _ in self._entries())
+        else:
+            self._disk_bytes += added_bytes
+        if self._disk_bytes > self.max_disk_bytes:
+            self._evict()
+
+    def _evict(self):
+        # Drop the least recently used files until the tier is back under 90% of its budget
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_disk_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            self._remove(path)
+            total -= size
+        self._disk_bytes = total
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+# Shared cache for the whole server process, so sessions reuse each other's results
+result_cache = ResultCache()
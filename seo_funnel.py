@@ -0,0 +1,84 @@
+# seo_funnel.py
+import pandas as pd
+
+from result_cache import result_cache, dataset_version
+from url_paths import normalize_urls
+
+# Reports joined into the SEO funnel: the column holding the page, metrics summed per page,
+# and metrics averaged per page weighted by another metric
+FUNNEL_SOURCES = {
+    "search_console": {"page": "Page", "sum": ["Clicks", "Impressions"], "weighted_mean": {"Position": "Impressions"}},
+    "page_views": {"page": "pagePath", "sum": ["screenPageViews"], "weighted_mean": {}},
+    "ga4": {"page": "Page", "sum": ["Sessions"],
+            "weighted_mean": {"AvgSessionDuration": "Sessions", "PagesPerSession": "Sessions"}},
+}
+
+# Name of the normalized page column
+LANDING_PAGE = "Landing Page"
+
+# Column order of the joined funnel, from search to engagement
+FUNNEL_COLUMNS = [LANDING_PAGE, "Impressions", "Clicks", "CTR", "Position", "Sessions", "Sessions per Click",
+                  "screenPageViews", "AvgSessionDuration", "PagesPerSession"]
+
+
+# Function to aggregate one report per normalized landing page
+def page_table(data, source):
+    """
+    Return one report's metrics per normalized page, indexed by LANDING_PAGE.
+
+    This is one side of the hash join. It is cached per dataset version, so a side is
+    normalized and aggregated again only when its own data changes.
+    """
+    spec = FUNNEL_SOURCES[source]
+
+    def compute():
+        columns = [column for column in spec["sum"] if column in data.columns]
+        means = {column: weight for column, weight in spec["weighted_mean"].items()
+                 if column in data.columns and weight in data.columns}
+        frame = pd.DataFrame({column: pd.to_numeric(data[column], errors="coerce").fillna(0) for column in columns})
+        for column, weight in means.items():
+            frame[f"{column}*{weight}"] = (pd.to_numeric(data[column], errors="coerce").fillna(0)
+                                           * pd.to_numeric(data[weight], errors="coerce").fillna(0))
+
+        keys = normalize_urls(data[spec["page"]])
+        table = frame.groupby(pd.Index(keys, name=LANDING_PAGE)).sum()
+        for column, weight in means.items():
+            table[column] = table.pop(f"{column}*{weight}") / table[weight].where(table[weight] > 0)
+        return table
+
+    return result_cache.get_or_compute((dataset_version(data), "seo_funnel_side", source), compute)
+
+
+# Function to join Search Console, page view and GA4 metrics per landing page
+def seo_funnel(search_console_data, page_views_data=None, ga4_data=None):
+    """
+    Return clicks, impressions, CTR and position from Search Console joined with views,
+    sessions and engagement from GA4 for each landing page, most clicked first.
+
+    Each side comes from page_table(), and the joined result is cached by the versions of
+    all three reports, so reruns neither normalize URLs nor join again.
+    """
+    sides = {"search_console": search_console_data, "page_views": page_views_data, "ga4": ga4_data}
+    sides = {source: data for source, data in sides.items() if data is not None and not data.empty}
+
+    def compute():
+        tables = [page_table(data, source) for source, data in sides.items()]
+        # Index-aligned join: each side is hashed on its LANDING_PAGE index
+        funnel = tables[0].join(tables[1:], how="outer") if len(tables) > 1 else tables[0].copy()
+        if "Clicks" in funnel.columns:
+            funnel = funnel[funnel["Clicks"].notna() | funnel["Impressions"].notna()]
+            funnel["CTR"] = funnel["Clicks"] / funnel["Impressions"].where(funnel["Impressions"] > 0)
+        if "Clicks" in funnel.columns and "Sessions" in funnel.columns:
+            funnel["Sessions per Click"] = funnel["Sessions"] / funnel["Clicks"].where(funnel["Clicks"] > 0)
+        funnel = funnel.reset_index()
+        funnel = funnel[[column for column in FUNNEL_COLUMNS if column in funnel.columns]]
+        funnel = funnel.sort_values(by=[c for c in ("Clicks", "Impressions") if c in funnel.columns],
+                                                  ascending=False, kind="mergesort", ignore_index=True)
+        # Derived version so charts of the funnel can be cached without hashing it
+        funnel.attrs['version'] = repr((versions, "seo_funnel"))
+        return funnel
+
+    versions = tuple((source, dataset_version(data)) for source, data in sides.items())
+    if "search_console" not in sides:
+        return pd.DataFrame(columns=[LANDING_PAGE])
+    return result_cache.get_or_compute((versions, "seo_funnel"), compute)
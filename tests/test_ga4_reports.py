@@ -0,0 +1,145 @@
+# tests/test_ga4_reports.py
+import pandas as pd
+import pytest
+
+try:
+    import data_extractor
+except Exception as e:  # Needs the GA4 client libraries and the app's Streamlit secrets
+    pytest.skip(f"data_extractor cannot be imported: {e}", allow_module_level=True)
+
+from google.analytics.data_v1beta.types import (
+    BatchRunPivotReportsResponse,
+    DimensionValue,
+    MetricValue,
+    PivotHeader,
+    Row,
+    RunPivotReportResponse,
+    RunReportResponse,
+)
+
+from dimensions import BREAKDOWN_COLUMN, TOTAL_BREAKDOWN
+
+DATE_RANGES = [("2025-03-01", "2025-03-05")]
+METRICS = ["sessions", "activeUsers", "eventCount"]
+
+
+# Function to build the full date x deviceCategory x browser table the fake property reports from
+def cross_product():
+    rows = []
+    for i, date in enumerate(["20250301", "20250302", "20250303", "20250304", "20250305"]):
+        for j, device in enumerate(["desktop", "mobile", "tablet"]):
+            for k, browser in enumerate(["Chrome", "Edge", "Firefox", "Safari"]):
+                rows.append({"date": date, "deviceCategory": device, "browser": browser,
+                             "sessions": (i + j) % 3 * (k + 1),
+                             "activeUsers": (i + 2 * j) % 2 * k,
+                             "eventCount": 0 if (i + j) % 4 == 0 else i + j + k})
+    return pd.DataFrame(rows)
+
+
+# Function to sum metrics per combination of columns, as {values: [metric totals]}
+def sums(table, columns, metrics):
+    grouped = table.groupby(columns, sort=True)[metrics].sum()
+    return {key if isinstance(key, tuple) else (key,): values.tolist() for key, values in grouped.iterrows()}
+
+
+def report_row(dimension_values, metric_values):
+    return Row(dimension_values=[DimensionValue(value=str(value)) for value in dimension_values],
+               metric_values=[MetricValue(value=str(value)) for value in metric_values])
+
+
+class FakeClient:
+    """
+    Stand-in for BetaAnalyticsDataClient answering from a cross-product table.
+
+    Like GA4, reports leave out rows whose metrics are all zero, pivots are paged by their
+    offset and limit, and the TOTAL aggregation covers the whole breakdown.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.calls = 0
+
+    def run_report(self, request):
+        self.calls += 1
+        dimensions = [dimension.name for dimension in request.dimensions]
+        metrics = [metric.name for metric in request.metrics]
+        rows = [report_row(key, values) for key, values in sums(self.table, dimensions, metrics).items() if any(values)]
+        return RunReportResponse(rows=rows)
+
+    def batch_run_pivot_reports(self, request):
+        self.calls += 1
+        return BatchRunPivotReportsResponse(pivot_reports=[self._pivot_report(report) for report in request.requests])
+
+    def _pivot_report(self, request):
+        metrics = [metric.name for metric in request.metrics]
+        base_pivot, breakdown_pivot = request.pivots
+        base, breakdown = list(base_pivot.field_names), breakdown_pivot.field_names[0]
+
+        base_values = sorted(self.table[base].drop_duplicates().itertuples(index=False, name=None))
+        breakdown_values = sorted(self.table[breakdown].unique())
+        page_base = base_values[base_pivot.offset:base_pivot.offset + base_pivot.limit]
+        page_values = breakdown_values[breakdown_pivot.offset:breakdown_pivot.offset + breakdown_pivot.limit]
+
+        totals = sums(self.table, base + [breakdown], metrics)
+        rows = [report_row(key + (value,), totals[key + (value,)]) for key in page_base for value in page_values
+                if any(totals.get(key + (value,), []))]
+        base_totals = sums(self.table, base, metrics)
+        aggregates = [report_row(key + (data_extractor.RESERVED_TOTAL,), base_totals[key]) for key in page_base]
+        return RunPivotReportResponse(rows=rows, aggregates=aggregates, pivot_headers=[
+            PivotHeader(row_count=len(base_values)), PivotHeader(row_count=len(breakdown_values)),
+        ])
+
+
+# Function to sum a fetched frame's metrics per combination of columns, as numbers
+def numeric_sums(data, columns, metrics):
+    data = data.assign(**{metric: pd.to_numeric(data[metric]) for metric in metrics})
+    return data.groupby(columns, sort=True)[metrics].sum()
+
+
+def test_merged_reports_match_separate_fetches():
+    table = cross_product()
+    reports = [
+        {"title": "Sessions", "filename": "sessions.csv", "dimensions": ["date", "deviceCategory"], "metrics": ["sessions"]},
+        {"title": "Users", "filename": "users.csv", "dimensions": ["date", "deviceCategory"],
+         "metrics": ["activeUsers", "eventCount"]},
+        {"title": "Daily", "filename": "daily.csv", "dimensions": ["date"], "metrics": ["sessions", "eventCount"]},
+    ]
+    # Some rows are all zero for one merged report but not for the merged request
+    per_device = table.groupby(["date", "deviceCategory"])[METRICS].sum()
+    assert ((per_device["sessions"] == 0) & (per_device[["activeUsers", "eventCount"]] != 0).any(axis=1)).any()
+
+    planned = data_extractor.plan_reports(reports)
+    assert [[report["filename"] for report in request["reports"]] for request in planned] == [
+        ["sessions.csv", "users.csv"], ["daily.csv"],
+    ]
+
+    merged = data_extractor.fetch_reports(FakeClient(table), reports, DATE_RANGES)
+    for report in reports:
+        separate = data_extractor.fetch_data(FakeClient(table), report["dimensions"], report["metrics"], DATE_RANGES,
+                                             report["filename"])
+        pd.testing.assert_frame_equal(merged[report["filename"]].reset_index(drop=True), separate.reset_index(drop=True))
+
+
+def test_paged_marginals_match_cross_product(monkeypatch):
+    # Pages smaller than the fake property, so dates and breakdown values span several pages
+    monkeypatch.setattr(data_extractor, "PIVOT_DATE_LIMIT", 2)
+    monkeypatch.setattr(data_extractor, "PIVOT_BREAKDOWN_LIMIT", 2)
+    table = cross_product()
+    metrics = ["sessions", "activeUsers"]
+    marginals = ["deviceCategory", "browser"]
+    client = FakeClient(table)
+
+    data = data_extractor.fetch_marginals(client, ["date"] + marginals, metrics, DATE_RANGES,
+                                          "device_breakdown_data.csv", marginals)
+    assert client.calls > 1
+
+    for marginal in marginals:
+        expected = table.groupby(["date", marginal], sort=True)[metrics].sum()
+        expected = expected[(expected != 0).any(axis=1)]
+        fetched = numeric_sums(data[data[BREAKDOWN_COLUMN] == marginal], ["date", marginal], metrics)
+        pd.testing.assert_frame_equal(fetched, expected, check_dtype=False)
+
+    expected_totals = table.groupby("date", sort=True)[metrics].sum()
+    totals = data[data[BREAKDOWN_COLUMN] == TOTAL_BREAKDOWN]
+    assert not totals["date"].duplicated().any()
+    pd.testing.assert_frame_equal(numeric_sums(totals, ["date"], metrics), expected_totals, check_dtype=False)
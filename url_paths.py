@@ -0,0 +1,135 @@
+# url_paths.py
+from urllib.parse import unquote, urlsplit
+
+import numpy as np
+import pandas as pd
+
+
+# Function to split a page path into its directory segments
+def path_segments(path):
+    """
+    Return the segments of a path, ignoring the query string, fragment, repeated and
+    trailing slashes: '/services/data-entry/?ref=x' -> ['services', 'data-entry'].
+    """
+    path = str(path).split("#", 1)[0].split("?", 1)[0]
+    return [segment for segment in path.split("/") if segment]
+
+
+# Function to build the label of a trie node from its segments
+def section_label(segments):
+    if not segments:
+        return "/"
+    # Files keep their name as is; directories end with a slash like GA4 page paths
+    suffix = "" if "." in segments[-1] else "/"
+    return "/" + "/".join(segments) + suffix
+
+
+# Function to reduce a page URL or path to the key pages are joined on across reports
+def normalize_url(url):
+    """
+    Normalize an absolute URL (Search Console) or a page path (GA4) to a page path.
+
+    The scheme, host, query string and fragment are dropped, percent-escapes decoded, the
+    path lowercased and slashes normalized, so 'https://example.com/Services?x=1' and
+    '/services/' both become '/services/'.
+    """
+    url = str(url).strip()
+    path = urlsplit(url).path if "://" in url else url
+    return section_label(path_segments(unquote(path).lower()))
+
+
+# Function to normalize a column of URLs, touching each distinct value once
+def normalize_urls(urls):
+    codes, uniques = pd.factorize(urls)
+    keys = np.array([normalize_url(url) for url in uniques] + [None], dtype=object)
+    return keys[codes]
+
+
+class PathTrie:
+    """
+    Trie of the distinct page paths of a dataset, for rollups by site section.
+
+    Every node is a path prefix ('/', '/services/', '/services/data-entry/', ...). Each
+    distinct path is mapped once to its ancestor at every depth, so rolling rows up to any
+    depth or drilling into any section is a bincount over rows, with no string matching.
+    """
+
+    def __init__(self, paths):
+        codes, uniques = pd.factorize(paths)
+        self._codes = codes
+
+        labels = {"/": 0}
+        self.sections = ["/"]
+        self.depths = [0]
+        self.parents = [-1]
+        ancestors = []
+        for path in uniques:
+            segments = path_segments(path)
+            chain = [0]
+            for depth in range(1, len(segments) + 1):
+                label = section_label(segments[:depth])
+                if label not in labels:
+                    labels[label] = len(self.sections)
+                    self.sections.append(label)
+                    self.depths.append(depth)
+                    self.parents.append(chain[-1])
+                chain.append(labels[label])
+            ancestors.append(chain)
+
+        self._labels = labels
+        self.depths = np.array(self.depths, dtype=np.int64)
+        self.parents = np.array(self.parents, dtype=np.int64)
+        self.max_depth = int(self.depths.max())
+
+        # Row i of the table holds the ancestors of distinct path i at depths 0..max_depth;
+        # paths shallower than a depth are their own ancestor there
+        self._ancestors = np.array([chain + [chain[-1]] * (self.max_depth + 1 - len(chain)) for chain in ancestors],
+                                   dtype=np.int64).reshape(len(ancestors), self.max_depth + 1)
+
+    def parent_sections(self):
+        """
+        Return the labels of the sections that have sub-sections or pages, shallowest first.
+        """
+        has_children = np.zeros(len(self.sections), dtype=bool)
+        has_children[self.parents[self.parents >= 0]] = True
+        order = np.lexsort((np.array(self.sections, dtype=object), self.depths))
+        return [self.sections[node] for node in order if has_children[node]]
+
+    def rollup(self, values, agg="sum", depth=1, section="/", mask=None):
+        """
+        Aggregate a per-row metric by the sections `depth` levels below `section`.
+
+        Rows whose path ends above that level are reported under their own path.
+
+        :param values: Array of metric values, one per row of the dataset the trie was built on
+        :param agg: 'sum', 'mean' or 'count'
+        :param mask: Optional boolean array selecting the rows to include
+        :return: DataFrame with 'section', the metric total and the number of rows, by section
+        """
+        node = self._labels[section]
+        target_depth = min(self.depths[node] + depth, self.max_depth)
+
+        values = np.asarray(values, dtype=float)
+        rows = (self._codes >= 0) & ~np.isnan(values)
+        if mask is not None:
+            rows &= np.asarray(mask, dtype=bool)
+        codes = self._codes[rows]
+
+        # Totals per distinct path, then per ancestor at the target depth
+        path_count = len(self._ancestors)
+        path_totals = np.bincount(codes, weights=values[rows], minlength=path_count)
+        path_rows = np.bincount(codes, minlength=path_count)
+        under_section = self._ancestors[:, self.depths[node]] == node
+        targets = self._ancestors[under_section, target_depth]
+        totals = np.bincount(targets, weights=path_totals[under_section], minlength=len(self.sections))
+        counts = np.bincount(targets, weights=path_rows[under_section], minlength=len(self.sections))
+
+        nodes = np.flatnonzero(counts > 0)
+        if agg == "mean":
+            result = totals[nodes] / counts[nodes]
+        elif agg == "count":
+            result = counts[nodes]
+        else:
+            result = totals[nodes]
+        return pd.DataFrame({"section": [self.sections[n] for n in nodes], "value": result,
+                             "rows": counts[nodes].astype("int64")})